@@ -0,0 +1,90 @@
+import os
+import queue
+import hashlib
+import threading
+from i18n import _
+
+# 相对导入
+import constant_config
+import math_utils
+import save_format
+
+# 后台自动保存
+# 主线程只负责获取模型的快照（numpy 数组的拷贝），序列化、计算哈希、写文件都在后台线程中完成
+# 所有文件都使用 save_format.atomic_write 原子写入，写到一半时程序崩溃也不会损坏已有的存档
+# 后台线程不能直接调用 pygame 绘制提示信息，因此提示信息会先放进队列，由主线程通过 poll_messages 取出
+
+class AutoSaver:
+    def __init__(self, folder:str=constant_config.AUTOSAVE_FOLDER, autosave_file:str=constant_config.AUTOSAVE_FILE) -> None:
+        self.folder        = folder
+        self.autosave_file = autosave_file
+        self.last_hash     = None # 最近一个时间戳备份文件的内容哈希，用于判断是否重复
+        self.hash_loaded   = False
+        self.jobs          = queue.Queue()
+        self.messages      = queue.Queue()
+        self.thread        = threading.Thread(target=self.__worker, daemon=True)
+        self.thread.start()
+
+    def request_save(self, memory_object, backup=True, autosave=True): # 在主线程中调用，只获取快照，不会阻塞绘制
+        # backup: 是否保存一个时间戳对应的备份文件，空白状态不会保存备份
+        # autosave: 是否覆盖 auto_save.json
+        backup = backup and not memory_object.is_empty()
+        if not backup and not autosave:
+            return
+        self.jobs.put((memory_object.get_save_state(), backup, autosave))
+
+    def flush(self): # 等待所有已经提交的保存任务完成
+        self.jobs.join()
+
+    def poll_messages(self) -> list: # 取出后台线程产生的所有 (message, color, replace)
+        ans = []
+        while True:
+            try:
+                ans.append(self.messages.get_nowait())
+            except queue.Empty:
+                return ans
+
+    def get_content_hash(self, data:bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def load_last_hash(self): # 第一次备份前，计算已有的最后一个备份文件的哈希
+        self.hash_loaded = True
+        if not os.path.isdir(self.folder):
+            return
+        arr = sorted(
+            file for file in os.listdir(self.folder)
+            if file != os.path.basename(self.autosave_file) and not file.startswith("."))
+        if len(arr) >= 1:
+            with open(os.path.join(self.folder, arr[-1]), "rb") as fp:
+                self.last_hash = self.get_content_hash(fp.read())
+
+    def save(self, state:dict, backup:bool, autosave:bool): # 在后台线程中执行
+        os.makedirs(self.folder, exist_ok=True)
+        data = save_format.encode_json(state)
+
+        if backup:
+            if not self.hash_loaded:
+                self.load_last_hash()
+            content_hash = self.get_content_hash(data)
+            if content_hash == self.last_hash: # 与上一次备份完全一致，不再重复保存
+                print(_("由于没有修改，因此跳过了这一次自动保存"))
+            else:
+                filepath = os.path.join(self.folder, math_utils.get_formatted_datetime() + ".json")
+                save_format.atomic_write(filepath, data) # 保存一个时间戳对应的备份文件
+                self.last_hash = content_hash
+
+        if autosave:
+            save_format.atomic_write(self.autosave_file, data)
+
+    def __worker(self):
+        while True:
+            state, backup, autosave = self.jobs.get()
+            try:
+                self.save(state, backup, autosave)
+                if autosave: # 只有定时自动保存会在屏幕上提示，replace 用于替换 “正在自动保存” 的提示
+                    self.messages.put((_("自动保存成功"), constant_config.GREEN, True))
+            except Exception as err:
+                print(_("自动保存失败：%s") % repr(err))
+                self.messages.put((_("自动保存失败"), constant_config.RED, autosave))
+            finally:
+                self.jobs.task_done()
@@ -0,0 +1,45 @@
+# 相对导入
+import constant_config
+
+# 视图变换：屏幕坐标 = 模型坐标 * zoom + offset
+# 平移和缩放只修改这里的三个数，不修改 MemoryObject 中的任何坐标，因此不会产生撤销记录，也不会触发自动保存
+# 节点半径、边宽度、文字大小始终以屏幕像素为单位，不随缩放变化
+
+class Camera:
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self):
+        self.offset_x = 0
+        self.offset_y = 0
+        self.zoom     = 1
+
+    def get_state(self) -> tuple: # 用于判断视图是否发生了变化
+        return (self.offset_x, self.offset_y, self.zoom)
+
+    def world_to_screen(self, x, y) -> tuple:
+        return (x * self.zoom + self.offset_x, y * self.zoom + self.offset_y)
+
+    def screen_to_world(self, x, y) -> tuple:
+        return ((x - self.offset_x) / self.zoom, (y - self.offset_y) / self.zoom)
+
+    def screen_to_world_rect(self, xmin, ymin, xmax, ymax) -> tuple: # 屏幕上的矩形 -> 模型中的 (xmin, ymin, xmax, ymax)
+        return self.screen_to_world(xmin, ymin) + self.screen_to_world(xmax, ymax)
+
+    def pan(self, dx, dy): # 画面中的内容移动 (dx, dy) 个像素
+        self.offset_x += dx
+        self.offset_y += dy
+
+    def zoom_at(self, factor:float, x, y): # 以屏幕上的 (x, y) 为中心缩放，(x, y) 处的模型坐标保持不变
+        zoom = min(max(self.zoom * factor, constant_config.ZOOM_MIN), constant_config.ZOOM_MAX)
+        self.offset_x = x - (x - self.offset_x) * zoom / self.zoom
+        self.offset_y = y - (y - self.offset_y) * zoom / self.zoom
+        self.zoom     = zoom
+
+    def fit_box(self, xmin, ymin, xmax, ymax, width, height, margin=0): # 调整视图使模型中的矩形恰好显示在 width * height 的屏幕中央
+        box_w = max(xmax - xmin, 1)
+        box_h = max(ymax - ymin, 1)
+        zoom = min((width - 2 * margin) / box_w, (height - 2 * margin) / box_h)
+        self.zoom     = min(max(zoom, constant_config.ZOOM_MIN), constant_config.ZOOM_MAX)
+        self.offset_x = width  / 2 - (xmin + xmax) / 2 * self.zoom
+        self.offset_y = height / 2 - (ymin + ymax) / 2 * self.zoom
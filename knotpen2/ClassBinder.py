@@ -1,5 +1,6 @@
 
 # 相对导入
+import constant_config
 import GameObject
 import pygame_interface
 
@@ -18,5 +19,7 @@ class ClassBinder:
             draw_screen=self.game_object.draw_screen,
             die_check=self.game_object.die_check,
             handle_mouse_move=self.game_object.handle_mouse_move,
-            caption=self.game_object.get_window_caption()
+            caption=self.game_object.get_window_caption(),
+            fps=constant_config.FPS,
+            idle_wait=constant_config.IDLE_WAIT_TIME,
         )
@@ -0,0 +1,356 @@
+import numpy
+from collections.abc import Mapping, MutableMapping
+
+# 紧凑的几何存储结构
+# 节点和边都使用整数编号，坐标保存在连续的 float64 数组中，边保存在连续的 int32 数组中
+# 删除节点或者边之后，空出来的槽位（slot）会被记录在空闲列表中，供之后新建的节点或者边复用
+# 为了兼容旧代码以及存档格式，DotDictView 等类提供了与原来的 dict 相同的访问方式
+
+def dot_key(num:int) -> str: # 整数编号 -> 字符串编号
+    return "dot_%d" % num
+
+def line_key(num:int) -> str:
+    return "line_%d" % num
+
+def dot_number(key:str) -> int: # 字符串编号 -> 整数编号
+    return int(key[4:])
+
+def line_number(key:str) -> int:
+    return int(key[5:])
+
+def plain(v:float): # 整数坐标仍然返回 int，与原来 dict 中保存的值保持一致
+    return int(v) if v.is_integer() else v
+
+def plain_rows(arr:numpy.ndarray) -> list: # 批量版本的 plain，返回 tuple 的列表
+    if numpy.all(arr == numpy.floor(arr)): # 常见情况：所有坐标都是整数
+        return [tuple(row) for row in arr.astype(numpy.int64).tolist()]
+    return [tuple(plain(v) for v in row) for row in arr.tolist()]
+
+def grow(arr:numpy.ndarray, size:int, fill) -> numpy.ndarray: # 扩大数组容量，新增部分使用 fill 填充
+    if size <= len(arr):
+        return arr
+    new_len = max(size, 2 * len(arr), 16)
+    new_arr = numpy.full((new_len,) + arr.shape[1:], fill, dtype=arr.dtype)
+    new_arr[:len(arr)] = arr
+    return new_arr
+
+class GeometryStore:
+    def __init__(self) -> None:
+        self.clear()
+        self.dot_view    = DotDictView(self)
+        self.line_view   = LineDictView(self)
+        self.degree_view = DegreeView(self)
+
+    def clear(self):
+        # 节点：slot -> 坐标、度数、整数编号；整数编号 -> slot
+        self.coords    = numpy.zeros((0, 2), dtype=numpy.float64)
+        self.degree    = numpy.zeros(0, dtype=numpy.int32)
+        self.dot_num   = numpy.zeros(0, dtype=numpy.int64)
+        self.dot_slot  = numpy.zeros(0, dtype=numpy.int64)
+        self.dot_free  = [] # 空闲槽位
+        self.dot_top   = 0  # 已经使用过的槽位个数
+        self.dot_count = 0
+
+        # 边：slot -> 两个端点的 slot、整数编号；整数编号 -> slot
+        self.edges      = numpy.zeros((0, 2), dtype=numpy.int32)
+        self.line_num   = numpy.zeros(0, dtype=numpy.int64)
+        self.line_slot  = numpy.zeros(0, dtype=numpy.int64)
+        self.line_free  = []
+        self.line_top   = 0
+        self.line_count = 0
+
+    def get_dot_slot(self, num:int) -> int: # 找不到时返回 -1
+        if 0 <= num < len(self.dot_slot):
+            return int(self.dot_slot[num])
+        return -1
+
+    def get_line_slot(self, num:int) -> int:
+        if 0 <= num < len(self.line_slot):
+            return int(self.line_slot[num])
+        return -1
+
+    def has_dot(self, num:int) -> bool:
+        return self.get_dot_slot(num) >= 0
+
+    def has_line(self, num:int) -> bool:
+        return self.get_line_slot(num) >= 0
+
+    def add_dot(self, num:int, x, y):
+        assert num >= 0 and not self.has_dot(num)
+        if len(self.dot_free) > 0: # 优先复用空闲槽位
+            slot = self.dot_free.pop()
+        else:
+            slot = self.dot_top
+            self.dot_top += 1
+            self.coords  = grow(self.coords,  self.dot_top, 0.0)
+            self.degree  = grow(self.degree,  self.dot_top, 0)
+            self.dot_num = grow(self.dot_num, self.dot_top, -1)
+        self.dot_slot = grow(self.dot_slot, num + 1, -1)
+        self.coords[slot]  = (x, y)
+        self.degree[slot]  = 0
+        self.dot_num[slot] = num
+        self.dot_slot[num] = slot
+        self.dot_count += 1
+
+    def remove_dot(self, num:int):
+        slot = self.get_dot_slot(num)
+        assert slot >= 0
+        assert self.degree[slot] == 0 # 删除节点之前必须先删除相连的边
+        self.dot_num[slot] = -1
+        self.dot_slot[num] = -1
+        self.dot_free.append(slot)
+        self.dot_count -= 1
+
+    def get_dot(self, num:int) -> tuple:
+        slot = self.get_dot_slot(num)
+        if slot < 0:
+            raise KeyError(dot_key(num))
+        x, y = self.coords[slot].tolist()
+        return (plain(x), plain(y))
+
+    def set_dot(self, num:int, x, y):
+        slot = self.get_dot_slot(num)
+        assert slot >= 0
+        self.coords[slot] = (x, y)
+
+    def get_degree(self, num:int) -> int:
+        slot = self.get_dot_slot(num)
+        if slot < 0:
+            raise KeyError(dot_key(num))
+        return int(self.degree[slot])
+
+    def add_line(self, num:int, dot_num_1:int, dot_num_2:int):
+        assert num >= 0 and not self.has_line(num)
+        slot_1 = self.get_dot_slot(dot_num_1)
+        slot_2 = self.get_dot_slot(dot_num_2)
+        assert slot_1 >= 0 and slot_2 >= 0
+        if len(self.line_free) > 0:
+            slot = self.line_free.pop()
+        else:
+            slot = self.line_top
+            self.line_top += 1
+            self.edges    = grow(self.edges,    self.line_top, 0)
+            self.line_num = grow(self.line_num, self.line_top, -1)
+        self.line_slot = grow(self.line_slot, num + 1, -1)
+        self.edges[slot]    = (slot_1, slot_2)
+        self.line_num[slot] = num
+        self.line_slot[num] = slot
+        self.degree[slot_1] += 1 # 统计度数
+        self.degree[slot_2] += 1
+        self.line_count += 1
+
+    def remove_line(self, num:int):
+        slot = self.get_line_slot(num)
+        assert slot >= 0
+        slot_1, slot_2 = self.edges[slot]
+        self.degree[slot_1] -= 1
+        self.degree[slot_2] -= 1
+        self.line_num[slot] = -1
+        self.line_slot[num] = -1
+        self.line_free.append(slot)
+        self.line_count -= 1
+
+    def get_line(self, num:int) -> tuple: # 返回两个端点的整数编号
+        slot = self.get_line_slot(num)
+        if slot < 0:
+            raise KeyError(line_key(num))
+        slot_1, slot_2 = self.edges[slot]
+        return (int(self.dot_num[slot_1]), int(self.dot_num[slot_2]))
+
+    def dot_numbers(self) -> numpy.ndarray: # 按照编号从小到大返回所有节点的整数编号
+        return numpy.flatnonzero(self.dot_slot >= 0)
+
+    def line_numbers(self) -> numpy.ndarray:
+        return numpy.flatnonzero(self.line_slot >= 0)
+
+    def shift(self, dx, dy): # 所有节点一起移动，向量化计算
+        alive = self.dot_num[:self.dot_top] >= 0
+        self.coords[:self.dot_top][alive] += (dx, dy)
+
+    def get_segment_arrays(self):
+        """
+        向量化地获取所有边的端点坐标
+
+        Returns:
+            (line_nums, starts, ends)
+            line_nums(np.ndarray): 形状为 (E, ) 的边编号，按照编号从小到大排列
+            starts(np.ndarray): 形状为 (E, 2) 的起点坐标
+            ends(np.ndarray): 形状为 (E, 2) 的终点坐标
+        """
+        line_nums = self.line_numbers()
+        slots = self.line_slot[line_nums]
+        edges = self.edges[slots]
+        return line_nums, self.coords[edges[:, 0]], self.coords[edges[:, 1]]
+
+    def get_dot_arrays(self): # 返回 (dot_nums, coords)，按照编号从小到大排列
+        dot_nums = self.dot_numbers()
+        return dot_nums, self.coords[self.dot_slot[dot_nums]]
+
+    def get_dot_coords(self, dot_nums:numpy.ndarray) -> numpy.ndarray: # 批量获取节点坐标，形状为 (N, 2)
+        return self.coords[self.dot_slot[dot_nums]].reshape(-1, 2)
+
+    def get_degrees(self, dot_nums:numpy.ndarray) -> numpy.ndarray: # 批量获取节点的度数
+        return self.degree[self.dot_slot[dot_nums]]
+
+    def get_line_coords(self, line_nums:numpy.ndarray): # 批量获取边的端点坐标，返回 (starts, ends)
+        edges = self.edges[self.line_slot[line_nums]].reshape(-1, 2)
+        return self.coords[edges[:, 0]], self.coords[edges[:, 1]]
+
+    def get_line_arrays(self): # 返回 (line_nums, line_ends)，line_ends 中记录的是两个端点的整数编号
+        line_nums = self.line_numbers()
+        return line_nums, self.dot_num[self.edges[self.line_slot[line_nums]]].reshape(-1, 2)
+
+    def load_from_arrays(self, dot_nums, coords, line_nums, line_ends):
+        """
+        向量化地批量构建，用于快速加载存档
+
+        Args:
+            dot_nums(np.ndarray): 形状为 (N, ) 的节点编号
+            coords(np.ndarray): 形状为 (N, 2) 的节点坐标
+            line_nums(np.ndarray): 形状为 (E, ) 的边编号
+            line_ends(np.ndarray): 形状为 (E, 2) 的端点编号
+        """
+        dot_nums  = numpy.asarray(dot_nums,  dtype=numpy.int64).reshape(-1)
+        coords    = numpy.asarray(coords,    dtype=numpy.float64).reshape(-1, 2)
+        line_nums = numpy.asarray(line_nums, dtype=numpy.int64).reshape(-1)
+        line_ends = numpy.asarray(line_ends, dtype=numpy.int64).reshape(-1, 2)
+        assert len(dot_nums) == len(coords) and len(line_nums) == len(line_ends)
+        assert len(numpy.unique(dot_nums)) == len(dot_nums) and len(numpy.unique(line_nums)) == len(line_nums)
+        assert numpy.all(dot_nums >= 0) and numpy.all(line_nums >= 0)
+
+        self.clear()
+        self.dot_top = self.dot_count = len(dot_nums)
+        self.coords  = coords.copy()
+        self.dot_num = dot_nums.copy()
+        self.dot_slot = numpy.full(int(dot_nums.max()) + 1 if len(dot_nums) else 0, -1, dtype=numpy.int64)
+        self.dot_slot[dot_nums] = numpy.arange(len(dot_nums))
+
+        end_nums = line_ends.reshape(-1)
+        assert numpy.all(end_nums >= 0) and numpy.all(end_nums < len(self.dot_slot))
+        end_slots = self.dot_slot[end_nums]
+        assert numpy.all(end_slots >= 0) # 边的端点必须存在
+
+        self.line_top = self.line_count = len(line_nums)
+        self.edges    = end_slots.reshape(-1, 2).astype(numpy.int32)
+        self.line_num = line_nums.copy()
+        self.line_slot = numpy.full(int(line_nums.max()) + 1 if len(line_nums) else 0, -1, dtype=numpy.int64)
+        self.line_slot[line_nums] = numpy.arange(len(line_nums))
+        self.degree = numpy.bincount(end_slots, minlength=self.dot_top).astype(numpy.int32) # 统计度数
+
+    def load_from_dict(self, dot_dict:dict, line_dict:dict): # 从 dict 格式的节点表和边表构建
+        dot_nums  = [dot_number(key) for key in dot_dict]
+        line_nums = [line_number(key) for key in line_dict]
+        line_ends = [(dot_number(dot_from), dot_number(dot_to)) for dot_from, dot_to in line_dict.values()]
+        self.load_from_arrays(dot_nums, list(dot_dict.values()), line_nums, line_ends)
+
+    def memory_bytes(self) -> int: # 数组占用的内存大小
+        return sum(arr.nbytes for arr in [self.coords, self.degree, self.dot_num, self.dot_slot, self.edges, self.line_num, self.line_slot])
+
+class DotDictView(MutableMapping):
+    """兼容层：以 {"dot_17": (x, y)} 的方式访问节点坐标"""
+    def __init__(self, store:GeometryStore) -> None:
+        self.store = store
+
+    def __getitem__(self, key):
+        try:
+            return self.store.get_dot(dot_number(key))
+        except (ValueError, TypeError):
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        num = dot_number(key)
+        if self.store.has_dot(num):
+            self.store.set_dot(num, value[0], value[1])
+        else:
+            self.store.add_dot(num, value[0], value[1])
+
+    def __delitem__(self, key):
+        self.store.remove_dot(dot_number(key))
+
+    def __contains__(self, key):
+        try:
+            return self.store.has_dot(dot_number(key))
+        except (ValueError, TypeError):
+            return False
+
+    def __iter__(self):
+        for num in self.store.dot_numbers().tolist():
+            yield dot_key(num)
+
+    def __len__(self):
+        return self.store.dot_count
+
+    def items(self): # 批量读取，避免逐个解析编号
+        nums, coords = self.store.get_dot_arrays()
+        return list(zip([dot_key(num) for num in nums.tolist()], plain_rows(coords)))
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+class LineDictView(MutableMapping):
+    """兼容层：以 {"line_42": ("dot_1", "dot_2")} 的方式访问边表"""
+    def __init__(self, store:GeometryStore) -> None:
+        self.store = store
+
+    def __getitem__(self, key):
+        try:
+            num_1, num_2 = self.store.get_line(line_number(key))
+        except (ValueError, TypeError):
+            raise KeyError(key)
+        return (dot_key(num_1), dot_key(num_2))
+
+    def __setitem__(self, key, value):
+        num = line_number(key)
+        if self.store.has_line(num):
+            self.store.remove_line(num)
+        self.store.add_line(num, dot_number(value[0]), dot_number(value[1]))
+
+    def __delitem__(self, key):
+        self.store.remove_line(line_number(key))
+
+    def __contains__(self, key):
+        try:
+            return self.store.has_line(line_number(key))
+        except (ValueError, TypeError):
+            return False
+
+    def __iter__(self):
+        for num in self.store.line_numbers().tolist():
+            yield line_key(num)
+
+    def __len__(self):
+        return self.store.line_count
+
+    def items(self):
+        nums  = self.store.line_numbers()
+        edges = self.store.edges[self.store.line_slot[nums]]
+        dot_nums = self.store.dot_num[edges]
+        return [(line_key(num), (dot_key(num_1), dot_key(num_2))) for num, (num_1, num_2) in zip(nums.tolist(), dot_nums.tolist())]
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+class DegreeView(Mapping):
+    """兼容层：以 {"dot_17": 2} 的方式读取节点的度数，度数由 GeometryStore 在增删边时自动维护"""
+    def __init__(self, store:GeometryStore) -> None:
+        self.store = store
+
+    def __getitem__(self, key):
+        try:
+            return self.store.get_degree(dot_number(key))
+        except (ValueError, TypeError):
+            raise KeyError(key)
+
+    def __iter__(self):
+        for num in self.store.dot_numbers().tolist():
+            yield dot_key(num)
+
+    def __len__(self):
+        return self.store.dot_count
+
+    def items(self):
+        nums = self.store.dot_numbers()
+        return list(zip([dot_key(num) for num in nums.tolist()], self.store.degree[self.store.dot_slot[nums]].tolist()))
+
+    def __repr__(self):
+        return repr(dict(self.items()))
@@ -0,0 +1,343 @@
+import math
+import numpy
+import pygame
+
+# 相对导入
+import constant_config
+import pygame_utils
+import GeometryStore
+import math_utils
+
+# 保留模式的绘制器
+# 节点、边、遮挡关系、编号等几何内容绘制在一个离屏的 scene 表面上，只有发生变化的区域（脏矩形）才会重新绘制
+# MemoryObject 的每个基本修改操作都会通过 mark_dirty 记录发生变化的区域，绘制器每一帧通过 pop_dirty 取出
+# 局部重绘时不能直接使用 set_clip：pygame 会先把线段裁剪到矩形边界再光栅化，得到的像素与整体绘制时略有不同
+# 因此局部重绘先在草稿表面上不裁剪地绘制可能与脏矩形相交的内容，再把脏矩形部分复制回 scene
+# 所有内容都经过 camera 变换到屏幕坐标，只绘制屏幕范围内的节点和边（通过空间索引查询）
+# 视图平移或者缩放之后整体重绘（只绘制屏幕范围内的内容）
+# 不使用 scene.scroll 移动已有的像素：线段在绘制时已经被裁剪到原来的表面边界，移动之后与重新绘制的结果不一致
+# 节点在屏幕上过于密集时（平均每个节点占据的像素太少）自动切换到简化模式（level of detail）：
+#   不绘制编号，节点画成小方块，边画成 1 像素的细线，所有被交换过上下关系的交叉点一次性批量计算并用小方块标出
+#   需要注意的节点（正常模式下编号显示为红色）用红色空心方框标出
+#   简化模式直接使用 GeometryStore 中的数组，用 numpy 一次性完成坐标变换和裁剪，不经过空间索引和字符串编号
+# 绘制模式只在整体重绘时切换，保证局部重绘与整体重绘的结果一致
+# 消息和状态栏绘制在 scene 的上方，不写入 scene
+# 每一帧返回屏幕上实际发生变化的矩形列表，交给 pygame.display.update 只更新这些区域
+
+class KnotRenderer:
+    def __init__(self, memory_object, camera, get_small_text) -> None:
+        self.memory_object  = memory_object
+        self.camera         = camera
+        self.camera_state   = None  # 上一帧的视图参数
+        self.coarse         = False # 是否处于简化模式
+        self.visible_dots   = 0     # 上一次整体重绘时屏幕上的节点个数
+        self.pd_label_source = None # pd_labels 对应的 get_number_position_pairs 的结果
+        self.pd_labels       = []   # 预先渲染好的 pd_code 弧线编号 (surface, 模型坐标)
+        self.pd_label_boxes  = numpy.zeros((0, 4)) # 每个编号的模型坐标以及文字的宽度、高度
+        self.overlay_cache   = {}   # (line_id_1, line_id_2) -> (端点坐标以及缩放倍数, 遮挡图形)
+        self.mark_version    = None # marks 对应的 MemoryObject.version
+        self.marks           = None # 起始点、方向点、逆向对的索引，见 get_marks
+        self.get_small_text = get_small_text
+        self.scene          = None  # 离屏表面，大小与屏幕相同
+        self.scratch        = None  # 局部重绘时使用的草稿表面，大小与 scene 相同
+        self.focus_dot      = None  # 上一帧用红色标出的选中节点
+        self.notice_node    = set() # 上一帧用红色标出编号的节点
+        self.pd_code_final  = None  # 上一帧绘制的 pd_code_final，pd_code_final 被清空时需要整体重绘
+        self.overlays       = []    # 上一帧绘制的 (surface, pos)
+        self.status_version = None  # 状态栏文字对应的 MemoryObject.version
+        self.status_value   = None
+
+    def get_live_status(self, algo): # 连通分支状态只在模型变化之后重新计算
+        if self.status_version != self.memory_object.version:
+            self.status_value   = algo.get_live_status()
+            self.status_version = self.memory_object.version
+        return self.status_value
+
+    def box_to_rect(self, box, padding:int) -> pygame.Rect: # 模型中的包围盒 -> 向外扩展 padding 之后的屏幕矩形
+        xmin, ymin = self.camera.world_to_screen(box[0], box[1])
+        xmax, ymax = self.camera.world_to_screen(box[2], box[3])
+        left = math.floor(xmin) - padding
+        top  = math.floor(ymin) - padding
+        return pygame.Rect(left, top, math.ceil(xmax) + padding + 1 - left, math.ceil(ymax) + padding + 1 - top)
+
+    def view_changed(self) -> bool: # 视图平移或者缩放之后需要整体重绘
+        old_state, self.camera_state = self.camera_state, self.camera.get_state()
+        return old_state != self.camera_state
+
+    def dot_rect(self, dot_id:str) -> pygame.Rect|None:
+        if dot_id is None or dot_id not in self.memory_object.dot_dict:
+            return None
+        x, y = self.memory_object.dot_dict[dot_id]
+        return self.box_to_rect((x, y, x, y), constant_config.DIRTY_PADDING)
+
+    def collect_dirty_rects(self, focus_dot, notice_node:set): # 返回需要重绘的 scene 区域，None 表示整体重绘
+        dirty_all, dirty_boxes = self.memory_object.pop_dirty()
+        pd_code_final = self.memory_object.get_pd_code_final_info()
+        if dirty_all or pd_code_final is not self.pd_code_final:
+            return None
+
+        rects = [self.box_to_rect(box, constant_config.DIRTY_PADDING) for box in dirty_boxes]
+        if focus_dot != self.focus_dot: # 选中的节点发生了变化
+            rects += [self.dot_rect(self.focus_dot), self.dot_rect(focus_dot)]
+        for dot_id in notice_node ^ self.notice_node:
+            rects.append(self.dot_rect(dot_id))
+        return [rect for rect in rects if rect is not None]
+
+    def get_pd_labels(self, clip:pygame.Rect) -> list: # get_number_position_pairs 的结果被缓存，结果不变时直接使用已经渲染好的文字，只返回与 clip 相交的文字
+        pairs = self.memory_object.get_number_position_pairs()
+        if pairs is not self.pd_label_source:
+            self.pd_label_source = pairs
+            self.pd_labels = [(self.get_small_text(number_str, constant_config.RED), pos) for number_str, pos in pairs]
+            self.pd_label_boxes = numpy.array([(pos[0], pos[1], surface.get_width(), surface.get_height()) for surface, pos in self.pd_labels], dtype=numpy.float64).reshape(-1, 4)
+        boxes = self.pd_label_boxes
+        x = boxes[:, 0] * self.camera.zoom + self.camera.offset_x
+        y = boxes[:, 1] * self.camera.zoom + self.camera.offset_y
+        mask = (x + boxes[:, 2] >= clip.left - 1) & (x <= clip.right + 1) & (y + boxes[:, 3] >= clip.top - 1) & (y <= clip.bottom + 1)
+        return [self.pd_labels[i] for i in numpy.flatnonzero(mask).tolist()]
+
+    def get_marks(self) -> dict: # 只在模型变化之后重新计算，平移视图时直接使用，代价不随标记的总数增长
+        mo = self.memory_object
+        if self.mark_version != mo.version:
+            pairs_of_line = {} # line_id -> [(逆向对的顺序, 逆向对)]，逆向对按照原来的顺序绘制
+            for index, pair in enumerate(mo.get_inverse_pairs()):
+                for line_id in pair:
+                    pairs_of_line.setdefault(line_id, []).append((index, pair))
+            self.marks = {
+                "base": set(mo.base_dot),
+                "dir": set(mo.dir_dot),
+                "base_nums": numpy.array([GeometryStore.dot_number(dot_id) for dot_id in mo.base_dot], dtype=numpy.int64),
+                "dir_nums": numpy.array([GeometryStore.dot_number(dot_id) for dot_id in mo.dir_dot], dtype=numpy.int64),
+                "pairs_of_line": pairs_of_line,
+                "crossings": None, # 逆向对的交点（模型坐标），只有简化模式会用到，第一次用到时计算
+            }
+            self.mark_version = mo.version
+            self.overlay_cache = {pair: item for pair, item in self.overlay_cache.items() if pair in mo.get_inverse_pairs()} # 删除已经不存在的逆向对的缓存
+        return self.marks
+
+    def get_crossings(self) -> numpy.ndarray: # 所有被交换过上下关系的交叉点（模型坐标），批量计算
+        marks = self.get_marks()
+        if marks["crossings"] is None:
+            mo = self.memory_object
+            inverse_pairs = list(mo.get_inverse_pairs())
+            points = numpy.zeros((0, 2))
+            if len(inverse_pairs) > 0:
+                nums = numpy.array([(GeometryStore.line_number(line_id_1), GeometryStore.line_number(line_id_2)) for line_id_1, line_id_2 in inverse_pairs])
+                starts_1, ends_1 = mo.store.get_line_coords(nums[:, 0])
+                starts_2, ends_2 = mo.store.get_line_coords(nums[:, 1])
+                points, _, _ = math_utils.batch_compute_intersection(starts_1, ends_1, starts_2, ends_2)
+                points = points[~numpy.isnan(points[:, 0])]
+            marks["crossings"] = points
+        return marks["crossings"]
+
+    def get_overlay(self, line_id_1:str, line_id_2:str): # 遮挡图形只在两条边的端点移动或者缩放之后重新计算
+        mo = self.memory_object
+        dot_11, dot_12 = mo.line_dict[line_id_1]
+        dot_21, dot_22 = mo.line_dict[line_id_2]
+        zoom = self.camera.zoom
+        key = (mo.dot_dict[dot_11], mo.dot_dict[dot_12], mo.dot_dict[dot_21], mo.dot_dict[dot_22], zoom)
+        item = self.overlay_cache.get((line_id_1, line_id_2))
+        if item is None or item[0] != key: # 在缩放之后、平移之前的坐标系中计算，平移视图时不需要重新计算
+            positions = [(x * zoom, y * zoom) for x, y in key[:4]]
+            item = (key, pygame_utils.compute_line_on_line(*positions))
+            self.overlay_cache[(line_id_1, line_id_2)] = item
+        return item[1]
+
+    def get_screen_dots(self, dot_nums, coords, clip:pygame.Rect, margin:int): # 只保留屏幕上 clip 附近的节点，返回 (dot_nums, 屏幕坐标)
+        pos = coords * self.camera.zoom + (self.camera.offset_x, self.camera.offset_y)
+        mask = ((pos[:, 0] >= clip.left - margin) & (pos[:, 0] <= clip.right + margin) &
+                (pos[:, 1] >= clip.top - margin) & (pos[:, 1] <= clip.bottom + margin))
+        return dot_nums[mask], pos[mask]
+
+    def update_level(self, clip:pygame.Rect): # 根据屏幕上的节点密度选择绘制模式，只统计空间索引中位于 clip 内的节点
+        self.visible_dots = self.memory_object.dot_grid.count_rect(*self.camera.screen_to_world_rect(clip.left, clip.top, clip.right, clip.bottom))
+        pixels_per_dot = clip.width * clip.height / max(self.visible_dots, 1)
+        if self.coarse: # 两个方向的阈值不同，避免在阈值附近来回切换
+            self.coarse = pixels_per_dot < constant_config.LOD_PIXELS_PER_DOT * constant_config.LOD_HYSTERESIS
+        else:
+            self.coarse = pixels_per_dot < constant_config.LOD_PIXELS_PER_DOT
+
+    def draw_coarse(self, scene, clip:pygame.Rect, focus_dot, notice_node:set): # 简化模式
+        mo = self.memory_object
+        camera = self.camera
+        size = constant_config.LOD_DOT_SIZE
+        mark_size = size + 2
+        notice_size = constant_config.LOD_NOTICE_SIZE
+        margin = max(mark_size, notice_size) # 节点本身不在 clip 中时，标记仍然可能与 clip 相交
+
+        if clip == self.scene.get_rect() and self.visible_dots * 2 >= len(mo.dot_dict): # 大部分节点都在屏幕上：直接使用所有节点和边的数组
+            dot_nums, coords = mo.store.get_dot_arrays()
+            line_nums = mo.store.line_numbers()
+        else: # 从空间索引中取出候选的节点和边，平移时的代价只与屏幕上的内容有关
+            world_rect = camera.screen_to_world_rect(clip.left - margin, clip.top - margin, clip.right + margin, clip.bottom + margin)
+            dot_nums = numpy.array(sorted(GeometryStore.dot_number(dot_id) for dot_id, _ in mo.dot_grid.query_rect(*world_rect)), dtype=numpy.int64)
+            coords = mo.store.get_dot_coords(dot_nums)
+            line_nums = numpy.array(sorted(GeometryStore.line_number(line_id) for line_id in mo.get_segment_grid().query_rect_ids(*world_rect)), dtype=numpy.int64)
+
+        dot_nums, pos = self.get_screen_dots(dot_nums, coords, clip, margin)
+        mark_index = self.get_marks()
+        for mark_nums, color in [(mark_index["base_nums"], constant_config.BLUE), (mark_index["dir_nums"], constant_config.GREEN)]: # 起始点和方向点
+            marks = numpy.isin(dot_nums, mark_nums)
+            for x, y in pos[marks].tolist():
+                scene.fill(color, (int(x) - mark_size // 2, int(y) - mark_size // 2, mark_size, mark_size))
+
+        starts, ends = mo.store.get_line_coords(line_nums) # 只绘制包围盒与 clip 相交的边
+        offset = (camera.offset_x, camera.offset_y)
+        starts = starts * camera.zoom + offset
+        ends   = ends * camera.zoom + offset
+        lo = numpy.minimum(starts, ends)
+        hi = numpy.maximum(starts, ends)
+        mask = ((hi[:, 0] >= clip.left - 1) & (lo[:, 0] <= clip.right + 1) &
+                (hi[:, 1] >= clip.top - 1) & (lo[:, 1] <= clip.bottom + 1))
+        for pos_from, pos_to in zip(starts[mask].tolist(), ends[mask].tolist()):
+            pygame.draw.line(scene, constant_config.BLACK, pos_from, pos_to)
+
+        degree = mo.store.get_degrees(dot_nums)
+        focus_num = GeometryStore.dot_number(focus_dot) if focus_dot is not None else None
+        for num, d, (x, y) in zip(dot_nums.tolist(), degree.tolist(), pos.tolist()): # 节点
+            color = constant_config.BLACK if d == 2 else constant_config.GREY
+            if num == focus_num:
+                color = constant_config.RED
+            scene.fill(color, (int(x) - size // 2, int(y) - size // 2, size, size))
+
+        if len(notice_node) > 0: # 简化模式下没有编号，需要注意的节点用红色空心方框标出
+            marks = numpy.isin(dot_nums, [GeometryStore.dot_number(dot_id) for dot_id in notice_node])
+            for x, y in pos[marks].tolist():
+                pygame.draw.rect(scene, constant_config.RED, (int(x) - notice_size // 2, int(y) - notice_size // 2, notice_size, notice_size), 1)
+
+        points = numpy.floor(self.get_crossings() * camera.zoom + offset).astype(numpy.int64) # 被交换过上下关系的交叉点
+        mask = ((points[:, 0] >= clip.left - mark_size) & (points[:, 0] <= clip.right + mark_size) &
+                (points[:, 1] >= clip.top - mark_size) & (points[:, 1] <= clip.bottom + mark_size))
+        for x, y in numpy.unique(points[mask], axis=0).tolist(): # 落在同一个像素上的交叉点只绘制一次
+            scene.fill(constant_config.BLUE, (x - mark_size // 2, y - mark_size // 2, mark_size, mark_size))
+
+    def draw_scene(self, clip:pygame.Rect, focus_dot, notice_node:set): # 重新绘制 scene 中的 clip 区域
+        mo = self.memory_object
+        camera = self.camera
+        full = clip == self.scene.get_rect()
+        scene = self.scene if full else self.scratch # 整体重绘时不需要草稿表面
+        scene.fill(constant_config.WHITE, clip)
+
+        if full:
+            self.update_level(clip)
+        if self.coarse:
+            self.draw_coarse(scene, clip, focus_dot, notice_node)
+            if not full:
+                self.scene.blit(self.scratch, clip, clip)
+            return
+
+        # 只绘制可能与 clip 相交的节点和边，按照编号排序，保证局部重绘与整体重绘的结果完全一致
+        margin = constant_config.DIRTY_PADDING
+        dot_items = mo.dot_grid.query_rect(*camera.screen_to_world_rect(clip.left - margin, clip.top - margin, clip.right + margin, clip.bottom + margin))
+        dot_items.sort(key=lambda item: GeometryStore.dot_number(item[0]))
+        margin = constant_config.LINE_WIDTH
+        line_ids = sorted(
+            mo.get_segment_grid().query_rect_ids(*camera.screen_to_world_rect(clip.left - margin, clip.top - margin, clip.right + margin, clip.bottom + margin)),
+            key=GeometryStore.line_number)
+
+        screen_pos = {dot_id: camera.world_to_screen(x, y) for dot_id, (x, y) in dot_items}
+        def get_pos(dot_id): # 边的端点可能不在 dot_items 中
+            if dot_id not in screen_pos:
+                screen_pos[dot_id] = camera.world_to_screen(*mo.dot_dict[dot_id])
+            return screen_pos[dot_id]
+
+        mark_index = self.get_marks()
+        for mark_set, color in [(mark_index["base"], constant_config.BLUE), (mark_index["dir"], constant_config.GREEN)]: # 起始点和方向点
+            for dot_id, ignored in dot_items:
+                if dot_id in mark_set:
+                    x, y = get_pos(dot_id)
+                    pygame_utils.draw_empty_circle(scene, color, x, y, constant_config.CIRCLE_RADIUS + 3)
+
+        for line_id in line_ids: # 边
+            dot_from, dot_to = mo.line_dict[line_id]
+            pygame_utils.draw_thick_line(scene, get_pos(dot_from), get_pos(dot_to), constant_config.LINE_WIDTH, constant_config.BLACK)
+
+        degree = mo.get_degree()
+        dot_items = [(dot_id, screen_pos[dot_id]) for dot_id, _ in dot_items]
+        for dot_id, (x, y) in dot_items: # 节点
+            color = constant_config.RED if dot_id == focus_dot else constant_config.BLACK
+            pygame_utils.draw_empty_circle(scene, color, x, y, constant_config.CIRCLE_RADIUS)
+            if degree[dot_id] != 2:
+                pygame_utils.draw_full_circle(scene, constant_config.GREY, x, y, constant_config.CIRCLE_RADIUS - 3)
+
+        pairs_of_line = mark_index["pairs_of_line"] # 逆向边遮挡只会出现在两条边的交点附近，只需要考虑与 clip 相交的边
+        for ignored, (line_id_1, line_id_2) in sorted({item for line_id in line_ids for item in pairs_of_line.get(line_id, ())}):
+            overlay = self.get_overlay(line_id_1, line_id_2)
+            if overlay is not None:
+                pygame_utils.draw_overlay(scene, overlay, constant_config.BLACK, camera.offset_x, camera.offset_y)
+
+        for dot_id, (x, y) in dot_items: # 节点编号
+            color = constant_config.RED if dot_id in notice_node else constant_config.BLACK
+            text_now = self.get_small_text(dot_id.split("_")[-1], color)
+            scene.blit(text_now, (x - constant_config.CIRCLE_RADIUS + 1, y - constant_config.CIRCLE_RADIUS + 1))
+
+        if mo.get_pd_code_final_info() is not None: # 交叉点附近的 pd_code 弧线编号
+            for surface, pos_to_show in self.get_pd_labels(clip):
+                scene.blit(surface, camera.world_to_screen(*pos_to_show))
+
+        if not full:
+            self.scene.blit(self.scratch, clip, clip)
+
+    def render(self, screen, focus_dot, notice_node:list, overlays:list) -> list:
+        """
+        把 scene 中发生变化的部分以及 overlays 绘制到屏幕上
+
+        Args:
+            screen(pygame.Surface): 屏幕
+            focus_dot(str|None): 用红色标出的选中节点
+            notice_node(list): 用红色标出编号的节点
+            overlays(list): 绘制在 scene 上方的 (surface, pos)，例如消息和状态栏
+
+        Returns:
+            list: 屏幕上发生变化的矩形，没有变化时返回空列表
+        """
+        notice_node = set(notice_node)
+        screen_rect = screen.get_rect()
+
+        rects = self.collect_dirty_rects(focus_dot, notice_node)
+        if self.scene is None or self.scene.get_size() != screen.get_size():
+            self.scene   = pygame.Surface(screen.get_size())
+            self.scratch = pygame.Surface(screen.get_size())
+            self.camera_state = None
+
+        if self.view_changed():
+            rects = None
+
+        if rects is not None and len(rects) > constant_config.MAX_DIRTY_RECTS: # 矩形太多时合并为一个
+            rects = [rects[0].unionall(rects[1:])]
+        if rects is not None:
+            rects = [rect.clip(screen_rect) for rect in rects]
+            rects = [rect for rect in rects if rect.width > 0 and rect.height > 0]
+
+        if rects is None:
+            self.draw_scene(screen_rect, focus_dot, notice_node)
+            rects = [screen_rect]
+        else:
+            for rect in rects:
+                self.draw_scene(rect, focus_dot, notice_node)
+
+        self.focus_dot     = focus_dot
+        self.notice_node   = notice_node
+        self.pd_code_final = self.memory_object.get_pd_code_final_info()
+
+        overlay_rects = [surface.get_rect(topleft=pos) for surface, pos in overlays]
+        if rects != [screen_rect]:
+            for i in range(max(len(overlays), len(self.overlays))): # 消息或者状态栏发生了变化，新旧位置都需要更新
+                new = overlays[i] if i < len(overlays) else None
+                old = self.overlays[i] if i < len(self.overlays) else None
+                if new is None or old is None or new[0] is not old[0] or new[1] != old[1]:
+                    rects += [item[0].get_rect(topleft=item[1]) for item in [old, new] if item is not None]
+        self.overlays = list(overlays)
+
+        ans = []
+        for rect in rects: # scene 的内容以及覆盖在上面的消息
+            rect = rect.clip(screen_rect)
+            if rect.width == 0 or rect.height == 0:
+                continue
+            screen.set_clip(rect)
+            screen.blit(self.scene, rect, rect)
+            for (surface, pos), overlay_rect in zip(overlays, overlay_rects):
+                if overlay_rect.colliderect(rect):
+                    screen.blit(surface, pos)
+            ans.append(rect)
+        screen.set_clip(None)
+        return ans
@@ -1,5 +1,4 @@
 import pygame
-import numpy
 import time
 import functools
 import os
@@ -11,8 +10,11 @@ import GameObject
 import MemoryObject
 import MyAlgorithm
 import constant_config
-import pygame_utils
 import math_utils
+import AutoSaver
+import KnotRenderer
+import Camera
+import instrumentation
 
 STATUS_LIST = [
     "free",        # 自由状态
@@ -47,25 +49,40 @@ class Knotpen2GameObject(GameObject.GameObject):
         self.last_c_down     = -1          # 上次键盘按下 c 键
         self.last_l_down     = -1          # 上次键盘按下 l 键
         self.last_n_down     = -1          # 上次键盘按下 n 键
+        self.last_p_down     = -1          # 上次键盘按下 p 键
         self.last_r_down     = -1          # 键盘上一次按下按键 r 的时刻
         self.last_backup     = time.time() # 上次自动保存时间
+        self.auto_saver      = AutoSaver.AutoSaver() # 在后台线程中自动保存
         self.notice_node     = []          # 用红色标出一些节点编号
+        self.camera          = Camera.Camera() # 平移和缩放只修改视图，不修改模型中的坐标
+        self.renderer        = KnotRenderer.KnotRenderer(memory_object, self.camera, get_small_text) # 只重新绘制发生变化的区域
     
     def get_window_caption(self) -> str:
         return constant_config.APP_NAME + "_" + constant_config.APP_VERSION
 
     def handle_quit(self):
         self.leave_message(_("自动保存中，请不要关闭窗口 ..."), constant_config.YELLOW)
+        self.auto_saver.flush() # 等待后台保存任务完成，避免与下面的写入交错
         self.memory_object.dump_object(constant_config.AUTOSAVE_FILE) # 自动保存
         self.leave_message(_("自动保存成功"), constant_config.GREEN)
 
         self.status = "quit"
     
+    def get_world_pos(self, x, y) -> tuple: # 屏幕坐标 -> 模型坐标，取整之后存入模型
+        wx, wy = self.camera.screen_to_world(x, y)
+        return (round(wx), round(wy))
+
     def handle_mouse_down(self, button, x, y): # 鼠标按下
         super().handle_mouse_down(button, x, y)
         
         if button == constant_config.LEFT_KEY_ID:
-            self.handle_left_mouse_down(x, y)
+            self.handle_left_mouse_down(*self.get_world_pos(x, y))
+
+        elif button == constant_config.WHEEL_UP_ID: # 滚轮缩放，鼠标所在位置保持不动
+            self.camera.zoom_at(constant_config.ZOOM_STEP, x, y)
+
+        elif button == constant_config.WHEEL_DOWN_ID:
+            self.camera.zoom_at(1 / constant_config.ZOOM_STEP, x, y)
 
     def leave_message(self, s, color=constant_config.BLACK, replace=False): # 在屏幕上绘制信息
         if replace and len(self.msg_txt) >= 1: # 替换最后一条消息
@@ -94,68 +111,79 @@ class Knotpen2GameObject(GameObject.GameObject):
 
         return "%s/%s/%s" % (outter_name, foldername, filename)
 
-    def save_svg_answer(self, svg_filename:str, s):
+    def save_svg_answer(self, svg_filename:str, geometry:dict, need_number:bool, need_arrow:bool): # svg 文本边生成边写入
         os.makedirs(constant_config.ANSWER_FOLDER, exist_ok=True)
         foldername  = os.path.basename(constant_config.ANSWER_FOLDER) # 文件夹名称
         outter_name = os.path.basename(os.path.dirname(constant_config.ANSWER_FOLDER))
         filename    = svg_filename
         filepath    = os.path.join(constant_config.ANSWER_FOLDER, filename)
 
-        with open(filepath, "w") as fp:
-            fp.write(s)
+        self.algo.write_svg(filepath, geometry, need_number, need_arrow)
 
         return "%s/%s/%s" % (outter_name, foldername, filename)
 
     def output_answer(self):
+        with instrumentation.session(): # 开启性能统计时，只统计这一次计算
+            with instrumentation.timer("output_answer"):
+                self.compute_and_save_answer()
+        if instrumentation.enabled:
+            self.report_instrumentation()
+
+    def report_instrumentation(self): # 显示各阶段的耗时，并导出 json 以及 cProfile 的统计结果
+        for line in instrumentation.summary_lines():
+            self.leave_message(line, constant_config.BLUE)
+
+        os.makedirs(constant_config.ANSWER_FOLDER, exist_ok=True)
+        basename = os.path.join(constant_config.ANSWER_FOLDER, math_utils.get_formatted_datetime())
+        instrumentation.dump_json(basename + ".profile.json")
+        self.leave_message(_("性能统计保存在 %s") % (basename + ".profile.json"), constant_config.BLUE)
+        if instrumentation.dump_profile(basename + ".prof"):
+            self.leave_message(_("cProfile 统计结果保存在 %s") % (basename + ".prof"), constant_config.BLUE)
+
+    def compute_and_save_answer(self):
         self.leave_message(_("开始计算 PD_CODE"), constant_config.YELLOW)
-        degree_check_list = self.algo.degree_check()
-        if len(degree_check_list) > 0: # 发现了有些节点度不为 2
-            self.leave_message(_("%d 个节点度数不为 2，请注意灰色标出的节点") % len(degree_check_list), constant_config.RED)
+        answer = self.algo.compute_answer(self.leave_message)
+        if answer["notice_node"] is not None:
+            self.notice_node = answer["notice_node"]
+        if not answer["success"]:
+            self.leave_message(answer["message"], constant_config.RED)
             return
-        adj_list, block_list        = self.algo.get_connected_components()           # 计算出所有连通分支
-        suc, msg, baseL, dirL, nntc = self.algo.check_base_dir(adj_list, block_list) # 检查每个连通分支是否都有 base 和 dir 节点，检查节点数是否大于等于 3
-        self.notice_node            = nntc
-        if not suc:
-            self.leave_message(msg, constant_config.RED)
-            return
-        # pd_code_to_show 中记录的是最终计算得到的 pd_code
-        # pd_code_final 中记录的是用于在屏幕上显示 pd_code 弧线编号的相关信息
-        # parts 记录的是每个连通分量上的交叉点构成的序列，parts 对连通分量的处理顺序与 block_list 一致
-        pd_code_to_show, pd_code_final, parts = self.algo.solve_pd_code(adj_list, block_list, baseL, dirL, self.leave_message)
-        self.memory_object.set_pd_code_final_info(pd_code_final)
 
         # 保存文本文件的 PD_CODE
-        filename = self.save_answer(str(pd_code_to_show))
+        with instrumentation.timer("save_answer"):
+            filename = self.save_answer(str(answer["pd_code"]))
         self.leave_message(_("PD_CODE 计算成功"), constant_config.GREEN)
         self.leave_message(_("保存在 %s") % filename, constant_config.GREEN)
 
-        # 生成 svg 文件格式的扭结图片（不带有弧线编号信息）
-        svg_filename = filename.split("/")[-1].replace(".txt", ".nonum.svg")
-        svg_text = self.algo.calculate_svg(block_list, parts, False, False)
-        svg_return_name = self.save_svg_answer(svg_filename, svg_text)
-        self.leave_message(_("扭结图像（不带弧线编号信息）生成成功"), constant_config.GREEN)
-        self.leave_message(_("保存在 %s") % svg_return_name, constant_config.GREEN)
-
-        # 生成 svg 文件格式的扭结图片（带有弧线编号信息）
-        svg_filename = filename.split("/")[-1].replace(".txt", ".num.svg")
-        svg_text = self.algo.calculate_svg(block_list, parts, True, False)
-        svg_return_name = self.save_svg_answer(svg_filename, svg_text)
-        self.leave_message(_("扭结图像（带弧线编号信息）生成成功"), constant_config.GREEN)
-        self.leave_message(_("保存在 %s") % svg_return_name, constant_config.GREEN)
-
-        # 生成 svg 文件格式的扭结图片（带有弧线方向信息）
-        svg_filename = filename.split("/")[-1].replace(".txt", ".arrow.svg")
-        svg_text = self.algo.calculate_svg(block_list, parts, False, True)
-        svg_return_name = self.save_svg_answer(svg_filename, svg_text)
-        self.leave_message(_("扭结图像（带弧线方向信息）生成成功"), constant_config.GREEN)
-        self.leave_message(_("保存在 %s") % svg_return_name, constant_config.GREEN)
+        # 生成 svg 文件格式的扭结图片
+        svg_messages = {
+            "nonum": _("扭结图像（不带弧线编号信息）生成成功"),
+            "num":   _("扭结图像（带弧线编号信息）生成成功"),
+            "arrow": _("扭结图像（带弧线方向信息）生成成功"),
+        }
+        svg_extension = ".svgz" if constant_config.SVG_GZIP else ".svg"
+        for suffix, need_number, need_arrow in MyAlgorithm.SVG_VARIANTS:
+            svg_filename = filename.split("/")[-1].replace(".txt", "." + suffix + svg_extension)
+            svg_return_name = self.save_svg_answer(svg_filename, answer["svg_geometry"], need_number, need_arrow)
+            self.leave_message(svg_messages[suffix], constant_config.GREEN)
+            self.leave_message(_("保存在 %s") % svg_return_name, constant_config.GREEN)
     
     def handle_key_down(self, key, mod, unicode): # 处理键盘事件
         super().handle_key_down(key, mod, unicode)
 
         key_name = pygame.key.name(key)
-        if key_name == 'a':
-            self.memory_object.shift_position(-constant_config.STRIDE, 0)
+        if mod & pygame.KMOD_CTRL and key_name in ['z', 'y']: # Ctrl+Z 撤销，Ctrl+Y 重做
+            if key_name == 'z':
+                success = self.memory_object.undo()
+                self.leave_message(_("撤销") if success else _("没有可以撤销的操作"), constant_config.BLACK)
+            else:
+                success = self.memory_object.redo()
+                self.leave_message(_("重做") if success else _("没有可以重做的操作"), constant_config.BLACK)
+            self.status = "free" # 撤销之后原来选中的节点可能已经不存在
+            self.focus_dot = None
+
+        elif key_name == 'a': # 平移视图
+            self.camera.pan(-constant_config.STRIDE, 0)
 
         elif key_name == 'b': # set base point
 
@@ -167,12 +195,12 @@ class Knotpen2GameObject(GameObject.GameObject):
 
         elif key_name == 'c':
             if time.time() - self.last_c_down < constant_config.DOUBLE_CLICK_TIME:
-                self.memory_object.auto_backup()
+                self.auto_saver.request_save(self.memory_object, autosave=False) # 清空之前先备份
                 self.memory_object.clear()
             self.last_c_down = time.time()
 
         elif key_name == 'd':
-            self.memory_object.shift_position(+constant_config.STRIDE, 0)
+            self.camera.pan(+constant_config.STRIDE, 0)
 
         elif key_name == 'l':
             if time.time() - self.last_l_down < constant_config.DOUBLE_CLICK_TIME:
@@ -184,13 +212,23 @@ class Knotpen2GameObject(GameObject.GameObject):
                 i18n.set_next_language(self.leave_message)
             self.last_n_down = time.time()
 
+        elif key_name == 'p': # 开启或者关闭性能统计
+            if time.time() - self.last_p_down < constant_config.DOUBLE_CLICK_TIME:
+                instrumentation.set_enabled(not instrumentation.enabled, with_profile=True)
+                if instrumentation.enabled:
+                    self.leave_message(_("性能统计已开启，计算 PD_CODE 之后会显示各阶段的耗时"), constant_config.BLUE)
+                else:
+                    self.leave_message(_("性能统计已关闭"), constant_config.BLUE)
+            self.last_p_down = time.time()
+
         elif key_name == 'r':
             if time.time() - self.last_r_down < constant_config.DOUBLE_CLICK_TIME:
+                self.auto_saver.flush() # 保证最新的备份已经写入
                 self.memory_object.load_last_auto_save()
             self.last_r_down = time.time()
 
         elif key_name == 's':
-            self.memory_object.shift_position(0, +constant_config.STRIDE)
+            self.camera.pan(0, +constant_config.STRIDE)
 
         elif key_name == 't': # set dir point
             if self.status == "select_dot":
@@ -200,7 +238,7 @@ class Knotpen2GameObject(GameObject.GameObject):
                     self.focus_dot = None # 回退到常规模式
         
         elif key_name == 'w':
-            self.memory_object.shift_position(0, -constant_config.STRIDE)
+            self.camera.pan(0, -constant_config.STRIDE)
 
         elif key_name == 'delete' or key_name == 'backspace':
             if self.status == "select_dot" and self.focus_dot is not None: # 删除节点并回退到正常模式
@@ -224,18 +262,14 @@ class Knotpen2GameObject(GameObject.GameObject):
         super().handle_mouse_move(x, y, show_log)
 
         if self.status == "move_dot" and self.focus_dot is not None:
-            self.memory_object.set_dot_position(self.focus_dot, x, y)
+            self.memory_object.set_dot_position(self.focus_dot, *self.get_world_pos(x, y))
             self.actually_moved = True
 
-    def get_mouse_on_dot_id(self, x, y):
-        mouse_on_dot_id = None
-        dot_dict = self.memory_object.get_dot_dict() # 绘制所有节点
-        for dot_id in dot_dict:
-            x_dot, y_dot = dot_dict[dot_id]
-            if numpy.linalg.norm(numpy.array([x_dot - x, y_dot - y])) <= constant_config.CIRCLE_RADIUS + 1:
-                mouse_on_dot_id = dot_id
-                break
-        return mouse_on_dot_id
+    def get_mouse_on_dot_id(self, x, y): # (x, y) 是模型坐标，节点在屏幕上的半径不随缩放变化
+        return self.memory_object.find_nearest_dot(x, y, (constant_config.CIRCLE_RADIUS + 1) / self.camera.zoom)
+
+    def get_mouse_on_lines(self, x, y):
+        return self.memory_object.find_nearest_lines(x, y, (constant_config.CIRCLE_RADIUS + constant_config.LINE_WIDTH/2 + 1) / self.camera.zoom)
 
     def handle_left_mouse_up(self, x, y):
         self.left_mouse_down = False
@@ -243,10 +277,11 @@ class Knotpen2GameObject(GameObject.GameObject):
 
         if self.status == "move_dot": # 移动节点结束
             self.status = "free"
+        self.memory_object.seal_history() # 一次拖动在撤销栈中只占一条记录
         
         if self.status == "free":
             if mouse_on_dot_id is None:
-                line_pair_list = self.memory_object.find_nearest_lines(x, y)
+                line_pair_list = self.get_mouse_on_lines(x, y)
 
                 if len(line_pair_list) == 2: # 左键交换上下关系
                     self.memory_object.swap_line_order(line_pair_list[0][0], line_pair_list[1][0])
@@ -280,10 +315,10 @@ class Knotpen2GameObject(GameObject.GameObject):
     def handle_mouse_up(self, button, x, y):
         super().handle_mouse_up(button, x, y)
         if button == constant_config.LEFT_KEY_ID: # 点击左键可以添加结点
-            self.handle_left_mouse_up(x, y)
+            self.handle_left_mouse_up(*self.get_world_pos(x, y))
 
         elif button == constant_config.RIGHT_KEY_ID: # 右键单击可以删除结点
-            self.handle_right_mouse_up(x, y)
+            self.handle_right_mouse_up(*self.get_world_pos(x, y))
 
 
     def handle_right_mouse_up(self, x, y):
@@ -294,7 +329,7 @@ class Knotpen2GameObject(GameObject.GameObject):
                 self.memory_object.erase_dot(mouse_on_dot_id)
 
             else: # 右键点击可以删除线
-                line_pair_list = self.memory_object.find_nearest_lines(x, y)
+                line_pair_list = self.get_mouse_on_lines(x, y)
 
                 if len(line_pair_list) == 1: # 删除一个边
                     self.memory_object.erase_line(line_pair_list[0][0])
@@ -303,84 +338,24 @@ class Knotpen2GameObject(GameObject.GameObject):
             self.status = "free"
 
     
-    def draw_screen(self, screen): # 绘制屏幕内容
-        super().draw_screen(screen)
-
+    def draw_screen(self, screen): # 绘制屏幕内容，返回屏幕上发生变化的矩形
         time_now = time.time()
-        if time_now - self.last_backup > constant_config.BACKUP_TIME:     # 自动保存
+        if time_now - self.last_backup > constant_config.BACKUP_TIME: # 自动保存：保存一个时间戳对应的文件以及 auto_save
             self.leave_message(_("正在自动保存请不要关闭软件 ..."), constant_config.YELLOW)
-            self.memory_object.auto_backup()                              # 保存一个时间戳对应的文件
-            self.memory_object.dump_object(constant_config.AUTOSAVE_FILE) # 保存一个 auto_save
-            self.leave_message(_("自动保存成功"), constant_config.GREEN, replace=True)
+            self.auto_saver.request_save(self.memory_object) # 只在这里获取快照，写文件在后台线程中完成
             self.last_backup = time_now
 
-        if self.memory_object.base_dot is not None: # 绘制起始点
-            for base_dot_id in self.memory_object.base_dot:
-                x, y = self.memory_object.dot_dict[base_dot_id]
-                pygame_utils.draw_empty_circle(screen, constant_config.BLUE, x, y, constant_config.CIRCLE_RADIUS + 3)
-
-        if self.memory_object.dir_dot is not None: # 绘制方向点
-            for dir_dot_id in self.memory_object.dir_dot:
-                x, y = self.memory_object.dot_dict[dir_dot_id]
-                pygame_utils.draw_empty_circle(screen, constant_config.GREEN, x, y, constant_config.CIRCLE_RADIUS + 3)
-
-        dot_dict  = self.memory_object.get_dot_dict()
-        line_dict = self.memory_object.get_line_dict()
-        for line_id in line_dict:
-            dot_from, dot_to = line_dict[line_id]
-            pos_from = dot_dict[dot_from]
-            pos_to   = dot_dict[dot_to]
-            pygame_utils.draw_thick_line(screen, pos_from, pos_to, constant_config.LINE_WIDTH, constant_config.BLACK)
-
-        for dot_id in dot_dict: # 绘制所有节点
-            x, y = dot_dict[dot_id]
-
-            color = constant_config.BLACK
-            if self.status == "select_dot" and dot_id == self.focus_dot:
-                color = constant_config.RED
-            pygame_utils.draw_empty_circle(screen, color, x, y, constant_config.CIRCLE_RADIUS)
-
-            if self.memory_object.get_degree()[dot_id] != 2:
-                pygame_utils.draw_full_circle(screen, constant_config.GREY, x, y, constant_config.CIRCLE_RADIUS - 3)
-
-        # 重新绘制所有逆向边遮挡
-        for item in self.memory_object.get_inverse_pairs():
-            line_id1, line_id2 = item
-            dot_11, dot_12 = self.memory_object.get_line_dict()[line_id1]
-            dot_21, dot_22 = self.memory_object.get_line_dict()[line_id2]
-            pos_11 = dot_dict[dot_11]
-            pos_12 = dot_dict[dot_12]
-            pos_21 = dot_dict[dot_21]
-            pos_22 = dot_dict[dot_22]
-            pygame_utils.draw_line_on_line(screen, pos_11, pos_12, pos_21, pos_22, constant_config.BLACK)
-
-        # 绘制全局消息
-        for i in range(len(self.msg_txt)):
-            screen.blit(self.msg_txt[i], constant_config.MESSAGE_POSITION(i))
-
-        # 绘制节点编号
-        for dot_id in dot_dict:
-            posx, posy = dot_dict[dot_id]
-            
-            color = constant_config.BLACK
-            if dot_id in self.notice_node:
-                color = constant_config.RED
-
-            text_now = self.get_small_text(dot_id.split("_")[-1], color)
-            screen.blit(text_now, (posx - constant_config.CIRCLE_RADIUS + 1, posy - constant_config.CIRCLE_RADIUS + 1))
+        for message, color, replace in self.auto_saver.poll_messages(): # 显示后台保存的结果
+            self.leave_message(message, color, replace=replace)
 
-        # 绘制 pd_code_final_info
-        # 这段代码的用途是对每个交叉点，将数字绘制到交叉点附近
-        pd_code_final_info = self.memory_object.get_pd_code_final_info()
-        if pd_code_final_info is not None:
-            
-            # 计算屏幕上需要显示的编号
-            number_postion_pairs = self.memory_object.get_number_position_pairs()
+        # 全局消息以及连通分支状态绘制在几何内容的上方
+        overlays = [(self.msg_txt[i], constant_config.MESSAGE_POSITION(i)) for i in range(len(self.msg_txt))]
+        component_cnt, ready_cnt = self.renderer.get_live_status(self.algo)
+        status_txt = self.get_small_text(_("连通分支: %d, 已设置起始点和方向点: %d") % (component_cnt, ready_cnt), constant_config.GREY)
+        overlays.append((status_txt, constant_config.STATUS_POSITION(screen.get_height())))
 
-            # 将这些编号输出到屏幕上
-            for number_str, pos_to_show in number_postion_pairs:
-                txt_val = self.get_small_text(number_str, constant_config.RED)
-                screen.blit(txt_val, pos_to_show)
+        focus_dot = self.focus_dot if self.status == "select_dot" else None
+        return self.renderer.render(screen, focus_dot, self.notice_node, overlays)
     
     def die_check(self):
         return self.status == "quit"
@@ -1,14 +1,27 @@
-import numpy
+import gc
 import os
+import numpy
 from i18n import _
 
 # 相对导入
-import math_utils
 import constant_config
+import spatial_index
+import union_find
+import GeometryStore
+import save_format
+import UndoHistory
+from OperationJournal import journaled
 
 class MemoryObject:
-    def __init__(self, auto_load=True) -> None:
-        self.clear()
+    def __init__(self, auto_load=False) -> None: # 只有图形界面会自动加载 auto_save 中的存档
+        self.journal = None # 操作日志，见 OperationJournal.py
+        self.op_depth = 0   # 修改操作的嵌套深度，只有最外层的操作会被记录
+        self.delta_log = None   # 当前操作产生的所有逆操作（delta），见 apply_deltas
+        self.last_deltas = []   # 上一个最外层操作产生的逆操作
+        self.history = UndoHistory.UndoHistory() # 撤销、重做
+        self.history_busy = False # 正在撤销或者重做，此时产生的逆操作不进入撤销栈
+        self.version = 0          # 每次修改都会增加，用于判断缓存是否失效
+        self.reset()
         self.empty_info = self.get_all_info()
 
         if auto_load and os.path.isfile(constant_config.AUTOSAVE_FILE): # 自动加载存档
@@ -18,25 +31,256 @@ class MemoryObject:
             except:
                 print(_("加载失败，自动存档文件故障"))
 
-    def clear(self): # 初始化为空白状态
+    def clear(self): # 清空所有内容，与加载存档相同，是日志的分界点并且清空撤销栈
+        self.set_save_state(save_format.empty_state())
+
+    def reset(self): # 初始化为空白状态
         self.dot_id_max = 0
         self.line_id_max = 0
 
-        self.dot_dict = {}
-        self.line_dict = {}
+        self.store = GeometryStore.GeometryStore() # 节点坐标、边、度数保存在紧凑的数组中
+        self.dot_dict = self.store.dot_view   # 以 dict 的方式访问 store
+        self.line_dict = self.store.line_view
         self.inverse_pairs = {}
-        self.degree = {}
+        self.degree = self.store.degree_view  # 度数由 store 在增删边时自动维护
 
         self.base_dot = [] # 记录起始位置
         self.dir_dot = []  # 记录定向位置
         self.pd_code_final = None # 用于确定 pd_code 渲染信息，任何操作都会导致这个 info 被清空
+        self.number_position_source = None # get_number_position_pairs 的缓存对应的 pd_code_final
+        self.number_position_cache  = {}   # merge -> get_number_position_pairs 的结果
+
+        self.dot_grid     = spatial_index.PointGrid(constant_config.DOT_GRID_SIZE)       # 节点位置的空间索引
+        self.segment_grid = spatial_index.SegmentGrid(constant_config.SEGMENT_GRID_SIZE) # 边的空间索引，通过 get_segment_grid 访问
+        self.segment_grid_ready = True # False 表示 segment_grid 还没有建立，第一次查询时才会建立
+        self.dot_to_lines = {} # 邻接表：记录每个节点连接了哪些边，由 new_line, erase_line, erase_dot 增量维护
+        self.dot_pair_to_line = {} # 记录每一对节点之间的边，用于在 O(1) 时间内判断重复边
+        self.components = union_find.UnionFind() # 增量维护的连通分支，删除操作之后需要重建
+        self.components_dirty = False
+        self.mark_dirty(None)
+
+    def get_dot_pair(self, dot_id_1:str, dot_id_2:str): # 按照节点编号的数值大小排序
+        if GeometryStore.dot_number(dot_id_1) > GeometryStore.dot_number(dot_id_2):
+            dot_id_1, dot_id_2 = dot_id_2, dot_id_1
+        return (dot_id_1, dot_id_2)
+
+    def rebuild_index(self): # 根据 dot_dict 和 line_dict 重新建立空间索引、邻接表以及重复边检测表
+        dot_nums, coords = self.store.get_dot_arrays()
+        line_nums, line_ends = self.store.get_line_arrays()
+        dot_ids  = [GeometryStore.dot_key(num) for num in dot_nums.tolist()]
+        line_ids = [GeometryStore.line_key(num) for num in line_nums.tolist()]
+
+        self.dot_grid.clear()
+        self.dot_grid.bulk_load(dot_ids, GeometryStore.plain_rows(coords)) # 批量建立空间索引
+        self.segment_grid.clear() # 边的空间索引在第一次查询时才建立，加载存档时不需要计算每条边经过的格子
+        self.segment_grid_ready = False
+
+        self.dot_to_lines = {dot_id: [] for dot_id in dot_ids}
+        self.dot_pair_to_line = {}
+        self.components_dirty = True
+        dot_key_of = dict(zip(dot_nums.tolist(), dot_ids)) # 节点编号 -> dot_id，不需要为每个端点重新拼接字符串
+        for line_id, (num_from, num_to) in zip(line_ids, line_ends.tolist()):
+            dot_from = dot_key_of[num_from]
+            dot_to   = dot_key_of[num_to]
+            self.dot_to_lines[dot_from].append(line_id)
+            self.dot_to_lines[dot_to].append(line_id)
+            if num_from > num_to: # 与 get_dot_pair 相同，按照节点编号的数值大小排序
+                dot_from, dot_to = dot_to, dot_from
+            self.dot_pair_to_line[(dot_from, dot_to)] = line_id
+
+    def get_segment_grid(self) -> spatial_index.SegmentGrid: # 边的空间索引，需要时才批量建立
+        if not self.segment_grid_ready:
+            line_nums, starts, ends = self.store.get_segment_arrays()
+            gc_enabled = gc.isenabled() # 与 set_save_state 相同，批量建立索引时暂时关闭垃圾回收
+            gc.disable()
+            try:
+                self.segment_grid.bulk_load([GeometryStore.line_key(num) for num in line_nums.tolist()], starts, ends)
+            finally:
+                if gc_enabled:
+                    gc.enable()
+            self.segment_grid_ready = True
+        return self.segment_grid
+
+    # 基本修改操作（delta）
+    # 所有修改操作最终都由下面这些 delta_xxx 函数完成，每个函数都会通过 record_delta 记录自己的逆操作
+    # 逆操作的格式为 [名称, 参数 ...]，例如 ["move_dot", "dot_3", 100, 200]，可以被 json 序列化
+    # 对逆操作调用 apply_deltas 会产生原操作，因此撤销和重做使用的是同一套代码
+    DELTA_KINDS = {"add_dot", "remove_dot", "move_dot", "add_line", "remove_line", "set_inverse_pair", "set_marks", "set_id_max", "shift"}
+
+    def mark_dirty(self, points:list|None): # 记录发生变化的区域（这些点的包围盒），None 表示整个画面都发生了变化
+        self.version += 1
+        if points is None or len(self.dirty_boxes) >= constant_config.MAX_DIRTY_BOXES:
+            self.dirty_all = True
+            self.dirty_boxes = []
+        elif not self.dirty_all:
+            xs = [x for x, _ in points]
+            ys = [y for _, y in points]
+            self.dirty_boxes.append((min(xs), min(ys), max(xs), max(ys)))
+
+    def pop_dirty(self): # 取出并清空发生变化的区域，返回 (dirty_all, dirty_boxes)
+        ans = (self.dirty_all, self.dirty_boxes)
+        self.dirty_all = False
+        self.dirty_boxes = []
+        return ans
+
+    def get_line_points(self, line_id:str) -> list: # 边的两个端点坐标
+        dot_from, dot_to = self.line_dict[line_id]
+        return [self.dot_dict[dot_from], self.dot_dict[dot_to]]
+
+    def record_delta(self, delta:list):
+        if self.delta_log is not None:
+            self.delta_log.append(delta)
+
+    def delta_add_dot(self, dot_id:str, x, y):
+        self.store.add_dot(GeometryStore.dot_number(dot_id), x, y)
+        self.dot_grid.insert(dot_id, x, y)
+        self.dot_to_lines[dot_id] = []
+        if not self.components_dirty:
+            self.components.add(dot_id)
+        self.mark_dirty([(x, y)])
+        self.record_delta(["remove_dot", dot_id])
+
+    def delta_remove_dot(self, dot_id:str):
+        assert self.degree[dot_id] == 0 # 删除节点之前必须先删除相连的边
+        x, y = self.dot_dict[dot_id]
+        self.store.remove_dot(GeometryStore.dot_number(dot_id))
+        self.dot_grid.remove(dot_id)
+        del self.dot_to_lines[dot_id]
+        self.components_dirty = True # 并查集不支持删除，下次查询时重建
+        self.mark_dirty([(x, y)])
+        self.record_delta(["add_dot", dot_id, x, y])
+
+    def delta_move_dot(self, dot_id:str, x, y):
+        x_old, y_old = self.dot_dict[dot_id]
+        points = [(x_old, y_old), (x, y)] + [self.dot_dict[self.get_other_end(line_id, dot_id)] for line_id in self.dot_to_lines[dot_id]]
+        self.mark_dirty(points) # 包含移动前后的节点以及相连的边
+        self.store.set_dot(GeometryStore.dot_number(dot_id), x, y)
+        self.dot_grid.move(dot_id, x, y)
+        if self.segment_grid_ready: # 更新与这个节点相连的边的空间索引
+            for line_id in self.dot_to_lines[dot_id]:
+                dot_from, dot_to = self.line_dict[line_id]
+                self.segment_grid.insert(line_id, self.dot_dict[dot_from], self.dot_dict[dot_to])
+        self.record_delta(["move_dot", dot_id, x_old, y_old])
+
+    def delta_add_line(self, line_id:str, dot_id_1:str, dot_id_2:str):
+        self.store.add_line(GeometryStore.line_number(line_id), GeometryStore.dot_number(dot_id_1), GeometryStore.dot_number(dot_id_2)) # 同时统计度数
+        self.dot_to_lines[dot_id_1].append(line_id)
+        self.dot_to_lines[dot_id_2].append(line_id)
+        self.dot_pair_to_line[self.get_dot_pair(dot_id_1, dot_id_2)] = line_id
+        if not self.components_dirty:
+            self.components.union(dot_id_1, dot_id_2)
+        if self.segment_grid_ready: # 还没有建立的索引会在建立时包含这条边
+            self.segment_grid.insert(line_id, self.dot_dict[dot_id_1], self.dot_dict[dot_id_2])
+        self.mark_dirty(self.get_line_points(line_id))
+        self.record_delta(["remove_line", line_id])
+
+    def delta_remove_line(self, line_id:str):
+        self.mark_dirty(self.get_line_points(line_id))
+        frm, eto = self.line_dict[line_id]
+        self.dot_to_lines[frm].remove(line_id)
+        self.dot_to_lines[eto].remove(line_id)
+        del self.dot_pair_to_line[self.get_dot_pair(frm, eto)]
+        self.components_dirty = True
+        self.store.remove_line(GeometryStore.line_number(line_id)) # 同时更新度数
+        if self.segment_grid_ready:
+            self.segment_grid.remove(line_id)
+        self.record_delta(["add_line", line_id, frm, eto])
+
+    def delta_set_inverse_pair(self, line_id_1:str, line_id_2:str, present:bool): # 添加或者删除一个逆向对
+        old = (line_id_1, line_id_2) in self.inverse_pairs
+        if old != present and line_id_1 in self.line_dict and line_id_2 in self.line_dict: # 遮挡关系只在两条边的交点附近绘制
+            self.mark_dirty(self.get_line_points(line_id_1) + self.get_line_points(line_id_2))
+        if present:
+            self.inverse_pairs[(line_id_1, line_id_2)] = True
+        elif old:
+            del self.inverse_pairs[(line_id_1, line_id_2)]
+        self.record_delta(["set_inverse_pair", line_id_1, line_id_2, old])
+
+    def delta_set_marks(self, base_dot:list, dir_dot:list): # 设置起始点列表和方向点列表
+        self.record_delta(["set_marks", list(self.base_dot), list(self.dir_dot)])
+        changed = set(self.base_dot) ^ set(base_dot) | set(self.dir_dot) ^ set(dir_dot)
+        for dot_id in changed:
+            if dot_id in self.dot_dict:
+                self.mark_dirty([self.dot_dict[dot_id]])
+        self.base_dot = list(base_dot)
+        self.dir_dot = list(dir_dot)
+
+    def delta_set_id_max(self, dot_id_max:int, line_id_max:int):
+        self.record_delta(["set_id_max", self.dot_id_max, self.line_id_max])
+        self.dot_id_max = dot_id_max
+        self.line_id_max = line_id_max
+
+    def delta_shift(self, dx, dy):
+        self.store.shift(dx, dy) # 向量化平移所有节点
+        self.dot_grid.shift(dx, dy)
+        if self.segment_grid_ready:
+            self.segment_grid.shift(dx, dy)
+        self.mark_dirty(None)
+        self.record_delta(["shift", -dx, -dy])
+
+    @journaled
+    def apply_deltas(self, deltas:list): # 依次执行若干基本修改操作，撤销、重做以及日志重放都会调用这个函数
+        self.pd_code_final = None
+        for delta in deltas:
+            assert delta[0] in self.DELTA_KINDS, "unknown delta: %r" % (delta[0], )
+            getattr(self, "delta_" + delta[0])(*delta[1:])
+
+    def rollback_deltas(self, deltas:list): # 操作失败时撤销已经完成的部分，不记录逆操作
+        delta_log, self.delta_log = self.delta_log, None
+        try:
+            for delta in reversed(deltas):
+                getattr(self, "delta_" + delta[0])(*delta[1:])
+        finally:
+            self.delta_log = delta_log
+
+    def commit_deltas(self, op:str, args:tuple, deltas:list): # 一个最外层操作结束时调用
+        self.last_deltas = deltas
+        if self.history is not None and not self.history_busy and len(deltas) > 0:
+            self.history.push(op, args, deltas)
+
+    def can_undo(self) -> bool:
+        return self.history is not None and self.history.can_undo()
+
+    def can_redo(self) -> bool:
+        return self.history is not None and self.history.can_redo()
+
+    def undo(self) -> bool: # 撤销一步，返回是否成功
+        if not self.can_undo():
+            return False
+        entry = self.history.pop_undo()
+        self.history_busy = True
+        try:
+            self.apply_deltas(entry.deltas[::-1]) # 逆操作需要倒序执行
+        finally:
+            self.history_busy = False
+        self.history.push_redo(entry.op, self.last_deltas)
+        return True
+
+    def redo(self) -> bool: # 重做一步，返回是否成功
+        if not self.can_redo():
+            return False
+        entry = self.history.pop_redo()
+        self.history_busy = True
+        try:
+            self.apply_deltas(entry.deltas[::-1])
+        finally:
+            self.history_busy = False
+        self.history.push_undo(entry.op, self.last_deltas)
+        return True
+
+    def seal_history(self): # 结束一次拖动，之后的 set_dot_position 不再与之前的合并
+        if self.history is not None:
+            self.history.seal()
 
     def set_pd_code_final_info(self, new_info): # 记录这个 final_info
         self.pd_code_final = new_info
+        self.number_position_cache = {}
+        self.mark_dirty(None)
 
     def get_pd_code_final_info(self) -> dict|None:
         return self.pd_code_final
 
+    @journaled
     def split_line_at(self, line_id, x, y):
         self.pd_code_final = None
         assert self.line_dict.get(line_id) is not None
@@ -50,15 +294,38 @@ class MemoryObject:
 
     def get_degree(self):
         return self.degree
+
+    def get_dot_to_lines(self) -> dict: # 获得节点到边的邻接表
+        return self.dot_to_lines
+
+    def get_other_end(self, line_id, dot_id): # 获得边 line_id 上除了 dot_id 以外的另一个节点
+        dot_from, dot_to = self.line_dict[line_id]
+        return dot_to if dot_from == dot_id else dot_from
+
+    def get_components(self) -> union_find.UnionFind: # 获得连通分支的并查集，删除操作之后在这里延迟重建
+        if self.components_dirty:
+            self.components.clear()
+            for dot_id in self.dot_dict:
+                self.components.add(dot_id)
+            for dot_from, dot_to in self.line_dict.values():
+                self.components.union(dot_from, dot_to)
+            self.components_dirty = False
+        return self.components
+
+    def get_component_count(self) -> int: # 连通分支的个数
+        return self.get_components().count
+
+    def get_component_id(self, dot_id): # 连通分支的代表元，同一个连通分支中的节点返回值相同
+        return self.get_components().find(dot_id)
     
-    def get_all_info(self) -> dict: # 获取对象的完整信息
+    def get_all_info(self) -> dict: # 获取对象的完整信息，节点表、边表、度数表会被转换为普通的 dict
         return {
             "dot_id_max": self.dot_id_max,
             "line_id_max": self.line_id_max,
-            "dot_dict": self.dot_dict,
-            "line_dict": self.line_dict,
+            "dot_dict": dict(self.dot_dict.items()),
+            "line_dict": dict(self.line_dict.items()),
             "inverse_pairs": self.inverse_pairs,
-            "degree": self.degree,
+            "degree": dict(self.degree.items()),
             "base_dot": self.base_dot,
             "dir_dot": self.dir_dot,
             "pd_code_final": self.pd_code_final,
@@ -67,7 +334,7 @@ class MemoryObject:
     def get_all_auto_save(self):
         arr = []
         for file in os.listdir(constant_config.AUTOSAVE_FOLDER):
-            if file != os.path.basename(constant_config.AUTOSAVE_FILE):
+            if file != os.path.basename(constant_config.AUTOSAVE_FILE) and not file.startswith("."): # 忽略原子写入时的临时文件
                 arr.append(file)
         arr = sorted(arr)
         return arr
@@ -78,108 +345,117 @@ class MemoryObject:
             lastfile = os.path.join(constant_config.AUTOSAVE_FOLDER, arr[-1])
             self.load_object(lastfile)
 
-    def auto_delete_duplicate(self):
-        arr = self.get_all_auto_save()
-        if len(arr) >= 2:
-            lastfile = os.path.join(constant_config.AUTOSAVE_FOLDER, arr[-1]) # 倒数第一个
-            nextfile = os.path.join(constant_config.AUTOSAVE_FOLDER, arr[-2]) # 倒数第二个
-
-            if open(lastfile).read() == open(nextfile).read():
-                try:
-                    os.remove(lastfile)
-                    print(_("由于没有修改，因此最后一次自动保存被删除"))
-                except:
-                    pass
-
-    def auto_backup(self): # 自动保存时，不允许保持空白状态，但是退出时的自动保存可以保存空白状态
-        if self.get_all_info() != self.empty_info: 
-            filename = math_utils.get_formatted_datetime() + ".json"
-            folder = constant_config.AUTOSAVE_FOLDER
-            filepath = os.path.join(folder, filename)
-            self.dump_object(filepath) # 保存一个备份文件，每隔一段时间自动保存一次
-
-            self.auto_delete_duplicate() # 自动删除重复的
-
-    def dump_object(self, filepath:str):
+    def is_empty(self) -> bool: # 是否处于空白状态，有节点时不需要比较完整信息
+        return len(self.dot_dict) == 0 and self.get_all_info() == self.empty_info
+
+    def get_save_state(self) -> dict: # 获取用于存档的 state，格式见 save_format.py，返回的是一份快照，不会随之后的修改而变化
+        dot_nums, coords = self.store.get_dot_arrays()
+        line_nums, line_ends = self.store.get_line_arrays()
+        return {
+            "dot_id_max": self.dot_id_max,
+            "line_id_max": self.line_id_max,
+            "dot_nums": dot_nums,
+            "coords": coords,
+            "line_nums": line_nums,
+            "line_ends": line_ends,
+            "inverse_pairs": [(GeometryStore.line_number(line_id_1), GeometryStore.line_number(line_id_2)) for line_id_1, line_id_2 in self.inverse_pairs],
+            "base_dot": [GeometryStore.dot_number(dot_id) for dot_id in self.base_dot],
+            "dir_dot": [GeometryStore.dot_number(dot_id) for dot_id in self.dir_dot],
+            "pd_code_final": save_format.normalize_pd_code_final(self.pd_code_final), # 复制一份，shift_position 会原地修改
+        }
+
+    def set_save_state(self, state:dict): # 从 state 恢复，度数由 store 重新统计
+        # 整体替换的逆操作需要保存完整的旧状态，代价与图的大小成正比，因此加载存档不可撤销
+        # 之前的撤销记录引用的是旧图中的编号，一并丢弃
+        if self.history is not None:
+            self.history.clear()
+
+        self.store.load_from_arrays(state["dot_nums"], state["coords"], state["line_nums"], state["line_ends"])
+        self.dot_id_max = state["dot_id_max"]
+        self.line_id_max = state["line_id_max"]
+        self.inverse_pairs = {(GeometryStore.line_key(num_1), GeometryStore.line_key(num_2)): True for num_1, num_2 in state["inverse_pairs"]}
+        self.base_dot = [GeometryStore.dot_key(num) for num in state["base_dot"]]
+        self.dir_dot = [GeometryStore.dot_key(num) for num in state["dir_dot"]]
+        self.pd_code_final = state["pd_code_final"]
+
+        gc_enabled = gc.isenabled() # 批量建立索引时会创建大量小对象，暂时关闭垃圾回收可以明显加快速度
+        gc.disable()
+        try:
+            self.rebuild_index()
+            self.mark_dirty(None)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+        if self.journal is not None and self.op_depth == 0: # 加载存档之后，日志从新的快照开始
+            self.journal.compact(self)
+
+    def dump_object(self, filepath:str): # 后缀名为 .npz 时保存为二进制格式，否则保存为 json 格式
         folder = os.path.dirname(os.path.abspath(filepath)) # 创建文件路径
         os.makedirs(folder, exist_ok=True)
         assert os.path.isdir(folder)
 
-        with open(filepath, "w") as fp:
-            fp.write(repr(self.get_all_info())) # 这种序列化方式有点不安全
-
-    def load_object(self, filepath:str):
-        assert os.path.isfile(filepath)
-        with open(filepath, "r") as fp:
-            obj = eval(fp.read()) # 这种序列化方式有点不安全
-        self.dot_id_max = obj["dot_id_max"]
-        self.line_id_max = obj["line_id_max"]
-        self.dot_dict = obj["dot_dict"]
-        self.line_dict = obj["line_dict"]
-        self.inverse_pairs = obj["inverse_pairs"]
-        self.degree = obj["degree"]
-        self.base_dot = obj["base_dot"]
-        self.dir_dot = obj["dir_dot"]
-        self.pd_code_final = obj["pd_code_final"]
+        save_format.write(filepath, self.get_save_state())
+
+    def load_object(self, filepath:str): # 可以加载旧版本的存档
+        if not os.path.isfile(filepath):
+            raise FileNotFoundError("save file not found: %s" % filepath)
+        self.set_save_state(save_format.read(filepath))
 
     def get_inverse_pairs(self):
         return self.inverse_pairs
     
+    @journaled
     def shift_position(self, dx, dy): # 所有点一起移动
         # 需要注意的是，这里需要移动 self.pd_code_final，因为这种移动不会破坏拓扑性质
         if self.pd_code_final is not None:
             for term in self.pd_code_final:
                 term["pos"] = (term["pos"][0] + dx, term["pos"][1] + dy)
+            self.number_position_cache = {} # 原地修改了 pd_code_final，缓存失效
 
-        for dot_idx in self.dot_dict:
-            x, y = self.dot_dict[dot_idx]
-            self.dot_dict[dot_idx] = (x + dx, y + dy)
+        self.delta_shift(dx, dy)
 
+    @journaled
     def set_base_dot(self, dot_idx): # 设置起始位置
         self.pd_code_final = None
-        if dot_idx not in self.base_dot:
-            self.base_dot.append(dot_idx)
+        base_dot, dir_dot = list(self.base_dot), list(self.dir_dot)
+        if dot_idx not in base_dot:
+            base_dot.append(dot_idx)
 
-            if dot_idx in self.dir_dot:
-                self.dir_dot.remove(dot_idx)
+            if dot_idx in dir_dot:
+                dir_dot.remove(dot_idx)
         else:
-            self.base_dot.remove(dot_idx)
+            base_dot.remove(dot_idx)
+        self.delta_set_marks(base_dot, dir_dot)
     
+    @journaled
     def set_dir_dot(self, dot_idx): # 设置起始位置的下一个位置，用于确定方向
         self.pd_code_final = None
-        if dot_idx not in self.dir_dot:
-            self.dir_dot.append(dot_idx)
+        base_dot, dir_dot = list(self.base_dot), list(self.dir_dot)
+        if dot_idx not in dir_dot:
+            dir_dot.append(dot_idx)
 
-            if dot_idx in self.base_dot:
-                self.base_dot.remove(dot_idx)
+            if dot_idx in base_dot:
+                base_dot.remove(dot_idx)
         else:
-            self.dir_dot.remove(dot_idx)
+            dir_dot.remove(dot_idx)
+        self.delta_set_marks(base_dot, dir_dot)
 
+    @journaled
     def swap_line_order(self, line_idx1, line_idx2):
         self.pd_code_final = None
         assert line_idx1 != line_idx2
         assert self.line_dict.get(line_idx1) is not None
         assert self.line_dict.get(line_idx2) is not None
         
-        if int(line_idx1.split("_")[-1]) < int(line_idx2.split("_")[-1]): # 保证 line_idx1 > line_idx2
+        if GeometryStore.line_number(line_idx1) < GeometryStore.line_number(line_idx2): # 保证 line_idx1 > line_idx2
             line_idx1, line_idx2 = line_idx2, line_idx1
 
-        if self.inverse_pairs.get((line_idx1, line_idx2)) is None: # 如果没有这个逆向对要求，则添加
-            self.inverse_pairs[(line_idx1, line_idx2)] = True
-        else:                                                      # 如果有这个逆向对要求，则删掉
-            del self.inverse_pairs[(line_idx1, line_idx2)]
+        # 如果没有这个逆向对要求，则添加；如果有这个逆向对要求，则删掉
+        self.delta_set_inverse_pair(line_idx1, line_idx2, self.inverse_pairs.get((line_idx1, line_idx2)) is None)
 
     def find_nearest_lines(self, x, y, max_dis=constant_config.CIRCLE_RADIUS + constant_config.LINE_WIDTH/2 + 1):
-        line_pair_list = []
-        for line_id in self.line_dict:
-            dot_from, dot_to = self.line_dict[line_id]
-            pos_from = self.dot_dict[dot_from]
-            pos_to   = self.dot_dict[dot_to]
-            dis = math_utils.point_to_line_segment_distance((x, y), pos_from, pos_to)
-
-            if dis <= max_dis:
-                line_pair_list.append((line_id, dis))
-        return line_pair_list
+        return self.get_segment_grid().query_near(x, y, max_dis) # 只检查 (x, y) 附近格子中的边
     
     # 计算一个插值位置
     def get_interpos(self, dot_id_1, dot_id_2, rate:float, shrink_mode=None):
@@ -201,33 +477,38 @@ class MemoryObject:
         rate = min(max(rate, 0.0), 1.0) # 限制范围
         return (x1 + (x2 - x1) * rate, y1 + (y2 - y1) * rate)
 
+    def batch_get_interpos(self, dot_nums_1, dot_nums_2, rates, shrink_signs) -> numpy.ndarray:
+        """
+        get_interpos 的批量版本，节点使用整数编号，返回形状为 (N, 2) 的坐标数组
+
+        shrink_signs 中 1 对应 shrink_mode="l"，-1 对应 shrink_mode="r"，0 表示不缩短
+        """
+        pos_1 = self.store.get_dot_coords(numpy.asarray(dot_nums_1, dtype=numpy.int64))
+        pos_2 = self.store.get_dot_coords(numpy.asarray(dot_nums_2, dtype=numpy.int64))
+        rates = numpy.asarray(rates, dtype=numpy.float64)
+        shrink_signs = numpy.asarray(shrink_signs)
+
+        with numpy.errstate(divide="ignore"): # 不缩短的位置不会用到 delta_rate
+            length = numpy.sqrt((pos_1[:, 0] - pos_2[:, 0]) ** 2 + (pos_1[:, 1] - pos_2[:, 1]) ** 2)
+            delta_rate = constant_config.CIRCLE_RADIUS / length / 2
+        rates = numpy.where(shrink_signs > 0, rates + delta_rate, numpy.where(shrink_signs < 0, rates - delta_rate, rates))
+
+        rates = numpy.clip(rates, 0.0, 1.0) # 限制范围
+        return pos_1 + (pos_2 - pos_1) * rates[:, None]
+
     def get_view_box(self): # 计算所有节点的包围盒
-        xmin =  + math_utils.math.inf
-        xmax =  - math_utils.math.inf
-        ymin =  + math_utils.math.inf
-        ymax =  - math_utils.math.inf
-        for dot_id in self.dot_dict:
-            xpos, ypos = self.dot_dict[dot_id]
-            xmin = min(xmin, xpos)
-            ymin = min(ymin, ypos)
-            xmax = max(xmax, xpos)
-            ymax = max(ymax, ypos)
-        return (xmin, ymin, xmax, ymax)
+        return self.dot_grid.bounding_box()
 
+    def find_nearest_dot(self, x, y, max_dis=constant_config.CIRCLE_RADIUS + 1): # 找到距离 (x, y) 最近的节点，找不到时返回 None
+        return self.dot_grid.find_nearest(x, y, max_dis)
+
+    @journaled
     def set_dot_position(self, dot_id, x, y): # 设置节点位置
         self.pd_code_final = None
-        conflict = False
-        for dot_id_now in self.dot_dict:
-            if dot_id_now == dot_id:
-                continue
-            
-            xnow, ynow = self.dot_dict[dot_id_now]
-            if numpy.linalg.norm(numpy.array([xnow - x, ynow - y])) <= 2*constant_config.CIRCLE_RADIUS + 1:
-                conflict =True
-                break
+        conflict = self.dot_grid.find_nearest(x, y, 2*constant_config.CIRCLE_RADIUS + 1, exclude=dot_id) is not None
 
         if not conflict: # 不允许点重合
-            self.dot_dict[dot_id] = (x, y)
+            self.delta_move_dot(dot_id, x, y)
 
     def get_dot_dict(self) -> dict: # 获得节点表
         return self.dot_dict
@@ -235,13 +516,15 @@ class MemoryObject:
     def get_line_dict(self) -> dict: # 获得边表
         return self.line_dict
 
+    def get_segment_arrays(self): # 向量化地获取所有边的编号以及端点坐标
+        line_nums, starts, ends = self.store.get_segment_arrays()
+        return [GeometryStore.line_key(num) for num in line_nums.tolist()], starts, ends
+
+    @journaled
     def erase_line(self, line_id:str): # 删除一条边
         self.pd_code_final = None
         if self.line_dict.get(line_id) is not None:
-            frm, eto = self.line_dict[line_id]
-            self.degree[frm] -= 1
-            self.degree[eto] -= 1 # 统计度数
-            del self.line_dict[line_id]
+            self.delta_remove_line(line_id)
 
         inverse_pair_to_erase = []
         for item in self.inverse_pairs:
@@ -249,8 +532,8 @@ class MemoryObject:
             if line_id_1 == line_id or line_id_2 == line_id:
                 inverse_pair_to_erase.append(item)
 
-        for item in inverse_pair_to_erase: # 删除所有无效逆序处理
-            del self.inverse_pairs[item]
+        for line_id_1, line_id_2 in inverse_pair_to_erase: # 删除所有无效逆序处理
+            self.delta_set_inverse_pair(line_id_1, line_id_2, False)
 
     # 检查两条线段之间的上下关系（两条线段不一定相交）
     def check_line_under(self, line_id_1:str, line_id_2:str) -> bool:
@@ -263,45 +546,49 @@ class MemoryObject:
         # line_1_under_line_2 = True 表示 line_1 在 line_2 下面
         # 计算时发现了错误
         line_1_under_line_2 = xor(
-            (int(line_id_1.split("_")[-1]) < int(line_id_2.split("_")[-1])), # 按照数值大小排序，而不是按照字符串字典序
+            (GeometryStore.line_number(line_id_1) < GeometryStore.line_number(line_id_2)), # 按照数值大小排序，而不是按照字符串字典序
             (invsps.get((line_id_1, line_id_2)) is not None) or (invsps.get((line_id_2, line_id_1)) is not None))
         
         return line_1_under_line_2
 
 
+    @journaled
     def new_dot(self, x:int, y:int): # 新增一个节点：不包含共线检查功能
         self.pd_code_final = None
-        while self.dot_dict.get("dot_%d" % self.dot_id_max):
-            self.dot_id_max += 1
-        new_id = "dot_%d" % self.dot_id_max
-        self.dot_dict[new_id] = (x, y)
-        self.degree[new_id] = 0
+        dot_id_max = self.dot_id_max
+        while self.store.has_dot(dot_id_max):
+            dot_id_max += 1
+        if dot_id_max != self.dot_id_max:
+            self.delta_set_id_max(dot_id_max, self.line_id_max)
+        new_id = GeometryStore.dot_key(dot_id_max)
+        self.delta_add_dot(new_id, x, y)
         return new_id
 
+    @journaled
     def new_line(self, dot_id_1:str, dot_id_2:str): # 新增一条边：不包含共线检查功能
         self.pd_code_final = None
         assert dot_id_1 != dot_id_2
 
-        if int(dot_id_1.split("_")[-1]) > int(dot_id_2.split("_")[-1]):
-            dot_id_1, dot_id_2 = dot_id_2, dot_id_1
+        dot_id_1, dot_id_2 = self.get_dot_pair(dot_id_1, dot_id_2)
 
-        for line_id in self.line_dict:
-            frm1, eto1 = self.line_dict[line_id]
-            if frm1 == dot_id_1 and eto1 == dot_id_2: # 找到了一个旧的一样的边
-                print(_("找到一条原有的边：%s") % line_id)
-                return line_id
+        line_id = self.dot_pair_to_line.get((dot_id_1, dot_id_2))
+        if line_id is not None: # 找到了一个旧的一样的边
+            print(_("找到一条原有的边：%s") % line_id)
+            return line_id
         
-        while self.line_dict.get("line_%d" % self.line_id_max):
-            self.line_id_max += 1
+        line_id_max = self.line_id_max
+        while self.store.has_line(line_id_max):
+            line_id_max += 1
+        if line_id_max != self.line_id_max:
+            self.delta_set_id_max(self.dot_id_max, line_id_max)
 
-        new_id = "line_%d" % self.line_id_max
-        self.line_dict[new_id] = (dot_id_1, dot_id_2)
-        self.degree[dot_id_1] += 1
-        self.degree[dot_id_2] += 1
+        new_id = GeometryStore.line_key(line_id_max)
+        self.delta_add_line(new_id, dot_id_1, dot_id_2)
 
         print(_("创建了一条新的边: %s") % new_id)
         return new_id
 
+    @journaled
     def erase_dot(self, dot_id:str): # 删除节点的时候，记得删除相应的边，以及边之间的逆序关系
         self.pd_code_final = None
         if self.dot_dict.get(dot_id) is not None:
@@ -312,29 +599,28 @@ class MemoryObject:
             if self.dir_dot == dot_id:
                 self.set_dir_dot(None)
 
-            line_list_to_erase = []
-            for line_id in self.line_dict:
-                dot_id_1, dot_id_2 = self.line_dict[line_id]
-
-                if dot_id in [dot_id_1, dot_id_2]:
-                    line_list_to_erase.append(line_id)
+            line_list_to_erase = list(self.dot_to_lines[dot_id]) # 只需要访问与这个节点相连的边
 
             for line_id in line_list_to_erase: # 删除无效线段，以及相应的边关系
                 self.erase_line(line_id)
 
-            if dot_id in self.base_dot: # 从两个 list 中删除结点
-                self.base_dot.remove(dot_id)
-
-            if dot_id in self.dir_dot:
-                self.dir_dot.remove(dot_id)
-
-            del self.dot_dict[dot_id]
+            if dot_id in self.base_dot or dot_id in self.dir_dot: # 从两个 list 中删除结点
+                self.delta_set_marks(
+                    [item for item in self.base_dot if item != dot_id],
+                    [item for item in self.dir_dot if item != dot_id])
 
-            assert self.degree[dot_id] == 0
-            del self.degree[dot_id]
+            self.delta_remove_dot(dot_id)
     
     # merge 的功能：如果两个相同的数字挨得太近，那就把他们合并成一个数字，并放在中点位置
-    def get_number_position_pairs(self, merge=True) -> list:
+    def get_number_position_pairs(self, merge=True) -> list: # 结果会被缓存，直到 pd_code_final 被替换或者平移，调用者不应修改返回值
+        if self.number_position_source is not self.pd_code_final:
+            self.number_position_source = self.pd_code_final
+            self.number_position_cache = {}
+        if merge not in self.number_position_cache:
+            self.number_position_cache[merge] = self.compute_number_position_pairs(merge)
+        return self.number_position_cache[merge]
+
+    def compute_number_position_pairs(self, merge:bool) -> list:
         def unit(pair_x_y): # 单位化一个向量
             x, y = pair_x_y
             length = (x ** 2 + y ** 2) ** 0.5 # 计算长度
@@ -386,7 +672,7 @@ class MemoryObject:
                 pos1 = num_to_pos_dict[txt][0]
                 pos2 = num_to_pos_dict[txt][1]
 
-                if numpy.linalg.norm(numpy.array([pos1[0] - pos2[0], pos1[1] - pos2[1]])) <= 2.5 * constant_config.SMALL_TEXT_SIZE:
+                if ((pos1[0] - pos2[0]) ** 2 + (pos1[1] - pos2[1]) ** 2) ** 0.5 <= 2.5 * constant_config.SMALL_TEXT_SIZE:
                     new_arr.append((txt, ((pos1[0] + pos2[0]) / 2, (pos1[1] + pos2[1]) / 2)))
                 else:
                     new_arr.append((txt, pos1))
@@ -6,11 +6,27 @@ from i18n import _
 import MemoryObject
 import math_utils
 import constant_config
+import crossing_engine
+import GeometryStore
+import instrumentation
+import svg_geometry
+import svg_writer
+
+# 三种 svg 图片：(文件名后缀, need_number, need_arrow)
+SVG_VARIANTS = [
+    ("nonum", False, False), # 不带有弧线编号信息
+    ("num",   True,  False), # 带有弧线编号信息
+    ("arrow", False, True),  # 带有弧线方向信息
+]
 
 class MyAlgorithm:
-    def __init__(self, memory_object:MemoryObject.MemoryObject) -> None:
+    def __init__(self, memory_object:MemoryObject.MemoryObject, engine_name:str|None=None) -> None:
         self.memory_object = memory_object
 
+        if engine_name is None: # 交叉点检测引擎可以替换，默认使用配置文件中的引擎
+            engine_name = constant_config.CROSSING_ENGINE
+        self.crossing_engine = crossing_engine.get_crossing_engine(engine_name)
+
     def degree_check(self): # 检查是不是所有节点的度都等于 2
         dot_dict = self.memory_object.get_dot_dict()
         degree   = self.memory_object.get_degree()
@@ -21,29 +37,28 @@ class MyAlgorithm:
                 degree_fault_arr.append(dot_id)
         return degree_fault_arr
     
-    def get_adj_list(self) -> dict: # 获得节点邻接表
-        dot_dict  = self.memory_object.get_dot_dict()
-        line_dict = self.memory_object.get_line_dict()
+    def get_adj_list(self) -> dict: # 获得节点邻接表，直接读取 MemoryObject 中增量维护的邻接关系
+        dot_to_lines = self.memory_object.get_dot_to_lines()
 
         adj_list = {}
-        for dot in dot_dict:
-            adj_list[dot] = [] # 记录所有后继节点
-
-            for line in line_dict:
-                dot_id_1, dot_id_2 = line_dict[line] # 枚举边表
-                if dot_id_1 == dot:
-                    adj_list[dot].append(dot_id_2)
-                elif dot_id_2 == dot:
-                    adj_list[dot].append(dot_id_1)
+        for dot in self.memory_object.get_dot_dict():
+            adj_list[dot] = [self.memory_object.get_other_end(line, dot) for line in dot_to_lines[dot]] # 记录所有后继节点
         return adj_list
 
-    def __dfs(self, vis, adj_list, dot_now, block_now):
-        vis[dot_now] = True
-        block_now.append(dot_now)
-
-        for dot_next in adj_list[dot_now]:
-            if vis.get(dot_next) is not True:
-                self.__dfs(vis, adj_list, dot_next, block_now)
+    def __dfs(self, vis, adj_list, dot_start, block_now): # 非递归的深度优先搜索，访问顺序与递归版本完全一致
+        vis[dot_start] = True
+        block_now.append(dot_start)
+
+        stack = [iter(adj_list[dot_start])] # 用迭代器模拟递归栈，避免大连通分支超出递归深度限制
+        while len(stack) > 0:
+            for dot_next in stack[-1]:
+                if vis.get(dot_next) is not True:
+                    vis[dot_next] = True
+                    block_now.append(dot_next)
+                    stack.append(iter(adj_list[dot_next]))
+                    break
+            else: # 当前节点的所有后继都已经访问过了
+                stack.pop()
 
     def get_connected_components(self): # 获取每个联通分支的 base 和 dir 点
         vis = {}
@@ -57,9 +72,27 @@ class MyAlgorithm:
             block_list.append(block_now)
         return adj_list, block_list
 
+    def get_live_status(self): # 使用并查集快速统计连通分支个数，以及恰好有一个起始点和一个方向点的连通分支个数
+        component_base = {}
+        component_dir  = {}
+        for dot_id in self.memory_object.base_dot:
+            root = self.memory_object.get_component_id(dot_id)
+            component_base[root] = component_base.get(root, 0) + 1
+        for dot_id in self.memory_object.dir_dot:
+            root = self.memory_object.get_component_id(dot_id)
+            component_dir[root] = component_dir.get(root, 0) + 1
+
+        ready_cnt = 0
+        for root in component_base:
+            if component_base[root] == 1 and component_dir.get(root) == 1:
+                ready_cnt += 1
+        return self.memory_object.get_component_count(), ready_cnt
+
     def check_base_dir(self, adj_list, block_list): # 检查每个连通分支是否有 base 和 dir 以及他们是否相邻
         block_id_to_base_dot = {}
         block_id_to_dir_dot = {}
+        base_dot_set = set(self.memory_object.base_dot)
+        dir_dot_set  = set(self.memory_object.dir_dot)
 
         for i in range(len(block_list)):
             block_id_to_base_dot[i] = []
@@ -69,10 +102,10 @@ class MyAlgorithm:
             for j in range(len(block_now)):
                 node_now = block_now[j]
 
-                if node_now in self.memory_object.base_dot: # 记录所有 base_dot
+                if node_now in base_dot_set: # 记录所有 base_dot
                     block_id_to_base_dot[i].append(node_now)
 
-                if node_now in self.memory_object.dir_dot: # 记录所有 dir_dot
+                if node_now in dir_dot_set: # 记录所有 dir_dot
                     block_id_to_dir_dot[i].append(node_now)
 
         if len(self.memory_object.get_dot_dict()) <= 2:
@@ -80,7 +113,7 @@ class MyAlgorithm:
     
         for i in range(len(block_list)): # 返回检查到的错误信息
             rep     = block_list[i][0]
-            rep_num = int(rep.split("_")[-1]) # 代表元
+            rep_num = GeometryStore.dot_number(rep) # 代表元
 
             if len(block_id_to_base_dot[i]) == 0:
                 return False, _("节点 %d 所在的连通分支没有定义起始点") % rep_num, None, None, [rep]
@@ -98,15 +131,30 @@ class MyAlgorithm:
             dirx  = block_id_to_dir_dot[i][0]
 
             if dirx not in adj_list[base]:
-                base_num = int(base.split("_")[-1])
-                dirx_num = int(dirx.split("_")[-1])
+                base_num = GeometryStore.dot_number(base)
+                dirx_num = GeometryStore.dot_number(dirx)
                 return False, _("起始点 {base_num} 与方向点 {dirx_num} 在同一连通分支但并不相邻").format(base_num=base_num, dirx_num=dirx_num), None, None, [base, dirx]
         
         return True, "", block_id_to_base_dot, block_id_to_dir_dot, [] # 没有检查到错误
 
+    # 使用交叉点检测引擎获得所有可能相交的边对
+    # 返回的顺序与原先两重循环枚举 line_dict 的顺序一致，从而保证交叉点的编号顺序不变
+    def get_candidate_line_pairs(self) -> list:
+        line_dict  = self.memory_object.get_line_dict()
+        line_order = {}
+        for idx, line_id in enumerate(line_dict):
+            line_order[line_id] = idx
+
+        pair_list = []
+        for line_id_1, line_id_2 in self.crossing_engine(self.memory_object):
+            if line_id_2 < line_id_1: # 与原先的 line_id_2 <= line_id_1 判断保持一致
+                line_id_1, line_id_2 = line_id_2, line_id_1
+            pair_list.append((line_id_1, line_id_2))
+        return sorted(pair_list, key=lambda pair: (line_order[pair[0]], line_order[pair[1]]))
+
     # 计算 pd_code
-    # 这个程序可能很慢将来再考虑优化问题
     def solve_pd_code(self, adj_list, block_list, baseL, dirL, leave_msg):
+        laps = instrumentation.laps("solve_pd_code") # 依次记录每个子阶段的耗时
         
         # 调整 block_list 到正确的顺序：base_node -> dir_node -> ...
         for i in range(len(block_list)):
@@ -165,55 +213,61 @@ class MyAlgorithm:
         # t1 表示他在这段弧线上的坐标 \in (0, 1)
         line_dict = self.memory_object.get_line_dict()
         dot_dict = self.memory_object.get_dot_dict()
-        crossing_list = []
-        for line_id_1 in line_dict:
-            for line_id_2 in line_dict:
-
-                if line_id_2 <= line_id_1: # 避免重复计算
-                    continue
-                d11, d12 = line_dict[line_id_1]
-                d21, d22 = line_dict[line_id_2]
-
-                if d21 in [d11, d12] or d22 in [d11, d12]: # 如果有交集，就跑路
-                    continue
+        laps.lap("reorder")
+        pair_list = []
+        for line_id_1, line_id_2 in self.get_candidate_line_pairs():
+            d11, d12 = line_dict[line_id_1]
+            d21, d22 = line_dict[line_id_2]
 
-                p11 = dot_dict[d11] # 找到四个点的空间坐标，现在的顺序还是 line_dict 中的顺序，这里面的顺序一般来说都不对
-                p12 = dot_dict[d12]
-                p21 = dot_dict[d21]
-                p22 = dot_dict[d22]
-
-                nid11 = dot_id_to_new_id[d11] # 找到四个新编号，新编号是 bid 和 bdid 的二元组
-                nid12 = dot_id_to_new_id[d12]
-                nid21 = dot_id_to_new_id[d21]
-                nid22 = dot_id_to_new_id[d22]
+            if d21 in [d11, d12] or d22 in [d11, d12]: # 如果有交集，就跑路
+                continue
+            pair_list.append((line_id_1, line_id_2))
+        instrumentation.count("pairs_tested", len(pair_list))
+        laps.lap("candidate_pairs")
+
+        # 调整每条边两个端点的顺序，使得顺序服从原始顺序，并把所有边的坐标放到数组中
+        line_id_to_index = {}
+        line_start_list  = []
+        line_end_list    = []
+        line_nid_list    = []
+        def get_line_index(line_id) -> int:
+            if line_id_to_index.get(line_id) is None:
+                d1, d2 = line_dict[line_id]
+                nid1 = dot_id_to_new_id[d1] # 新编号是 bid 和 bdid 的二元组
+                nid2 = dot_id_to_new_id[d2]
 
                 # 注意：n-1 在 0 的前面
-                if check_after(nid11, nid12, block_list): # 调整顺序，使得顺序服从原始顺序
-                    d11, d12 = d12, d11
-                    p11,   p12   =   p12,   p11
-                    nid11, nid12 = nid12, nid11
+                if check_after(nid1, nid2, block_list):
+                    d1, d2 = d2, d1
+                    nid1, nid2 = nid2, nid1
 
-                if check_after(nid21, nid22, block_list): # 调整顺序，使得顺序服从原始顺序
-                    d21, d22 = d22, d21
-                    p21,   p22   =   p22,   p21
-                    nid21, nid22 = nid22, nid21
+                assert check_after(nid2, nid1, block_list) # 保证 nid1 在 nid2 前面
+                line_id_to_index[line_id] = len(line_nid_list)
+                line_start_list.append(dot_dict[d1])
+                line_end_list.append(dot_dict[d2])
+                line_nid_list.append(nid1)
+            return line_id_to_index[line_id]
 
-                # 保证 nid11 在 nid12 前面， 保证 nid21 在 nid22 前面
-                assert check_after(nid12, nid11, block_list)
-                assert check_after(nid22, nid21, block_list)
+        index_pairs = [(get_line_index(line_id_1), get_line_index(line_id_2)) for line_id_1, line_id_2 in pair_list]
 
-                # t1 是线段在 p11, p12 上的参数 
-                # t2 是线段在 p21, p22 上的参数
-                pos, t1, t2 = math_utils.segments_intersect((p11, p12), (p21, p22))
-                if pos is None: # 没有找到交叉点，则返回
-                    continue
+        # t1 是交点在第一条线段上的参数，t2 是交点在第二条线段上的参数
+        hit, pos_arr, t1_arr, t2_arr = math_utils.batch_segments_intersect(line_start_list, line_end_list, index_pairs)
 
-                assert isinstance(t1, float) and isinstance(t2, float)
-                assert 0 < float(t1) < 1
-                assert 0 < float(t2) < 1 # 这说明有结点位于其他结点上面，可能会导致错误
+        crossing_list = []
+        for k in np.flatnonzero(hit): # 只考虑找到了交叉点的边对
+            line_id_1, line_id_2 = pair_list[k]
+            idx1, idx2 = index_pairs[k]
+            pos = (float(pos_arr[k][0]), float(pos_arr[k][1]))
+            t1  = float(t1_arr[k])
+            t2  = float(t2_arr[k])
 
-                crossing_list.append((pos, nid11, t1, nid21, t2, line_id_1, line_id_2)) # 使用七元组描述所有找到的交叉点
+            assert 0 < t1 < 1
+            assert 0 < t2 < 1 # 这说明有结点位于其他结点上面，可能会导致错误
 
+            crossing_list.append((pos, line_nid_list[idx1], t1, line_nid_list[idx2], t2, line_id_1, line_id_2)) # 使用七元组描述所有找到的交叉点
+
+        instrumentation.count("crossings_found", len(crossing_list))
+        laps.lap("intersect")
         leave_msg(_("总计找到了 %d 个交叉点") % len(crossing_list))
 
         # 考虑交叉点所在的弧线段，并给所有弧线段进行编号
@@ -240,6 +294,7 @@ class MyAlgorithm:
             for arc_id, half_crossing in enumerate(parts[bid]):
                 ignored, ignored, cid, half_id, ignored = half_crossing
                 cid_half_id_to_bid_arc_id[(cid, half_id)] = (bid, arc_id)
+        laps.lap("sort_arcs")
 
         def check_left_turn(vec1, vec2): # 检查 vec1 到 vec2 是否是左转
             x1, y1 = vec1
@@ -298,30 +353,27 @@ class MyAlgorithm:
                     np_point_to_tuple(-(np.array(pos21) - np.array(pos)))
                 ], "pos": pos})
         
+        laps.lap("pd_code_raw")
+
         # 程序运行到这里已经获得了可用的 pd_code_raw 了
         # 我们需要借助排序进一步计算得到具有统一编号的 pd_code
-        item_list = []
-        for crossing in pd_code_raw: # 拿出所有编号来
-            for term in crossing["X"]:
-                if term not in item_list:
-                    item_list.append(term)
-
-        item_list = sorted(item_list)
+        item_list = sorted({term for crossing in pd_code_raw for term in crossing["X"]}) # 拿出所有编号来，使用集合去重
         tup_to_real_id = {}
         for idx, val in enumerate(item_list): # 为每一个弧线段赋予一个最终的有效整数 id
             tup_to_real_id[val] = idx + 1
+        laps.lap("numbering")
 
         # 经过这一次处理后得到的 pd_code 将是最终的 pd_code
-        # 我们首先对 pd_code_raw 进行一次深拷贝
-        pd_code_final = eval(repr(pd_code_raw))
+        # 直接构造新的 dict，不修改 pd_code_raw
+        pd_code_final = []
         pd_code_to_show = []
-        for pd_code_term in pd_code_final:
-            for i in range(4):
-                pd_code_term["X"][i] = tup_to_real_id[pd_code_term["X"][i]]
+        for pd_code_term in pd_code_raw:
+            clock_wise = [tup_to_real_id[term] for term in pd_code_term["X"]]
+            pd_code_final.append({"X": clock_wise, "dir": list(pd_code_term["dir"]), "pos": pd_code_term["pos"]})
 
-            clock_wise = pd_code_term["X"]
             anti_clock_wise = [clock_wise[0]] + clock_wise[1:][::-1]
             pd_code_to_show.append(anti_clock_wise)
+        laps.lap("pd_code")
         
         # 返回最终 pd_code
         return sorted(pd_code_to_show), pd_code_final, parts
@@ -329,172 +381,76 @@ class MyAlgorithm:
     # block_list 记录了每个连通分支的控制点
     # parts 记录了每个连通分支的交叉点的位置
     # need_number 指出了是否需要在生成的 svg 图片中引入弧线的数字编号
-    def calculate_svg(self, block_list, parts, need_number, need_arrow):
-        # 根据 block_list 计算节点的前驱后继关系
-        # 这里的节点以 dot_id 的形式记录（即节点的默认编号）
-        get_next_dot = {}
-        get_last_dot = {}
-        for i in range(len(block_list)):
-            for j in range(len(block_list[i])):
-                item_now = block_list[i][j]
-                item_last = block_list[i][j-1] # 这样的话，当 j = 0 时，恰好是正确的
-
-                get_next_dot[item_last] = item_now
-                get_last_dot[item_now] = item_last
-        
-        # 为某个指定的连通分支计算其 arc_list
-        def get_arc_list_for_zero_crossing_connected_component(bid: int):
-            arc_list = []
-            for item in block_list[bid]:
-                arc_list.append((
-                    (get_last_dot[item], item, 0.5), # 为所有节点输出一个四元组
-                    (item, get_next_dot[item], 0.0),
-                    (item, get_next_dot[item], 0.5),
-                    "LR", ## LR, 表示两端都不需要缩短
-                ))
-            return arc_list
-
-        def get_new_tag(base:str, old_tag:str) -> str:
-            assert old_tag in ["below", "above"]
-            assert base in ["l", "r", "L", "R"]
-            base = base.upper()
-            if old_tag == "below": # 小写字母表示需要缩短，大写字母表示不需要缩短
-                return base.lower()
-            else:
-                return base
-
-        def get_arc_list_between_two_crossing(bid:int, begin_arc, end_arc): # 绘制两个交叉点之间的所有弧线段
-            nid1, t1, ignored, ignored, tag1 = begin_arc
-            nid2, t2, ignored, ignored, tag2 = end_arc
-
-            if nid1 == nid2: # 位于同一个线段的两个交叉点，不需要计算中间节点
-                return [
-                    (
-                        (block_list[bid][nid1], get_next_dot[block_list[bid][nid1]], t1),
-                        (block_list[bid][nid1], get_next_dot[block_list[bid][nid1]], (t1 + t2) / 2),
-                        (block_list[bid][nid2], get_next_dot[block_list[bid][nid2]], t2),
-                        get_new_tag("l", tag1) + get_new_tag("r", tag2)
-                    )
-                ]
-
-            all_interger_index = [] # 获取两个交叉点之间的所有整数编号
-            index_now = nid1
-            while True:
-                index_now = (index_now + 1) % len(block_list[bid]) # 编号循环
-                all_interger_index.append(index_now)
-                if index_now == nid2:
-                    break
-            
-            arc_list = []
-            if len(all_interger_index) == 1: # 只有一个节点位于两者之间的情况
-                new_tag_1 = get_new_tag("L", tag1)
-                new_tag_2 = get_new_tag("R", tag2)
-                arc_list.append((
-                    (block_list[bid][nid1], block_list[bid][all_interger_index[0]],  t1),
-                    (block_list[bid][nid1], block_list[bid][all_interger_index[0]], 1.0),
-                    (block_list[bid][nid2], get_next_dot[block_list[bid][nid2]],  t2),
-                    new_tag_1 + new_tag_2
-                ))
-            else: # 说明不只有一个节点位于两者之间，因此需要单独考虑最前端和最后段
-                new_tag_1 = get_new_tag("L", tag1)
-                new_tag_2 = get_new_tag("R", tag2)
-                arc_list.append((
-                    (block_list[bid][nid1], block_list[bid][all_interger_index[0]],  t1),
-                    (block_list[bid][nid1], block_list[bid][all_interger_index[0]], 1.0),
-                    (block_list[bid][all_interger_index[0]], get_next_dot[block_list[bid][all_interger_index[0]]],  0.5),
-                    new_tag_1 + "R"
-                ))
-
-                for idx, item in enumerate(all_interger_index):
-                    if idx == 0: # 跳过第一个元素
-                        continue
-                    if idx == len(all_interger_index) - 1: # 跳过最后一个元素
-                        continue
-                    item_last = all_interger_index[idx - 1]
-                    item_now  = item
-                    item_next = all_interger_index[idx + 1] # 下一个元素
-                    arc_list.append((
-                        (block_list[bid][item_last], block_list[bid][item_now], 0.5),
-                        (block_list[bid][item_now], block_list[bid][item_next], 0.0),
-                        (block_list[bid][item_now], block_list[bid][item_next], 0.5),
-                        "LR"
-                    ))
-
-                arc_list.append((
-                    (get_last_dot[block_list[bid][all_interger_index[-1]]], block_list[bid][all_interger_index[-1]], 0.5),
-                    (block_list[bid][all_interger_index[-1]], block_list[bid][nid2], 0.0), # 中间的点是一个整数位置点
-                    (block_list[bid][nid2], get_next_dot[block_list[bid][nid2]],  t2),
-                    "L" + new_tag_2,
-                ))
-
-            return arc_list
-
-        # 绘制 svg 图像, 特殊处理没有交叉点的连通分支
-        arc_list = []
-        for i in range(len(parts)):
-            if len(parts[i]) == 0: # 这说明这个连通分支没有任何交点
-                arc_list += get_arc_list_for_zero_crossing_connected_component(i)
-            else:
-                # 执行到这个分支说明当前 parts[i] 中至少有一个交点
-                for j in range(len(parts[i])):
-                    begin_arc = parts[i][j-1] # 需要注意的是，当 j = 0 时，这里 j - 1 等于 -1
-                    end_arc = parts[i][j]
-                    arc_list += get_arc_list_between_two_crossing(i, begin_arc, end_arc)
-
-        # 生成一个 SVG 二次曲线
-        def create_svg_path(pos_from, pos_mid, pos_to, status, need_arrow) -> str:
-            shrink_1 = status[0]
-            shrink_2 = status[1]
-            xfrom, yftom = self.memory_object.get_interpos(pos_from[0], pos_from[1], pos_from[2], shrink_1)
-            xmid,  ymid  = self.memory_object.get_interpos(pos_mid [0], pos_mid [1], pos_mid [2])
-            xto,   yto   = self.memory_object.get_interpos(pos_to  [0], pos_to  [1], pos_to  [2], shrink_2)
-            arc_text = "    " + '<path d="M %f %f Q %f %f, %f %f" fill="none" stroke="%s" stroke-width="%d" />' % (
-                xfrom, yftom,
-                xmid, ymid,
-                xto, yto,
-                constant_config.SVG_STROKE_COLOR,
-                constant_config.SVG_STROKE_WIDTH,
-            )
-            if need_arrow: # 在中点附近加小箭头
-                midpoint, tangent = math_utils.bezier_midpoint_and_tangent((xfrom, yftom), (xmid, ymid), (xto, yto))
-                xm, ym = midpoint
-                xt, yt = tangent
-                xn, yn = -yt, xt # 法线方向是切线方向的垂直方向
-                arrow_text1 = '<line x1="%f" y1="%f" x2="%f" y2="%f" stroke="black" stroke-width="1" />' % (
-                    xm, ym, xm + (xn - xt) * constant_config.ARROW_SIZE, ym + (yn - yt) * constant_config.ARROW_SIZE
-                )
-                arrow_text2 = '<line x1="%f" y1="%f" x2="%f" y2="%f" stroke="black" stroke-width="1" />' % (
-                    xm, ym, xm + (-xn - xt) * constant_config.ARROW_SIZE, ym + (-yn - yt) * constant_config.ARROW_SIZE
-                )
-                arc_text += "\n    " + arrow_text1 + "\n    " + arrow_text2
-            return arc_text
-
-        # 基于 arc_list 生成 svg 图像文本格式
-        def generate_svg_text_based_on_arc_list(arc_list) -> list:
-            xmin, ymin, xmax, ymax = self.memory_object.get_view_box()
-            xmin -= constant_config.CIRCLE_RADIUS
-            ymin -= constant_config.CIRCLE_RADIUS
-            xmax += constant_config.CIRCLE_RADIUS
-            ymax += constant_config.CIRCLE_RADIUS
-            svg_path_list = []
-            for term in arc_list:
-                pos_from, pos_mid, pos_to, status = term
-                svg_path_list.append(create_svg_path(pos_from, pos_mid, pos_to, status, need_arrow)) # need_arrow 在最外层引入
-            return svg_path_list
-        
-        # 不负责存储，仅仅负责计算
-        xmin, ymin, xmax, ymax = self.memory_object.get_view_box()
-        header  = '<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n'
-        header += '<svg xmlns="http://www.w3.org/2000/svg" viewBox="%g %g %g %g" width="%d" height="%d">' % (
-            xmin, ymin, xmax-xmin, ymax-ymin, 
-            round((xmax-xmin) * constant_config.SVG_EXPAND_RATIO), 
-            round((ymax-ymin) * constant_config.SVG_EXPAND_RATIO))
-        footer  = '</svg>'
-        svg_text_list = [header] + generate_svg_text_based_on_arc_list(arc_list)
-
-        if need_number: # 添加数字
-            for txt, pos in self.memory_object.get_number_position_pairs():
-                svg_text_list.append(f'    <text x="{pos[0]}" y="{pos[1] + constant_config.SVG_TEXT_DELTA_Y}" font-size="{constant_config.SVG_FONT_SIZE}" fill="red">{txt}</text>\n')
-
-        svg_text_list.append(footer)
-        return "\n".join(svg_text_list)
+    def compute_answer(self, leave_msg, need_svg=True) -> dict:
+        """
+        完整的 pd_code 计算流程：检查节点度数、检查起始点和方向点、计算 pd_code、生成 svg 图片
+        不依赖 pygame，图形界面（Knotpen2GameObject.output_answer）和命令行批处理工具（batch_pd_code.py）共用
+
+        Args:
+            leave_msg(function): 输出提示信息的回调函数
+            need_svg(bool): 是否计算 svg 图片需要的几何数据
+
+        Returns:
+            dict: {
+                "success": 是否计算成功,
+                "message": 失败原因,
+                "notice_node": 需要用红色标出的节点，None 表示不需要修改,
+                "pd_code": 最终的 pd_code,
+                "svg_geometry": 所有 svg 图片共用的几何数据，None 表示没有计算，见 SVG_VARIANTS 以及 iter_svg,
+            }
+        """
+        ans = {"success": False, "message": "", "notice_node": None, "pd_code": None, "svg_geometry": None}
+        with instrumentation.timer("degree_check"):
+            degree_check_list = self.degree_check()
+        if len(degree_check_list) > 0: # 发现了有些节点度不为 2
+            ans["message"] = _("%d 个节点度数不为 2，请注意灰色标出的节点") % len(degree_check_list)
+            return ans
+        with instrumentation.timer("get_connected_components"):
+            adj_list, block_list        = self.get_connected_components()           # 计算出所有连通分支
+        with instrumentation.timer("check_base_dir"):
+            suc, msg, baseL, dirL, nntc = self.check_base_dir(adj_list, block_list) # 检查每个连通分支是否都有 base 和 dir 节点，检查节点数是否大于等于 3
+        ans["notice_node"]          = nntc
+        if not suc:
+            ans["message"] = msg
+            return ans
+        # pd_code_to_show 中记录的是最终计算得到的 pd_code
+        # pd_code_final 中记录的是用于在屏幕上显示 pd_code 弧线编号的相关信息
+        # parts 记录的是每个连通分量上的交叉点构成的序列，parts 对连通分量的处理顺序与 block_list 一致
+        with instrumentation.timer("solve_pd_code"):
+            pd_code_to_show, pd_code_final, parts = self.solve_pd_code(adj_list, block_list, baseL, dirL, leave_msg)
+        self.memory_object.set_pd_code_final_info(pd_code_final) # 带有弧线编号的 svg 图片需要用到
+        ans["success"] = True
+        ans["pd_code"] = pd_code_to_show
+
+        if need_svg: # svg 文本由 iter_svg 或者 write_svg 根据 svg_geometry 生成
+            with instrumentation.timer("calculate_svg"):
+                ans["svg_geometry"] = self.compute_svg_geometry(block_list, parts)
+        return ans
+
+    def compute_svg_geometry(self, block_list, parts) -> dict: # 所有 svg 图片共用的几何数据，只计算一次
+        laps = instrumentation.laps("calculate_svg")
+        arc_list, component_sizes = svg_geometry.build_arc_list(block_list, parts)
+        instrumentation.count("arcs_emitted", len(arc_list))
+        laps.lap("arc_list")
+
+        geometry = svg_geometry.compute_geometry(self.memory_object, arc_list, component_sizes)
+        laps.lap("geometry")
+        return geometry
+
+    def iter_svg(self, geometry:dict, need_number:bool, need_arrow:bool, precision:int=constant_config.SVG_PRECISION): # 逐段生成一种 svg 图片，见 svg_writer.iter_svg_chunks
+        number_pairs = self.memory_object.get_number_position_pairs() if need_number else None
+        return svg_writer.iter_svg_chunks(geometry, number_pairs, need_arrow, precision)
+
+    def write_svg(self, filepath:str, geometry:dict, need_number:bool, need_arrow:bool): # 直接写入文件，不在内存中拼出完整的 svg
+        with instrumentation.timer("write_svg"):
+            svg_writer.write_svg(filepath, self.iter_svg(geometry, need_number, need_arrow))
+
+    def calculate_svg_variants(self, block_list, parts, variants=SVG_VARIANTS) -> dict: # 返回 {后缀: svg 文本}
+        geometry = self.compute_svg_geometry(block_list, parts)
+        ans = {}
+        for suffix, need_number, need_arrow in variants:
+            ans[suffix] = "".join(self.iter_svg(geometry, need_number, need_arrow))
+        return ans
+
+    def calculate_svg(self, block_list, parts, need_number, need_arrow): # 只生成一种 svg 图片
+        return self.calculate_svg_variants(block_list, parts, [("svg", need_number, need_arrow)])["svg"]
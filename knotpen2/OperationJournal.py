@@ -0,0 +1,246 @@
+import os
+import sys
+import json
+import time
+import functools
+import numpy
+
+# 相对导入
+import constant_config
+import save_format
+
+# 操作日志（只追加）
+# MemoryObject 的每一个修改操作都会被记录为一行 json：{"seq": 序号, "t": 时间戳, "op": 函数名, "args": 参数}
+# 只记录最外层的操作，例如 split_line_at 内部调用的 new_dot、erase_line、new_line 不会被重复记录
+# 所有操作都是确定性的（新节点、新边的编号只取决于当前状态），因此从一个快照开始重放操作就可以恢复任意时刻的状态
+#
+# 日志按照段（segment）存储，每一段由一个快照文件以及一个操作文件组成：
+#   snapshot_<seq>.json: 第 seq 个操作之前的完整状态，格式见 save_format.py
+#   ops_<seq>.jsonl:     第一行是段头 {"snapshot": seq, "t": 时间戳}，之后每一行是一个操作
+# 每记录 JOURNAL_COMPACT_OPS 个操作就开启新的一段（压缩），保证恢复时需要重放的操作数量有上限
+# 最多保留 JOURNAL_MAX_SEGMENTS 段，更早的段会被删除
+
+SNAPSHOT_PREFIX = "snapshot_"
+OPS_PREFIX      = "ops_"
+JOURNALED_OPS   = set() # 所有被 journaled 装饰的函数名，重放时只允许调用这些函数
+
+def journaled(method):
+    """
+    装饰 MemoryObject 的修改操作：操作成功完成后写入日志，并把产生的逆操作交给撤销栈
+
+    通过 memory_object.op_depth 记录调用深度，只有最外层的操作会被记录
+    最外层的操作失败（抛出异常）时，已经完成的部分会被回滚，保证日志与内存中的状态一致
+    没有产生任何修改的操作（例如移动节点时发生重合）不会被记录
+    """
+    JOURNALED_OPS.add(method.__name__)
+
+    @functools.wraps(method)
+    def wrapper(self, *args):
+        if self.op_depth == 0:
+            self.delta_log = []
+        self.op_depth += 1
+        try:
+            ans = method(self, *args)
+        except:
+            self.op_depth -= 1
+            if self.op_depth == 0:
+                deltas, self.delta_log = self.delta_log, None
+                self.rollback_deltas(deltas)
+            raise
+        self.op_depth -= 1
+        if self.op_depth == 0:
+            deltas, self.delta_log = self.delta_log, None
+            if self.journal is not None and len(deltas) > 0:
+                self.journal.record(self, method.__name__, args)
+            self.commit_deltas(method.__name__, args, deltas)
+        return ans
+    return wrapper
+
+def to_json(obj): # 参数中可能出现 numpy 数组或者 numpy 标量
+    if isinstance(obj, numpy.ndarray):
+        return obj.tolist()
+    if isinstance(obj, numpy.generic):
+        return obj.item()
+    raise TypeError("cannot serialize %r" % type(obj))
+
+class OperationJournal:
+    def __init__(self, folder:str=constant_config.JOURNAL_FOLDER,
+                 compact_ops:int=constant_config.JOURNAL_COMPACT_OPS,
+                 max_segments:int=constant_config.JOURNAL_MAX_SEGMENTS) -> None:
+        assert compact_ops >= 1 and max_segments >= 1
+        self.folder       = folder
+        self.compact_ops  = compact_ops
+        self.max_segments = max_segments
+        self.fp           = None # 当前段的操作文件
+        self.seq          = 0    # 下一个操作的序号
+        self.segment_ops  = 0    # 当前段中已经记录的操作个数
+        os.makedirs(self.folder, exist_ok=True)
+
+        segments = self.list_segments()
+        if len(segments) > 0: # 接着已有日志中最大的序号继续编号，新的会话总是从新的一段开始，不会写入已有的文件
+            last_seq = segments[-1]
+            for record in self.read_ops(last_seq):
+                last_seq = max(last_seq, record["seq"])
+            self.seq = last_seq + 1
+
+    def get_snapshot_path(self, seq:int) -> str:
+        return os.path.join(self.folder, "%s%012d.json" % (SNAPSHOT_PREFIX, seq))
+
+    def get_ops_path(self, seq:int) -> str:
+        return os.path.join(self.folder, "%s%012d.jsonl" % (OPS_PREFIX, seq))
+
+    def list_segments(self) -> list: # 所有完整写入了快照的段，按照序号从小到大排列
+        arr = []
+        for file in os.listdir(self.folder):
+            if file.startswith(SNAPSHOT_PREFIX) and file.endswith(".json"):
+                arr.append(int(file[len(SNAPSHOT_PREFIX):-len(".json")]))
+        return sorted(arr)
+
+    def read_header(self, seq:int) -> dict|None:
+        path = self.get_ops_path(seq)
+        if not os.path.isfile(path):
+            return None
+        with open(path, "r", encoding="utf-8") as fp:
+            line = fp.readline()
+        try:
+            return json.loads(line)
+        except json.JSONDecodeError:
+            return None
+
+    def read_ops(self, seq:int): # 依次返回一段中的所有操作，忽略段头以及崩溃时写了一半的最后一行
+        path = self.get_ops_path(seq)
+        if not os.path.isfile(path):
+            return
+        with open(path, "r", encoding="utf-8") as fp:
+            for line in fp:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    return
+                if "op" in record:
+                    yield record
+
+    def attach(self, memory_object): # 开始记录 memory_object 的操作，会先保存一个快照
+        memory_object.journal = self
+        self.compact(memory_object)
+
+    def detach(self, memory_object):
+        memory_object.journal = None
+        self.close()
+
+    def close(self):
+        if self.fp is not None:
+            self.fp.close()
+            self.fp = None
+
+    def compact(self, memory_object):
+        """
+        开启新的一段：保存当前状态的快照，之后的操作写入新的操作文件
+
+        快照写入完成之后才会切换操作文件，因此任何时刻崩溃都不会丢失已经记录的操作
+        加载存档、清空、恢复也会调用这个函数作为日志的分界点，此时当前段可能还没有任何操作，
+        占用一个新的序号，避免覆盖当前段的快照（否则无法恢复到分界点之前的状态）
+        """
+        if self.fp is not None and self.segment_ops == 0:
+            self.seq += 1
+        self.close()
+        now = time.time()
+        save_format.write(self.get_snapshot_path(self.seq), memory_object.get_save_state())
+        self.fp = open(self.get_ops_path(self.seq), "x", encoding="utf-8") # 序号不会重复，文件已经存在说明编号出了问题
+        self.fp.write(json.dumps({"snapshot": self.seq, "t": now}) + "\n")
+        self.fp.flush()
+        self.segment_ops = 0
+
+        segments = self.list_segments()
+        for seq in segments[:max(0, len(segments) - self.max_segments)]: # 删除过早的段
+            for path in [self.get_snapshot_path(seq), self.get_ops_path(seq)]:
+                if os.path.isfile(path):
+                    os.remove(path)
+
+    def record(self, memory_object, op:str, args:tuple): # 写入一个操作，代价只与操作本身的大小有关
+        if self.fp is None:
+            return
+        self.fp.write(json.dumps({"seq": self.seq, "t": time.time(), "op": op, "args": list(args)}, default=to_json) + "\n")
+        self.fp.flush()
+        self.seq += 1
+        self.segment_ops += 1
+        if self.segment_ops >= self.compact_ops:
+            self.compact(memory_object)
+
+    def get_time_range(self): # 可以恢复的最早时刻和最晚时刻，没有日志时返回 None
+        segments = self.list_segments()
+        times = []
+        for seq in segments:
+            header = self.read_header(seq)
+            if header is not None:
+                times.append(header["t"])
+            for record in self.read_ops(seq):
+                times.append(record["t"])
+        if len(times) == 0:
+            return None
+        return (min(times), max(times))
+
+    def restore(self, memory_object, timestamp:float|None=None) -> int:
+        """
+        把 memory_object 恢复到 timestamp 时刻的状态
+
+        Args:
+            memory_object(MemoryObject): 被恢复的对象
+            timestamp(float|None): 时间戳，None 表示恢复到最后一个操作之后
+
+        Returns:
+            int: 恢复之后的状态对应的操作序号（即下一个操作的序号）
+        """
+        if timestamp is None:
+            timestamp = float("inf")
+
+        base = None
+        for seq in self.list_segments(): # 找到 timestamp 之前的最后一个快照
+            header = self.read_header(seq)
+            if header is not None and header["t"] <= timestamp:
+                base = seq
+        if base is None:
+            raise ValueError("no journal snapshot before %r" % timestamp)
+
+        journal = memory_object.journal # 重放期间不记录日志
+        memory_object.journal = None
+        try:
+            memory_object.set_save_state(save_format.read(self.get_snapshot_path(base)))
+            seq_now = base
+            for record in self.read_ops(base):
+                if record["t"] > timestamp:
+                    break
+                if record["op"] not in JOURNALED_OPS:
+                    raise ValueError("unknown journal operation: %r" % record["op"])
+                getattr(memory_object, record["op"])(*record["args"])
+                seq_now = record["seq"] + 1
+        finally:
+            memory_object.journal = journal
+
+        if memory_object.history is not None: # 重放产生的撤销记录没有意义
+            memory_object.history.clear()
+        if journal is not None: # 恢复之后的状态与日志末尾不同，开启新的一段
+            journal.compact(memory_object)
+        return seq_now
+
+if __name__ == "__main__": # 命令行工具：python OperationJournal.py 输出文件 [时间戳]
+    import io, contextlib
+    import MemoryObject
+
+    if len(sys.argv) not in [2, 3]:
+        print("usage: python OperationJournal.py output.json [timestamp]")
+        sys.exit(1)
+
+    journal = OperationJournal()
+    time_range = journal.get_time_range()
+    if time_range is None:
+        print("journal is empty: %s" % journal.folder)
+        sys.exit(1)
+    print("journal time range: %s ~ %s" % (time.ctime(time_range[0]), time.ctime(time_range[1])))
+
+    timestamp = float(sys.argv[2]) if len(sys.argv) == 3 else None
+    with contextlib.redirect_stdout(io.StringIO()): # 重放时不输出创建边的提示
+        memory_object = MemoryObject.MemoryObject(auto_load=False)
+        seq = journal.restore(memory_object, timestamp)
+    memory_object.dump_object(sys.argv[1])
+    print("restored %d operations into %s" % (seq, sys.argv[1]))
@@ -0,0 +1,89 @@
+import collections
+
+# 相对导入
+import constant_config
+
+# 撤销、重做栈
+# 每一条记录保存的是一个最外层修改操作产生的所有逆操作（delta），格式见 MemoryObject.apply_deltas
+# 因此撤销和重做的时间、空间开销都只与这一次修改的大小有关，不需要复制整个图
+# 超出步数上限或者 delta 个数上限时，最早的记录会被丢弃
+
+class HistoryEntry:
+    def __init__(self, op:str, deltas:list, merge_key=None) -> None:
+        self.op        = op        # 产生这条记录的操作名称
+        self.deltas    = deltas    # 按照发生顺序排列的逆操作，撤销时需要倒序执行
+        self.merge_key = merge_key # 拖动节点时，相同 merge_key 的连续记录会被合并
+        self.sealed    = False     # 鼠标抬起之后不再合并
+        self.size      = len(deltas)
+
+class UndoHistory:
+    def __init__(self, max_steps:int=constant_config.UNDO_MAX_STEPS, max_deltas:int=constant_config.UNDO_MAX_DELTAS) -> None:
+        assert max_steps >= 1 and max_deltas >= 1
+        self.max_steps  = max_steps
+        self.max_deltas = max_deltas
+        self.clear()
+
+    def clear(self):
+        self.undo_stack = collections.deque()
+        self.redo_stack = collections.deque()
+        self.total_size = 0 # 两个栈中所有 delta 的大小之和
+
+    def can_undo(self) -> bool:
+        return len(self.undo_stack) > 0
+
+    def can_redo(self) -> bool:
+        return len(self.redo_stack) > 0
+
+    def evict(self): # 丢弃最早的记录，直到满足上限，优先丢弃重做栈底部（最远的将来）的记录
+        while len(self.undo_stack) > self.max_steps:
+            self.total_size -= self.undo_stack.popleft().size
+        while len(self.redo_stack) > self.max_steps:
+            self.total_size -= self.redo_stack.popleft().size
+        while self.total_size > self.max_deltas and len(self.undo_stack) + len(self.redo_stack) > 1:
+            if len(self.redo_stack) > 0:
+                self.total_size -= self.redo_stack.popleft().size
+            else:
+                self.total_size -= self.undo_stack.popleft().size
+
+    def push(self, op:str, args:tuple, deltas:list): # 记录一个新的修改操作，会清空重做栈
+        merge_key = (op, args[0]) if op == "set_dot_position" else None
+        if merge_key is not None and self.can_undo():
+            top = self.undo_stack[-1]
+            if top.merge_key == merge_key and not top.sealed:
+                # 同一次拖动：撤销时只需要回到拖动开始之前的位置，因此新的逆操作可以直接丢弃
+                self.drop_redo()
+                return
+
+        self.drop_redo()
+        self.push_undo(op, deltas, merge_key)
+
+    def drop_redo(self):
+        for entry in self.redo_stack:
+            self.total_size -= entry.size
+        self.redo_stack.clear()
+
+    def push_undo(self, op:str, deltas:list, merge_key=None):
+        entry = HistoryEntry(op, deltas, merge_key)
+        self.undo_stack.append(entry)
+        self.total_size += entry.size
+        self.evict()
+
+    def push_redo(self, op:str, deltas:list):
+        entry = HistoryEntry(op, deltas)
+        self.redo_stack.append(entry)
+        self.total_size += entry.size
+        self.evict()
+
+    def pop_undo(self) -> HistoryEntry:
+        entry = self.undo_stack.pop()
+        self.total_size -= entry.size
+        return entry
+
+    def pop_redo(self) -> HistoryEntry:
+        entry = self.redo_stack.pop()
+        self.total_size -= entry.size
+        return entry
+
+    def seal(self): # 结束一次拖动
+        if self.can_undo():
+            self.undo_stack[-1].sealed = True
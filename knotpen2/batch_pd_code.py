@@ -0,0 +1,98 @@
+import os
+import sys
+import io
+import json
+import time
+import argparse
+import contextlib
+import concurrent.futures
+
+# 相对导入
+import MemoryObject
+import MyAlgorithm
+import log_error
+
+# 命令行批处理工具：不打开 pygame 窗口，并行计算大量存档的 pd_code
+# 用法：python batch_pd_code.py [-j 进程数] [-o 输出文件] [--svg] 存档或者文件夹 ...
+# 每个存档输出一行 json（JSON Lines），按照输入顺序逐行输出：
+#   成功：{"file": 路径, "ok": true, "pd_code": [...], "svg": {...}}，只有指定 --svg 时才包含 svg
+#   失败：{"file": 路径, "ok": false, "error": 失败原因}，出现异常时失败原因为 "异常类型: 信息 (文件:行号 in 函数)"
+# 单个存档失败不会中断整个批处理，只要有一个存档失败，退出码就是 1
+
+SAVE_SUFFIXES = (".json", ".npz")
+
+def list_save_files(paths:list) -> list: # 展开输入中的文件夹，忽略以 "." 开头的临时文件
+    ans = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for file in sorted(files):
+                    if file.lower().endswith(SAVE_SUFFIXES) and not file.startswith("."):
+                        ans.append(os.path.join(root, file))
+        else:
+            ans.append(path)
+    return ans
+
+def process_file(filepath:str, need_svg:bool=False) -> dict: # 在子进程中执行，任何异常都会被记录为这个存档的错误
+    record = {"file": filepath}
+    try:
+        messages = []
+        with contextlib.redirect_stdout(io.StringIO()): # 计算过程中的输出不能混入 JSON Lines
+            memory_object = MemoryObject.MemoryObject(auto_load=False)
+            memory_object.history = None # 批处理不需要撤销
+            memory_object.load_object(filepath)
+            algo = MyAlgorithm.MyAlgorithm(memory_object)
+            answer = algo.compute_answer(messages.append, need_svg)
+        record["ok"] = answer["success"]
+        if answer["success"]:
+            record["pd_code"] = answer["pd_code"]
+            if need_svg:
+                record["svg"] = {
+                    suffix: "".join(algo.iter_svg(answer["svg_geometry"], need_number, need_arrow))
+                    for suffix, need_number, need_arrow in MyAlgorithm.SVG_VARIANTS
+                }
+        else:
+            record["error"] = answer["message"]
+    except Exception as err:
+        record["ok"] = False
+        record["error"] = log_error.describe_error(err)
+    return record
+
+def run_batch(filepaths:list, output, jobs:int|None=None, need_svg:bool=False) -> int:
+    """
+    使用进程池并行处理所有存档，结果按照输入顺序逐行写入 output
+
+    Returns:
+        int: 失败的存档个数
+    """
+    failed = 0
+    chunksize = max(1, min(16, len(filepaths) // (4 * (jobs or os.cpu_count() or 1)))) # 文件很多时减少进程间通信的次数
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        for record in executor.map(process_file, filepaths, [need_svg] * len(filepaths), chunksize=chunksize):
+            if not record["ok"]:
+                failed += 1
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+    return failed
+
+def main(argv:list) -> int:
+    parser = argparse.ArgumentParser(description="compute pd codes of knotpen2 save files without opening a window")
+    parser.add_argument("paths", nargs="+", help="save files or folders (searched recursively for .json and .npz)")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="number of worker processes (default: cpu count)")
+    parser.add_argument("-o", "--output", default=None, help="output JSON Lines file (default: stdout)")
+    parser.add_argument("--svg", action="store_true", help="include the three svg images in every record")
+    args = parser.parse_args(argv)
+
+    filepaths = list_save_files(args.paths)
+    time_start = time.time()
+    if args.output is None:
+        failed = run_batch(filepaths, sys.stdout, args.jobs, args.svg)
+    else:
+        with open(args.output, "w", encoding="utf-8") as fp:
+            failed = run_batch(filepaths, fp, args.jobs, args.svg)
+    print("processed %d files (%d failed) in %.2fs" % (len(filepaths), failed, time.time() - time_start), file=sys.stderr)
+    return 1 if failed > 0 else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,317 @@
+import os
+import io
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import tempfile
+import contextlib
+import numpy
+
+# 相对导入
+import constant_config
+import MemoryObject
+import MyAlgorithm
+import save_format
+import math_utils
+import crossing_engine
+import log_error
+
+# 性能基准测试：使用参数化的生成器直接构造 MemoryObject，分别统计 pd_code 计算流程中每个阶段的耗时
+# 用法：python benchmark.py [--case 种类:参数 ...] [-r 重复次数] [-o 输出文件] [--no-draw]
+#   torus:p,q[,采样点数]          环面纽结 T(p, q)，要求 p, q 互素
+#   random:节点数[,随机种子]       随机闭合多边形
+#   link:交叉点数[,每个圆环的节点数] 由圆环串成的链环，相邻两个圆环相交两次，交叉点数为奇数时向下取偶数
+#   spiral:圈数[,每圈的节点数]      很长的螺旋线，首尾之间的连线从所有圈的上方跨过，是一个平凡纽结
+# 每个测试用例输出一行 json（JSON Lines），"stages" 中记录了每个阶段多次运行的最短时间和平均时间（秒）
+# 计算、存档、绘制三部分互相独立，某一部分出错时错误记录在 "errors" 中，其他部分照常运行
+# 绘制阶段需要 pygame，只有在需要时才导入，指定 --no-draw 时完全不依赖 pygame；缺少字体文件时跳过绘制，原因记录在 "skipped" 中
+
+DOT_SPACING = 30 # 生成的相邻节点之间的大致距离，与手工绘制时的尺度相当
+ORIGIN = 100     # 生成的图形的左上角位置
+BENCHMARK_SCREEN_SIZE = (1820, 980) # 与 1920 * 1080 的显示器上的默认窗口大小相同
+
+DEFAULT_SUITE = [
+    "torus:2,3", "torus:5,8", "torus:13,21",
+    "random:50", "random:200",
+    "link:20", "link:200",
+    "spiral:20", "spiral:200",
+]
+
+def build_memory_object(components:list) -> MemoryObject.MemoryObject:
+    """
+    根据若干条闭合折线构造 MemoryObject
+
+    Args:
+        components(list): 每个元素是形状为 (k, 3) 的数组，表示一个连通分支上依次相连的节点 (x, y, z)
+            x, y 会被取整作为节点坐标，z 是节点的高度，交叉点处高度较大的边在上方
+            每个连通分支的第一个节点是起始点，第二个节点是方向点
+
+    Returns:
+        MemoryObject: 不带撤销记录的 MemoryObject
+    """
+    points = numpy.concatenate([numpy.asarray(comp, dtype=numpy.float64).reshape(-1, 3) for comp in components])
+    coords = numpy.round(points[:, :2])
+    heights = points[:, 2]
+
+    dot_from = []
+    dot_to   = []
+    base_dot = []
+    dir_dot  = []
+    start = 0
+    for comp in components:
+        idx = numpy.arange(start, start + len(comp))
+        dot_from.append(idx)
+        dot_to.append(numpy.roll(idx, -1))
+        base_dot.append(start + 1)
+        dir_dot.append(start + 2)
+        start += len(comp)
+    dot_from = numpy.concatenate(dot_from)
+    dot_to   = numpy.concatenate(dot_to)
+
+    # 计算所有交叉点，为高度较低的边添加逆向对
+    starts = coords[dot_from]
+    ends   = coords[dot_to]
+    segments = list(zip(map(tuple, starts.tolist()), map(tuple, ends.tolist())))
+    pairs = numpy.array(sorted(crossing_engine.sweep_line_pairs(segments)), dtype=numpy.int64).reshape(-1, 2)
+    hit, ignored, t, u = math_utils.batch_segments_intersect(starts, ends, pairs)
+    hit &= (0 < t) & (t < 1) & (0 < u) & (u < 1) # 共享端点的相邻边不是交叉点
+    inverse_pairs = []
+    for k in numpy.flatnonzero(hit):
+        i, j = pairs[k]
+        z_i = heights[dot_from[i]] + t[k] * (heights[dot_to[i]] - heights[dot_from[i]])
+        z_j = heights[dot_from[j]] + u[k] * (heights[dot_to[j]] - heights[dot_from[j]])
+        if (z_i < z_j) != (i < j): # 没有逆向对时，编号较小的边在下方，见 MemoryObject.check_line_under
+            inverse_pairs.append((int(i) + 1, int(j) + 1))
+
+    line_ends = numpy.sort(numpy.stack([dot_from, dot_to], axis=1) + 1, axis=1) # 边的两个端点按照编号排序，与 new_line 一致
+    state = save_format.empty_state()
+    state.update(
+        dot_id_max=len(coords) + 1,
+        line_id_max=len(line_ends) + 1,
+        dot_nums=numpy.arange(1, len(coords) + 1),
+        coords=coords,
+        line_nums=numpy.arange(1, len(line_ends) + 1),
+        line_ends=line_ends,
+        inverse_pairs=inverse_pairs,
+        base_dot=base_dot,
+        dir_dot=dir_dot,
+    )
+    memory_object = MemoryObject.MemoryObject(auto_load=False)
+    memory_object.history = None # 基准测试不需要撤销
+    memory_object.set_save_state(state)
+    return memory_object
+
+def torus_knot(p:int, q:int, samples:int|None=None) -> list: # 环面纽结 T(p, q)，节点的高度取自环面上的真实高度
+    if math.gcd(p, q) != 1:
+        raise ValueError("torus knot T(%d, %d) requires coprime p and q" % (p, q))
+    if samples is None:
+        samples = 16 * p * q
+    radius = samples * DOT_SPACING / (2 * math.pi * p) # 使相邻节点之间的距离约为 DOT_SPACING
+    t = (numpy.arange(samples) + 0.5) * 2 * math.pi / samples # 交叉点位于 t = k * pi / (p * q)，错开半个步长避免交叉点恰好落在节点上
+    r = radius + radius / 2 * numpy.cos(q * t)
+    x = ORIGIN + 1.5 * radius + r * numpy.cos(p * t)
+    y = ORIGIN + 1.5 * radius + r * numpy.sin(p * t)
+    z = numpy.sin(q * t)
+    return [numpy.stack([x, y, z], axis=1)]
+
+def random_polygon(n:int, seed:int=0) -> list: # 随机闭合多边形，交叉点的上下关系也是随机的
+    rng = random.Random(seed)
+    side = DOT_SPACING * 4 * math.sqrt(n)
+    return [[(ORIGIN + rng.random() * side, ORIGIN + rng.random() * side, rng.random()) for ignored in range(n)]]
+
+def chain_link(crossings:int, ring_size:int=24) -> list: # 由圆环串成的链环，相邻圆环互相套住
+    radius = ring_size * DOT_SPACING / (2 * math.pi)
+    angle = (numpy.arange(ring_size) + 0.5) * 2 * math.pi / ring_size
+    components = []
+    for k in range(crossings // 2 + 1):
+        sign = 1 if k % 2 == 0 else -1 # 相邻的圆环向相反方向倾斜，两个交叉点的上下关系相反
+        x = ORIGIN + radius + k * 1.5 * radius + radius * numpy.cos(angle)
+        y = ORIGIN + radius + radius * numpy.sin(angle)
+        z = sign * numpy.sin(angle)
+        components.append(numpy.stack([x, y, z], axis=1))
+    return components
+
+def spiral(turns:int, points_per_turn:int=32) -> list: # 很长的螺旋线，节点数多但交叉点数只等于圈数
+    pitch = 2 * DOT_SPACING
+    r0 = points_per_turn * DOT_SPACING / (2 * math.pi)
+    n = turns * points_per_turn + 1
+    theta = numpy.arange(n) * 2 * math.pi / points_per_turn
+    r = r0 + pitch * theta / (2 * math.pi)
+    center = ORIGIN + r[-1] + 2 * pitch
+    x = center + r * numpy.cos(theta)
+    y = center + r * numpy.sin(theta)
+    z = numpy.zeros(n)
+
+    # 从最外圈经过两个高处的节点回到中心，跨越的方向位于两个相邻节点之间，避免经过已有的节点
+    phi = theta[-1] + math.pi / points_per_turn
+    bridge = [
+        (center + (r[-1] + pitch) * math.cos(phi), center + (r[-1] + pitch) * math.sin(phi), 1),
+        (center + r0 / 2 * math.cos(phi), center + r0 / 2 * math.sin(phi), 1),
+    ]
+    return [numpy.concatenate([numpy.stack([x, y, z], axis=1), bridge])]
+
+GENERATORS = {
+    "torus": torus_knot,
+    "random": random_polygon,
+    "link": chain_link,
+    "spiral": spiral,
+}
+
+def parse_case(spec:str) -> list: # "torus:3,5" -> 连通分支列表
+    kind, ignored, args = spec.partition(":")
+    if kind not in GENERATORS:
+        raise ValueError("unknown case %r, expected one of: %s" % (kind, ", ".join(GENERATORS)))
+    return GENERATORS[kind](*[int(arg) for arg in args.split(",") if arg != ""])
+
+class StageTimer: # 记录每个阶段每次运行的耗时
+    def __init__(self) -> None:
+        self.samples = {}
+
+    @contextlib.contextmanager
+    def stage(self, name:str):
+        time_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.setdefault(name, []).append(time.perf_counter() - time_start)
+
+    def summary(self) -> dict:
+        return {
+            name: {"min": min(values), "mean": sum(values) / len(values)}
+            for name, values in self.samples.items()
+        }
+
+def run_pipeline(memory_object:MemoryObject.MemoryObject, timer:StageTimer) -> int: # 依次执行 pd_code 计算流程中的每个阶段，返回交叉点个数
+    algo = MyAlgorithm.MyAlgorithm(memory_object)
+    with timer.stage("degree_check"):
+        degree_check_list = algo.degree_check()
+    if len(degree_check_list) > 0:
+        raise ValueError("%d dots do not have degree 2" % len(degree_check_list))
+
+    with timer.stage("get_connected_components"):
+        adj_list, block_list = algo.get_connected_components()
+
+    with timer.stage("check_base_dir"):
+        suc, msg, baseL, dirL, ignored = algo.check_base_dir(adj_list, block_list)
+    if not suc:
+        raise ValueError(msg)
+
+    with timer.stage("solve_pd_code"):
+        pd_code_to_show, pd_code_final, parts = algo.solve_pd_code(adj_list, block_list, baseL, dirL, lambda msg: None)
+    memory_object.set_pd_code_final_info(pd_code_final)
+
+    with timer.stage("calculate_svg"): # 三种 svg 图片
+        algo.calculate_svg_variants(block_list, parts)
+    return len(pd_code_to_show)
+
+def run_save_load(memory_object:MemoryObject.MemoryObject, timer:StageTimer):
+    with tempfile.TemporaryDirectory() as folder:
+        for suffix in ("json", "npz"):
+            filepath = os.path.join(folder, "benchmark." + suffix)
+            with timer.stage("save_" + suffix):
+                memory_object.dump_object(filepath)
+
+            loaded = MemoryObject.MemoryObject(auto_load=False)
+            loaded.history = None
+            with timer.stage("load_" + suffix):
+                loaded.load_object(filepath)
+
+def run_draw(memory_object:MemoryObject.MemoryObject, timer:StageTimer, repeat:int): # 在不打开窗口的情况下调用 draw_screen
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import pygame
+    import Knotpen2GameObject
+
+    pygame.init()
+    screen = pygame.Surface(BENCHMARK_SCREEN_SIZE)
+    game = Knotpen2GameObject.Knotpen2GameObject(memory_object, MyAlgorithm.MyAlgorithm(memory_object))
+    game.last_backup = math.inf # 基准测试过程中不能触发自动保存
+
+    for ignored in range(repeat): # 默认视图：只绘制屏幕中的一部分
+        memory_object.mark_dirty(None)
+        with timer.stage("draw_screen"):
+            game.draw_screen(screen)
+
+    game.camera.fit_box(*memory_object.get_view_box(), *BENCHMARK_SCREEN_SIZE, margin=20)
+    for ignored in range(repeat): # 显示整个图形，节点很密集时会进入简化模式
+        memory_object.mark_dirty(None)
+        with timer.stage("draw_screen.overview"):
+            game.draw_screen(screen)
+
+    for ignored in range(repeat): # 平移一小段距离，只需要绘制新露出来的部分
+        game.camera.pan(-DOT_SPACING, 0)
+        with timer.stage("draw_screen.pan"):
+            game.draw_screen(screen)
+
+def run_case(spec:str, repeat:int=3, need_draw:bool=True) -> dict:
+    record = {"case": spec, "repeat": repeat}
+    errors = {}  # 出错的部分 -> 错误描述
+    skipped = {} # 跳过的部分 -> 原因
+    timer = StageTimer()
+    with contextlib.redirect_stdout(io.StringIO()): # 计算过程中的输出不能混入 JSON Lines
+        try:
+            memory_object = build_memory_object(parse_case(spec))
+            record["dots"]       = len(memory_object.get_dot_dict())
+            record["lines"]      = len(memory_object.get_line_dict())
+            record["components"] = memory_object.get_component_count()
+        except Exception as err: # 没有构造出图形，后面的部分都无法运行
+            errors["build"] = log_error.describe_error(err)
+            memory_object = None
+
+        if memory_object is not None:
+            try:
+                for ignored in range(repeat):
+                    record["crossings"] = run_pipeline(memory_object, timer)
+            except Exception as err:
+                errors["pipeline"] = log_error.describe_error(err)
+
+            try:
+                for ignored in range(repeat):
+                    run_save_load(memory_object, timer)
+            except Exception as err:
+                errors["save_load"] = log_error.describe_error(err)
+
+            if not need_draw:
+                skipped["draw"] = "--no-draw"
+            elif not os.path.isfile(constant_config.FONT_TTF):
+                skipped["draw"] = "font file not found: %s" % constant_config.FONT_TTF
+            else:
+                try:
+                    run_draw(memory_object, timer, repeat)
+                except Exception as err:
+                    errors["draw"] = log_error.describe_error(err)
+
+    record["ok"] = len(errors) == 0
+    record["stages"] = timer.summary()
+    if len(errors) > 0:
+        record["errors"] = errors
+    if len(skipped) > 0:
+        record["skipped"] = skipped
+    return record
+
+def main(argv:list) -> int:
+    parser = argparse.ArgumentParser(description="time every stage of the knotpen2 pd code pipeline on synthetic diagrams")
+    parser.add_argument("--case", action="append", default=None, help="kind:args, e.g. torus:3,5 random:200 link:40 spiral:100 (default: built-in suite)")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="number of runs per stage, min and mean are reported (default: 3)")
+    parser.add_argument("-o", "--output", default=None, help="output JSON Lines file (default: stdout)")
+    parser.add_argument("--no-draw", action="store_true", help="skip the headless draw_screen stages (no pygame needed)")
+    args = parser.parse_args(argv)
+
+    output = sys.stdout if args.output is None else open(args.output, "w", encoding="utf-8")
+    failed = 0
+    try:
+        for spec in args.case or DEFAULT_SUITE:
+            record = run_case(spec, args.repeat, not args.no_draw)
+            if not record["ok"]:
+                failed += 1
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 1 if failed > 0 else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
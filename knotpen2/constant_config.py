@@ -1,8 +1,13 @@
 import os
 import sys
 
+def get_program_exe_path() -> str: # 程序所在的文件夹，与启动方式（sys.argv[0]）无关，被其他程序导入时也不会改变
+    if getattr(sys, "frozen", False): # 打包后的 exe：存档、答案等文件夹位于 exe 旁边
+        return os.path.dirname(os.path.abspath(sys.executable))
+    return os.path.dirname(os.path.abspath(__file__)) # 源代码：与本文件位于同一个文件夹
+
 # 当前程序执行路径为
-PROGRAM_EXE_PATH = os.path.dirname(os.path.abspath(sys.argv[0]))
+PROGRAM_EXE_PATH = get_program_exe_path()
 
 APP_NAME = "knotpen2"
 APP_VERSION = "2.4.0" # 不要删除这行内容，因为脚本会从这里抓取
@@ -11,14 +16,32 @@ DIRNOW = os.path.dirname(os.path.abspath(__file__))
 AUTOSAVE_FOLDER = os.path.join(PROGRAM_EXE_PATH, "auto_save")
 AUTOSAVE_FILE = os.path.join(AUTOSAVE_FOLDER, "auto_save.json") # 自动保存位置
 
+JOURNAL_FOLDER = os.path.join(PROGRAM_EXE_PATH, "journal") # 操作日志位置
+JOURNAL_COMPACT_OPS = 1000 # 每记录这么多个操作就保存一次快照，限制恢复时需要重放的操作个数
+JOURNAL_MAX_SEGMENTS = 50  # 最多保留的快照个数
+
 ANSWER_FOLDER = os.path.join(PROGRAM_EXE_PATH, "answer") # 答案存储位置
 ERROR_LOG_FOLDER = os.path.join(PROGRAM_EXE_PATH, "error_log")
 
 CIRCLE_RADIUS = 12
 LINE_WIDTH = 8
+DOT_GRID_SIZE = 2 * CIRCLE_RADIUS + 1 # 节点空间索引的格子边长，恰好等于节点之间的最小距离
+SEGMENT_GRID_SIZE = 64 # 边空间索引的格子边长
 
-BACKUP_TIME = 180 # 每三分钟自动保存一次，如果和上次自动保存内容完全一致，则删除最新的自动保存
-STRIDE = 50
+BACKUP_TIME = 180 # 每三分钟自动保存一次，如果和上次自动保存内容完全一致，则跳过这一次备份
+STRIDE = 50 # 按下 WASD 时视图平移的像素数
+ZOOM_STEP = 1.25 # 滚轮每滚动一格的缩放倍数
+ZOOM_MIN = 0.05
+ZOOM_MAX = 8
+MAX_DIRTY_BOXES = 256 # 一帧之内发生变化的区域太多时，直接重新绘制整个画面
+MAX_DIRTY_RECTS = 32  # 一帧之内需要重绘的矩形太多时，合并为一个矩形
+DIRTY_PADDING = 5 * CIRCLE_RADIUS # 重绘区域向外扩展的距离，需要覆盖节点的标记圆圈以及节点编号
+LOD_PIXELS_PER_DOT = 600 # 屏幕上平均每个节点占据的像素少于这个值时，切换到简化模式
+LOD_HYSTERESIS = 1.5     # 简化模式下平均每个节点占据的像素超过 LOD_PIXELS_PER_DOT 的这么多倍时，才切换回正常模式
+LOD_DOT_SIZE = 3         # 简化模式下节点绘制为这个边长的小方块
+LOD_NOTICE_SIZE = 11     # 简化模式下不显示编号，需要注意的节点（check_base_dir 报错的节点）用这个边长的红色空心方框标出
+UNDO_MAX_STEPS = 200       # 最多可以撤销的步数
+UNDO_MAX_DELTAS = 1000000  # 撤销栈中最多保存的基本修改操作个数，超出时丢弃最早的记录
 
 # i18n 文件夹位置
 LOCALE_DIR = os.path.join(PROGRAM_EXE_PATH, "i18n", "locales")
@@ -34,6 +57,8 @@ MESSAGE_SIZE = 18
 SMALL_TEXT_SIZE = 14
 def MESSAGE_POSITION(i:int):
     return (10 , 10 + (MESSAGE_SIZE + 2) * i)
+def STATUS_POSITION(screen_height:int): # 屏幕左下角的状态栏
+    return (10, screen_height - SMALL_TEXT_SIZE - 10)
 
 # SVG 绘图属性
 SVG_STROKE_COLOR = "black"
@@ -42,12 +67,19 @@ SVG_FONT_SIZE = SMALL_TEXT_SIZE
 SVG_TEXT_DELTA_Y = 15 # 对 SVG 文件中的文字位置进行微调
 ARROW_SIZE = 5 # SVG 图片中箭头的大小
 SVG_EXPAND_RATIO = 1 # 放大倍数
+SVG_PRECISION = 2 # SVG 图片中坐标保留的小数位数
+SVG_GZIP = False # 是否把 SVG 图片压缩保存为 .svgz 文件
+SVG_CHUNK_ARCS = 4096 # 流式输出 SVG 时每次处理的弧线条数
 
 DOUBLE_CLICK_TIME = 0.25 # 双击时两次点击的最大间隔
+FPS = 60 # 每秒最多绘制多少帧
+IDLE_WAIT_TIME = 500 # 没有任何事件时最多等待多少毫秒就重新绘制一次，用于显示后台自动保存的结果
 
 LEFT_KEY_ID  = 1
 MID_KEY_ID   = 2
 RIGHT_KEY_ID = 3
+WHEEL_UP_ID  = 4
+WHEEL_DOWN_ID = 5
 
 WHITE = (255, 255, 255)
 GREY = (128, 128, 128)
@@ -55,4 +87,8 @@ YELLOW = (128, 128, 0)
 BLACK = (0, 0, 0)
 RED = (255, 0, 0)
 GREEN = (0, 192, 0)
-BLUE = (0, 0, 255)
\ No newline at end of file
+BLUE = (0, 0, 255)
+
+# 交叉点检测引擎: "grid" 使用边的空间索引, "sweep" 扫描线算法, "naive" 枚举所有边对
+# 候选边对之后还会用 numpy 批量精确判断，grid 多返回一些边对的代价很小，而 sweep 在 python 中逐个处理事件点，实际运行更慢，因此默认使用 grid
+CROSSING_ENGINE = "grid"
@@ -0,0 +1,171 @@
+import heapq
+import functools
+from fractions import Fraction
+
+# 交叉点检测引擎
+# 每个引擎都是一个函数 engine(memory_object)，返回若干无序的边编号二元组 (line_id_a, line_id_b)
+# 返回的集合必须包含所有 “闭线段意义下相交” 的边对（允许多返回，不允许少返回）
+# 精确的相交判断以及交点坐标的计算仍然由 MyAlgorithm.solve_pd_code 负责
+
+def _exact(v): # 把坐标转换成可以精确计算的数值类型
+    if isinstance(v, int):
+        return v
+    v = float(v)
+    if v.is_integer():
+        return int(v)
+    return Fraction(v)
+
+def _cross(ax, ay, bx, by):
+    return ax * by - ay * bx
+
+FILTER_EPS = 1e-12 # 浮点计算结果的绝对值超过 FILTER_EPS * 误差尺度时，符号一定正确，否则回退到精确计算
+
+def naive_engine(memory_object): # 枚举所有边对，复杂度 O(E^2)
+    line_ids = list(memory_object.get_line_dict())
+    for i in range(len(line_ids)):
+        for j in range(i + 1, len(line_ids)):
+            yield line_ids[i], line_ids[j]
+
+def sweep_line_pairs(segments) -> set:
+    """
+    Bentley-Ottmann 扫描线算法，计算所有相交（包括端点接触、共线重叠）的线段对
+
+    Args:
+        segments(list): 线段列表，每个元素的格式为 ((x1, y1), (x2, y2))
+
+    Returns:
+        set: 所有相交线段的下标二元组 (i, j)，满足 i < j
+
+    坐标会被转换为整数或者 Fraction 进行精确计算，因此退化情况（竖直线段、三线共点、共线）都能被正确处理
+    扫描线中的比较（点与线段的位置关系、斜率比较）先使用浮点数计算，只有结果接近 0 时才使用精确计算
+    复杂度为 O((E + K) log E)，其中 K 是相交线段对的个数
+    """
+    left  = [] # 按照字典序，每条线段较小的端点
+    right = [] # 按照字典序，每条线段较大的端点
+    for (x1, y1), (x2, y2) in segments:
+        p = (_exact(x1), _exact(y1))
+        q = (_exact(x2), _exact(y2))
+        if q < p:
+            p, q = q, p
+        left.append(p)
+        right.append(q)
+
+    starts = {} # 事件点 -> 从这个点出发的线段
+    for idx, p in enumerate(left):
+        starts.setdefault(p, []).append(idx)
+
+    events = list(set(left) | set(right))
+    heapq.heapify(events)
+    queued = set(events) # 所有曾经进入过事件队列的点
+
+    # 浮点数版本的端点坐标以及误差尺度
+    # 浮点数的相对误差为 2^-53，两个坐标相减的误差不超过 scale * 2^-52，误差尺度中的各项只是把这些误差放大了足够多的倍数
+    left_f  = [(float(x), float(y)) for x, y in left]
+    right_f = [(float(x), float(y)) for x, y in right]
+    scale   = max([abs(v) for p in left_f + right_f for v in p] + [1.0])
+    tol     = FILTER_EPS * scale
+
+    def orient(s, px, py, pxf, pyf): # 返回值的符号：> 0 说明线段 s 在点 p 的下方，= 0 说明线段 s 经过点 p（在扫描线上）
+        (x1, y1), (x2, y2) = left_f[s], right_f[s]
+        dx, dy, qx, qy = x2 - x1, y2 - y1, pxf - x1, pyf - y1
+        val = dx * qy - dy * qx
+        if abs(val) > tol * (abs(dx) + abs(dy) + abs(qx) + abs(qy)):
+            return val
+        (x1, y1), (x2, y2) = left[s], right[s] # 接近 0 时使用精确计算
+        return (x2 - x1) * (py - y1) - (y2 - y1) * (px - x1)
+
+    def slope_cmp(s, t): # 比较两条线段的斜率，竖直线段的斜率视为正无穷
+        (sx1, sy1), (sx2, sy2) = left_f[s], right_f[s]
+        (tx1, ty1), (tx2, ty2) = left_f[t], right_f[t]
+        sdx, sdy, tdx, tdy = sx2 - sx1, sy2 - sy1, tx2 - tx1, ty2 - ty1
+        val = sdy * tdx - tdy * sdx
+        if abs(val) <= tol * (abs(sdx) + abs(sdy) + abs(tdx) + abs(tdy)): # 接近 0 时使用精确计算
+            (sx1, sy1), (sx2, sy2) = left[s], right[s]
+            (tx1, ty1), (tx2, ty2) = left[t], right[t]
+            val = (sy2 - sy1) * (tx2 - tx1) - (ty2 - ty1) * (sx2 - sx1)
+        return (val > 0) - (val < 0)
+    slope_key = functools.cmp_to_key(slope_cmp)
+
+    def find_new_event(s, t, p): # 检查扫描线状态中相邻的两条线段是否在 p 之后相交
+        (ax, ay), (bx, by) = left[s], right[s]
+        (cx, cy), (dx, dy) = left[t], right[t]
+        rx, ry = bx - ax, by - ay
+        sx, sy = dx - cx, dy - cy
+        den = _cross(rx, ry, sx, sy)
+        if den == 0: # 平行或共线，共线重叠的情况会在端点事件中处理
+            return
+        num_t = _cross(cx - ax, cy - ay, sx, sy)
+        num_u = _cross(cx - ax, cy - ay, rx, ry)
+        if den < 0:
+            den, num_t, num_u = -den, -num_t, -num_u
+        if not (0 <= num_t <= den and 0 <= num_u <= den):
+            return
+        lam = Fraction(num_t, den)
+        q = (ax + lam * rx, ay + lam * ry)
+        q = tuple(int(v) if isinstance(v, Fraction) and v.denominator == 1 else v for v in q)
+        if q > p and q not in queued:
+            queued.add(q)
+            heapq.heappush(events, q)
+
+    status = [] # 扫描线状态，按照与扫描线交点的纵坐标从小到大排列
+    pairs = set()
+    while events:
+        p = heapq.heappop(events)
+        px, py = p
+        pxf, pyf = float(px), float(py)
+
+        lo, hi = 0, len(status) # 第一个不在 p 下方的线段
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if orient(status[mid], px, py, pxf, pyf) > 0:
+                lo = mid + 1
+            else:
+                hi = mid
+        hi = lo # 第一个位于 p 上方的线段
+        while hi < len(status) and orient(status[hi], px, py, pxf, pyf) == 0:
+            hi += 1
+
+        through = status[lo:hi] # 所有经过 p 的线段，包括以 p 为右端点的线段
+        upper   = starts.get(p, [])
+        touched = upper + through
+        if len(touched) >= 2: # 在 p 点相交的所有线段两两相交
+            for a in range(len(touched)):
+                for b in range(a + 1, len(touched)):
+                    i, j = touched[a], touched[b]
+                    pairs.add((i, j) if i < j else (j, i))
+
+        # 删除所有经过 p 的线段，再重新插入那些还没有结束的线段，顺序为 p 右侧紧邻位置的顺序
+        continuing = [s for s in touched if right[s] != p]
+        continuing.sort(key=slope_key)
+        status[lo:hi] = continuing
+
+        if len(continuing) == 0:
+            if 0 < lo < len(status):
+                find_new_event(status[lo - 1], status[lo], p)
+        else:
+            if lo > 0:
+                find_new_event(status[lo - 1], status[lo], p)
+            last = lo + len(continuing) - 1
+            if last + 1 < len(status):
+                find_new_event(status[last], status[last + 1], p)
+    return pairs
+
+def sweep_engine(memory_object): # 扫描线算法，复杂度 O((E + K) log E)
+    line_ids, starts, ends = memory_object.get_segment_arrays() # 直接读取紧凑存储中的端点坐标
+    segments = list(zip(map(tuple, starts.tolist()), map(tuple, ends.tolist())))
+
+    for i, j in sweep_line_pairs(segments):
+        yield line_ids[i], line_ids[j]
+
+def grid_engine(memory_object): # 使用 MemoryObject 中维护的边空间索引，只检查共享格子的边对
+    return memory_object.get_segment_grid().candidate_pairs()
+
+CROSSING_ENGINES = {
+    "naive": naive_engine,
+    "sweep": sweep_engine,
+    "grid": grid_engine,
+}
+
+def get_crossing_engine(name:str):
+    assert name in CROSSING_ENGINES, "unknown crossing engine: %s" % name
+    return CROSSING_ENGINES[name]
@@ -1,10 +1,8 @@
-import gettext
 import os
 import constant_config
 
 # 设置 locale 目录（存放翻译文件的路径）
 localedir = constant_config.LOCALE_DIR
-assert os.path.isdir(localedir)
 
 # 域名
 domain = constant_config.APP_NAME
@@ -30,6 +28,8 @@ def set_language(lang_code: str):
     current_locale = lang_code
     
     # 加载对应语言的翻译
+    import gettext # 只有真正切换语言时才需要
+    assert os.path.isdir(localedir)
     t = gettext.translation(
         domain=domain,
         localedir=localedir,
@@ -44,13 +44,16 @@ def set_language(lang_code: str):
             fp.write(lang_code)
     return _raw
 
-# 设置默认语言
-if not os.path.isfile(DEFAULT_LANG_FILE):
-    with open(DEFAULT_LANG_FILE, "w", encoding="utf-8") as fp:
-        fp.write(constant_config.LANG_CODE_SET[0])
-        
-assert os.path.isfile(DEFAULT_LANG_FILE)
-set_language(get_default_lang())
+# 初始化语言设置：只有图形界面会调用
+# 导入本模块不会读写任何文件，调用之前 _ 直接返回原始字符串，因此只计算 pd_code 的脚本不需要 locale 目录
+def init_language():
+    assert os.path.isdir(localedir)
+    if not os.path.isfile(DEFAULT_LANG_FILE):
+        with open(DEFAULT_LANG_FILE, "w", encoding="utf-8") as fp:
+            fp.write(constant_config.LANG_CODE_SET[0])
+
+    assert os.path.isfile(DEFAULT_LANG_FILE)
+    set_language(get_default_lang())
 
 # 切换语言
 def set_next_language(show_msg_callback):
@@ -68,6 +71,8 @@ def _(msg:str):
     return _raw(msg)
 
 if __name__ == "__main__": # 测试切换语言
+    init_language()
+
     # 动态切换到中文
     set_language('zh_CN')
     print(_('欢迎使用'))
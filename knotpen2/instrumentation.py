@@ -0,0 +1,127 @@
+import json
+import time
+import contextlib
+
+# 计时器与计数器
+# 默认关闭，关闭时 timer、laps 返回共享的空对象，count 直接返回，因此可以放在 pd_code 计算流程的各个阶段中
+# 开启之后：
+#   timer(name) 累计一个阶段的耗时以及调用次数
+#   laps(prefix) 依次记录连续的若干个子阶段的耗时，不需要为每个子阶段增加一层缩进
+#   count(name, value) 累加计数器，例如检查过的边对个数、找到的交叉点个数、输出的弧线个数
+#   session() 开始一次新的统计，开启 profile 时还会在 session 期间使用 cProfile 记录函数级别的耗时
+# 统计结果可以通过 summary_lines 显示，也可以使用 dump_json 和 dump_profile（pstats 格式）导出
+
+enabled  = False # 是否开启统计
+profile  = False # 是否同时使用 cProfile
+timers   = {}    # name -> [累计耗时, 调用次数]
+counters = {}    # name -> 累计值
+profiler = None  # 最近一次 session 的 cProfile.Profile
+
+def set_enabled(value:bool, with_profile:bool=False):
+    global enabled, profile
+    enabled = value
+    profile = value and with_profile
+    reset()
+
+def reset():
+    global profiler
+    timers.clear()
+    counters.clear()
+    profiler = None
+
+def add_time(name:str, seconds:float):
+    item = timers.get(name)
+    if item is None:
+        timers[name] = [seconds, 1]
+    else:
+        item[0] += seconds
+        item[1] += 1
+
+def count(name:str, value=1):
+    if enabled:
+        counters[name] = counters.get(name, 0) + value
+
+class Timer:
+    def __init__(self, name:str) -> None:
+        self.name = name
+
+    def __enter__(self):
+        self.time_start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        add_time(self.name, time.perf_counter() - self.time_start)
+        return False
+
+class Laps:
+    def __init__(self, prefix:str) -> None:
+        self.prefix    = prefix
+        self.time_last = time.perf_counter()
+
+    def lap(self, name:str): # 记录从上一次 lap（或者创建）到现在的耗时
+        time_now = time.perf_counter()
+        add_time(self.prefix + "." + name, time_now - self.time_last)
+        self.time_last = time_now
+
+class NullTimer: # 关闭统计时使用的空对象
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def lap(self, name:str):
+        pass
+
+NULL_TIMER = NullTimer()
+
+def timer(name:str):
+    return Timer(name) if enabled else NULL_TIMER
+
+def laps(prefix:str):
+    return Laps(prefix) if enabled else NULL_TIMER
+
+@contextlib.contextmanager
+def session(): # 清空之前的统计结果，之后的统计只属于这一次 session
+    global profiler
+    if not enabled:
+        yield
+        return
+
+    reset()
+    if profile:
+        import cProfile # 只在需要时导入
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+
+def get_report() -> dict:
+    return {
+        "timers": {name: {"seconds": seconds, "calls": calls} for name, (seconds, calls) in timers.items()},
+        "counters": dict(counters),
+    }
+
+def summary_lines(limit:int=8) -> list: # 耗时最多的若干个阶段以及所有计数器，用于在屏幕上显示
+    lines = []
+    for name, (seconds, calls) in sorted(timers.items(), key=lambda item: -item[1][0])[:limit]:
+        if calls == 1:
+            lines.append("%s: %.3fs" % (name, seconds))
+        else:
+            lines.append("%s: %.3fs (x%d)" % (name, seconds, calls))
+    if len(counters) > 0:
+        lines.append(", ".join("%s=%s" % (name, value) for name, value in counters.items()))
+    return lines
+
+def dump_json(filepath:str):
+    with open(filepath, "w", encoding="utf-8") as fp:
+        json.dump(get_report(), fp, ensure_ascii=False, indent=2)
+
+def dump_profile(filepath:str) -> bool: # 没有开启 profile 时返回 False
+    if profiler is None:
+        return False
+    profiler.dump_stats(filepath) # 可以使用 python -m pstats 查看
+    return True
@@ -6,6 +6,13 @@ from functools import wraps
 # 相对导入
 import constant_config
 
+def describe_error(err:Exception) -> str: # 一行错误描述：异常类型、信息以及抛出异常的位置，用于命令行工具的输出
+    frames = traceback.extract_tb(err.__traceback__)
+    own_frames = [frame for frame in frames if os.path.dirname(os.path.abspath(frame.filename)) == constant_config.DIRNOW]
+    frames = own_frames or frames # 异常在标准库中抛出时，给出本程序中最后一个调用的位置
+    where = " (%s:%d in %s)" % (os.path.basename(frames[-1].filename), frames[-1].lineno, frames[-1].name) if len(frames) > 0 else ""
+    return "%s: %s%s" % (type(err).__name__, err, where)
+
 def log_errors(func):
     """捕获函数异常并将完整堆栈信息保存到日志文件"""
     @wraps(func)
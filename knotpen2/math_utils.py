@@ -78,6 +78,115 @@ def compute_intersection(A, B, C, D):
     else:
         return None, None, None
 
+def batch_compute_intersection(A, B, C, D):
+    """
+    compute_intersection 的批量版本，同时计算 M 组直线 AB 与 CD 的交点
+
+    Args:
+        A, B, C, D(np.ndarray): 形状为 (M, 2) 的坐标数组
+
+    Returns:
+        (points, t, u)
+        points(np.ndarray): 形状为 (M, 2) 的交点坐标
+        t(np.ndarray): 形状为 (M, ) 的第一条线段上的参数
+        u(np.ndarray): 形状为 (M, ) 的第二条线段上的参数
+        没有交点（参数不在 [0, 1] 中，或者两条线段平行）的位置全部为 nan
+    """
+    A = np.asarray(A, dtype=np.float64)
+    B = np.asarray(B, dtype=np.float64)
+    C = np.asarray(C, dtype=np.float64)
+    D = np.asarray(D, dtype=np.float64)
+    x1, y1 = A[:, 0], A[:, 1]
+    x2, y2 = B[:, 0], B[:, 1]
+    x3, y3 = C[:, 0], C[:, 1]
+    x4, y4 = D[:, 0], D[:, 1]
+
+    # 计算顺序与 compute_intersection 完全一致，从而保证结果逐位相同
+    denominator = (x1 - x2) * (y3 - y4) - (y1 - y2) * (x3 - x4)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = ((x1 - x3) * (y3 - y4) - (y1 - y3) * (x3 - x4)) / denominator
+        u = -((x1 - x2) * (y1 - y3) - (y1 - y2) * (x1 - x3)) / denominator
+
+    valid = (denominator != 0) & (0 <= t) & (t <= 1) & (0 <= u) & (u <= 1)
+    t = np.where(valid, t, np.nan)
+    u = np.where(valid, u, np.nan)
+    points = np.stack([x1 + t * (x2 - x1), y1 + t * (y2 - y1)], axis=1)
+    return points, t, u
+
+def batch_calculate_t(A, B, P):
+    """calculate_t 的批量版本，A, B, P 是形状为 (M, 2) 的坐标数组"""
+    dx = B[:, 0] - A[:, 0]
+    dy = B[:, 1] - A[:, 1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tx = (P[:, 0] - A[:, 0]) / dx
+        ty = (P[:, 1] - A[:, 1]) / dy
+    t = np.where(dx != 0, tx, ty)
+    return np.where((dx == 0) & (dy == 0), 0.0, t) # 若 A=B，线段退化为点，t 定义为 0
+
+def batch_on_segment(A, B, C):
+    """on_segment 的批量版本，检查点 C 是否在线段 AB 的包围盒中"""
+    return ((np.minimum(A[:, 0], B[:, 0]) <= C[:, 0]) & (C[:, 0] <= np.maximum(A[:, 0], B[:, 0])) &
+            (np.minimum(A[:, 1], B[:, 1]) <= C[:, 1]) & (C[:, 1] <= np.maximum(A[:, 1], B[:, 1])))
+
+def batch_segments_intersect(starts, ends, pairs):
+    """
+    segments_intersect 的批量版本，一次性检查所有候选线段对
+
+    Args:
+        starts(np.ndarray): 形状为 (N, 2) 的线段起点坐标
+        ends(np.ndarray): 形状为 (N, 2) 的线段终点坐标
+        pairs(np.ndarray): 形状为 (M, 2) 的整数数组，每一行是两条线段的下标 (i, j)
+
+    Returns:
+        (hit, points, t, u)
+        hit(np.ndarray): 形状为 (M, ) 的布尔数组，表示每一对线段是否相交
+        points(np.ndarray): 形状为 (M, 2) 的交点坐标
+        t(np.ndarray): 交点在线段 i 上的参数
+        u(np.ndarray): 交点在线段 j 上的参数
+        不相交的位置全部为 nan，标准相交、共线以及端点相交的处理方式与 segments_intersect 相同
+    """
+    starts = np.asarray(starts, dtype=np.float64).reshape(-1, 2)
+    ends   = np.asarray(ends,   dtype=np.float64).reshape(-1, 2)
+    pairs  = np.asarray(pairs,  dtype=np.int64).reshape(-1, 2)
+    A, B = starts[pairs[:, 0]], ends[pairs[:, 0]]
+    C, D = starts[pairs[:, 1]], ends[pairs[:, 1]]
+
+    def batch_ccw(P, Q, R):
+        return (Q[:, 0] - P[:, 0]) * (R[:, 1] - P[:, 1]) - (Q[:, 1] - P[:, 1]) * (R[:, 0] - P[:, 0])
+
+    ccw1 = batch_ccw(A, B, C)
+    ccw2 = batch_ccw(A, B, D)
+    ccw3 = batch_ccw(C, D, A)
+    ccw4 = batch_ccw(C, D, B)
+
+    m = len(pairs)
+    points = np.full((m, 2), np.nan)
+    t = np.full(m, np.nan)
+    u = np.full(m, np.nan)
+    decided = np.zeros(m, dtype=bool)
+
+    # 标准相交情况，即使交点参数超出范围也不再考虑后面的情况
+    proper = (ccw1 * ccw2 < 0) & (ccw3 * ccw4 < 0)
+    if proper.any():
+        points[proper], t[proper], u[proper] = batch_compute_intersection(A[proper], B[proper], C[proper], D[proper])
+    decided |= proper
+
+    # 处理共线情况和端点相交，按照 segments_intersect 中的优先级依次处理
+    endpoint_cases = [
+        (ccw1, A, B, C, lambda mask: (C[mask], batch_calculate_t(A[mask], B[mask], C[mask]), 0.0)),
+        (ccw2, A, B, D, lambda mask: (D[mask], batch_calculate_t(A[mask], B[mask], D[mask]), 1.0)),
+        (ccw3, C, D, A, lambda mask: (A[mask], 0.0, batch_calculate_t(C[mask], D[mask], A[mask]))),
+        (ccw4, C, D, B, lambda mask: (B[mask], 1.0, batch_calculate_t(C[mask], D[mask], B[mask]))),
+    ]
+    for ccw_val, P, Q, R, solve in endpoint_cases:
+        mask = ~decided & (ccw_val == 0) & batch_on_segment(P, Q, R)
+        if mask.any():
+            points[mask], t[mask], u[mask] = solve(mask)
+        decided |= mask
+
+    hit = ~np.isnan(t)
+    return hit, points, t, u
+
 def on_segment(A, B, C):
     """检查点C是否在线段AB上"""
     return (min(A[0], B[0]) <= C[0] <= max(A[0], B[0]) and
@@ -158,3 +267,29 @@ def bezier_midpoint_and_tangent(start, control, end):
         tangent = tangent / np.linalg.norm(tangent)
     
     return tuple(midpoint), tuple(tangent)
+
+def batch_bezier_midpoint_and_tangent(start, control, end):
+    """
+    bezier_midpoint_and_tangent 的批量版本，一次性计算所有曲线
+
+    Args:
+        start(np.ndarray): 形状为 (N, 2) 的起点坐标
+        control(np.ndarray): 形状为 (N, 2) 的控制点坐标
+        end(np.ndarray): 形状为 (N, 2) 的终点坐标
+
+    Returns:
+        (midpoint, tangent)
+        midpoint(np.ndarray): 形状为 (N, 2) 的曲线中点坐标
+        tangent(np.ndarray): 形状为 (N, 2) 的中点处的切向量，长度不为 0 的已经归一化
+    """
+    start   = np.asarray(start,   dtype=np.float64).reshape(-1, 2)
+    control = np.asarray(control, dtype=np.float64).reshape(-1, 2)
+    end     = np.asarray(end,     dtype=np.float64).reshape(-1, 2)
+
+    midpoint = 0.25 * start + 0.5 * control + 0.25 * end
+    tangent  = 2 * (0.5 * (control - start) + 0.5 * (end - control))
+
+    norm = np.sqrt(tangent[:, 0] * tangent[:, 0] + tangent[:, 1] * tangent[:, 1])
+    nonzero = norm > 0
+    tangent[nonzero] /= norm[nonzero, None]
+    return midpoint, tangent
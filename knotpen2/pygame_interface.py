@@ -6,12 +6,24 @@ import pygame
 # handle_key_down(key, mod, unicode): 键盘按键按下回调函数
 # handle_key_up(key, mod): 键盘按键释放回调函数
 # handle_quit(): 页面关闭回调函数，返回页面是否要继续运行
-# draw_screen(screen): 用于绘制屏幕内容
+# draw_screen(screen): 用于绘制屏幕内容，可以返回屏幕上发生变化的矩形列表，此时只更新这些区域
 # die_check(): 检测游戏当前是否应该被关闭, True: 是, False: 否
+# fps: 每秒最多绘制多少帧，None 表示不限制
+# idle_wait: 没有任何事件时最多阻塞等待多少毫秒，超时之后仍然会绘制一帧（例如显示后台线程产生的消息）
+
+def coalesce_mouse_motion(events:list) -> list: # 连续的多个鼠标移动事件只保留最后一个
+    ans = []
+    for i, event in enumerate(events):
+        if event.type == pygame.MOUSEMOTION and i + 1 < len(events) and events[i + 1].type == pygame.MOUSEMOTION:
+            continue
+        ans.append(event)
+    return ans
+
 def pygame_interface(handle_mouse_down=None, handle_mouse_up=None, 
                      handle_key_down=None, handle_key_up=None, 
                      handle_quit=None, draw_screen=None,
-                     die_check=None, handle_mouse_move=None, width=None, height=None, caption=""):
+                     die_check=None, handle_mouse_move=None, width=None, height=None, caption="",
+                     fps=None, idle_wait=500):
     pygame.init() # 初始化 Pygame
 
     pygame.key.stop_text_input()  # 禁用输入法
@@ -35,14 +47,16 @@ def pygame_interface(handle_mouse_down=None, handle_mouse_up=None,
     
     # 主循环控制变量
     running = True
+    clock   = pygame.time.Clock()
+    pending = [] # 阻塞等待时取到的事件
     
     # 主游戏循环
     while running:
-        if die_check is not None:
-            running = not die_check()
+        events = pending + pygame.event.get()
+        pending = []
 
-        # 处理事件
-        for event in pygame.event.get():
+        # 处理事件，拖动时堆积的鼠标移动事件只需要处理最新的位置
+        for event in coalesce_mouse_motion(events):
             if event.type == pygame.QUIT: # 检测退出事件
                 if handle_quit is not None:
                     handle_quit()# 调用退出回调函数
@@ -81,10 +95,25 @@ def pygame_interface(handle_mouse_down=None, handle_mouse_up=None,
                 if handle_key_up is not None:
                     handle_key_up(key, mod)
         
+        rects = None
         if draw_screen is None:
             screen.fill((255, 255, 255)) # 填充白色背景
         else:
-            draw_screen(screen) # 绘制屏幕内容
-        pygame.display.flip() # 更新显示
+            rects = draw_screen(screen) # 绘制屏幕内容
+
+        if rects is None:
+            pygame.display.flip() # 更新整个屏幕
+        elif len(rects) > 0:
+            pygame.display.update(rects) # 只更新发生变化的区域
+
+        clock.tick(fps or 0) # 限制帧率
+
+        if die_check is not None:
+            running = not die_check()
+
+        if running and not pygame.event.peek(): # 空闲时阻塞等待下一个事件，不再占用 CPU
+            event = pygame.event.wait(idle_wait)
+            if event.type != pygame.NOEVENT:
+                pending.append(event)
 
     pygame.quit() # 退出 Pygame
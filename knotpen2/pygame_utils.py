@@ -39,11 +39,12 @@ def draw_empty_circle(screen, border_color, x, y, radius):
 def draw_full_circle(screen, fill_color, x, y, radius):
     pygame.draw.circle(screen, fill_color, (x, y), radius)
 
-# 把 pos_21 ~ pos_22 画在 pos_11 ~ pos_12 上面
-def draw_line_on_line(screen, pos_11, pos_12, pos_21, pos_22, line_color):
+# 计算把 pos_21 ~ pos_22 画在 pos_11 ~ pos_12 上面时需要绘制的遮挡图形
+# 返回 (polygon, border_1, border_2)：白色多边形以及上方线段的两条边界线，两条边不相交时返回 None
+def compute_line_on_line(pos_11, pos_12, pos_21, pos_22):
     crossing, _, _ = math_utils.segments_intersect((pos_11, pos_12), (pos_21, pos_22))
     if crossing is None:
-        return
+        return None
     
     pos_11 = numpy.array(pos_11).astype(numpy.float64)
     pos_12 = numpy.array(pos_12).astype(numpy.float64)
@@ -59,22 +60,32 @@ def draw_line_on_line(screen, pos_11, pos_12, pos_21, pos_22, line_color):
     norm_1 = numpy.array([-dir_1[1], dir_1[0]])
     norm_2 = numpy.array([-dir_2[1], dir_2[0]])
 
-    p = []
-    for i in range(2):
-        for j in range(2):
-            d1 = 2 * i - 1 # -1 或者 +1
-            d2 = 2 * j - 1 # -1 或者 +1
-            pos, _, _ = math_utils.compute_intersection(
-                pos_11 + d1 * norm_1 * (constant_config.LINE_WIDTH / 2 + 0.5),
-                pos_12 + d1 * norm_1 * (constant_config.LINE_WIDTH / 2 + 0.5),
-                pos_21 + d2 * norm_2 * (constant_config.LINE_WIDTH / 2 + 0.5),
-                pos_22 + d2 * norm_2 * (constant_config.LINE_WIDTH / 2 + 0.5),
-            )
-            p.append(pos)
+    # 四组平移后的边界线，一次性计算它们的交点
+    offset = constant_config.LINE_WIDTH / 2 + 0.5
+    d1 = numpy.array([-1, -1, +1, +1])[:, None] # -1 或者 +1
+    d2 = numpy.array([-1, +1, -1, +1])[:, None] # -1 或者 +1
+    points, t, _ = math_utils.batch_compute_intersection(
+        pos_11 + d1 * norm_1 * offset,
+        pos_12 + d1 * norm_1 * offset,
+        pos_21 + d2 * norm_2 * offset,
+        pos_22 + d2 * norm_2 * offset,
+    )
+    p = [None if numpy.isnan(t[k]) else (float(points[k][0]), float(points[k][1])) for k in range(4)]
+
+    if None in p:
+        return None
+    p[3], p[2] = p[2], p[3] # 修正顺序
+    return (p, (p[2], p[1]), (p[0], p[3]))
 
-    if None not in p:
-        p[3], p[2] = p[2], p[3] # 修正顺序
-        pygame.draw.polygon(screen, constant_config.WHITE, p)
+# 绘制 compute_line_on_line 得到的遮挡图形，(dx, dy) 是整体平移量
+def draw_overlay(screen, overlay, line_color, dx=0, dy=0):
+    polygon, border_1, border_2 = overlay
+    pygame.draw.polygon(screen, constant_config.WHITE, [(x + dx, y + dy) for x, y in polygon])
+    for (x1, y1), (x2, y2) in [border_1, border_2]:
+        pygame.draw.line(screen, line_color, (x1 + dx, y1 + dy), (x2 + dx, y2 + dy))
 
-        pygame.draw.line(screen, line_color, p[2], p[1])
-        pygame.draw.line(screen, line_color, p[0], p[3])
+# 把 pos_21 ~ pos_22 画在 pos_11 ~ pos_12 上面
+def draw_line_on_line(screen, pos_11, pos_12, pos_21, pos_22, line_color):
+    overlay = compute_line_on_line(pos_11, pos_12, pos_21, pos_22)
+    if overlay is not None:
+        draw_overlay(screen, overlay, line_color)
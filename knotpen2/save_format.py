@@ -0,0 +1,215 @@
+import ast
+import io
+import os
+import json
+import numpy
+
+# 相对导入
+import GeometryStore
+
+# 存档格式
+# 版本 1：repr(dict) 格式，只能使用 eval 加载，现在只用于兼容旧存档（使用 ast.literal_eval 加载）
+# 版本 2：真正的 json 格式，节点和边按列存储，可以直接转换为 numpy 数组
+# 版本 2 还有一个二进制变体：使用 numpy.savez_compressed 保存的 .npz 文件
+#
+# 读写的对象是 MemoryObject.get_save_state 返回的 state，格式为：
+# {
+#     "dot_id_max": int, "line_id_max": int,
+#     "dot_nums": (N, ) 节点编号, "coords": (N, 2) 节点坐标,
+#     "line_nums": (E, ) 边编号, "line_ends": (E, 2) 端点编号,
+#     "inverse_pairs": [(line_num_1, line_num_2), ...],
+#     "base_dot": [dot_num, ...], "dir_dot": [dot_num, ...],
+#     "pd_code_final": None 或者 list,
+# }
+
+FORMAT_NAME    = "knotpen2"
+FORMAT_VERSION = 2
+NPZ_MAGIC      = b"PK" # npz 文件本质上是 zip 文件
+
+def empty_state() -> dict: # 空白状态
+    return {
+        "dot_id_max": 0,
+        "line_id_max": 0,
+        "dot_nums": numpy.zeros(0, dtype=numpy.int64),
+        "coords": numpy.zeros((0, 2), dtype=numpy.float64),
+        "line_nums": numpy.zeros(0, dtype=numpy.int64),
+        "line_ends": numpy.zeros((0, 2), dtype=numpy.int64),
+        "inverse_pairs": [],
+        "base_dot": [],
+        "dir_dot": [],
+        "pd_code_final": None,
+    }
+
+def column_to_list(arr:numpy.ndarray) -> list: # 整数值的列保存为整数，避免存档中出现大量的 ".0"
+    if len(arr) > 0 and numpy.all(numpy.isfinite(arr)) and numpy.all(arr == numpy.round(arr)):
+        return arr.astype(numpy.int64).tolist()
+    return arr.tolist()
+
+def normalize_pd_code_final(pd_code_final): # json 不区分 tuple 和 list，加载后恢复为 tuple
+    if pd_code_final is None:
+        return None
+    ans = []
+    for term in pd_code_final:
+        ans.append({
+            "X": list(term["X"]),
+            "dir": [tuple(item) for item in term["dir"]],
+            "pos": tuple(term["pos"]),
+        })
+    return ans
+
+def state_to_document(state:dict) -> dict: # state -> 可以直接被 json 序列化的 dict
+    coords = numpy.asarray(state["coords"]).reshape(-1, 2)
+    line_ends = numpy.asarray(state["line_ends"]).reshape(-1, 2)
+    return {
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "dot_id_max": int(state["dot_id_max"]),
+        "line_id_max": int(state["line_id_max"]),
+        "dots": {
+            "id": numpy.asarray(state["dot_nums"]).tolist(),
+            "x": column_to_list(coords[:, 0]),
+            "y": column_to_list(coords[:, 1]),
+        },
+        "lines": {
+            "id": numpy.asarray(state["line_nums"]).tolist(),
+            "from": line_ends[:, 0].tolist(),
+            "to": line_ends[:, 1].tolist(),
+        },
+        "inverse_pairs": [[int(a), int(b)] for a, b in state["inverse_pairs"]],
+        "base_dot": [int(num) for num in state["base_dot"]],
+        "dir_dot": [int(num) for num in state["dir_dot"]],
+        "pd_code_final": state["pd_code_final"],
+    }
+
+def document_to_state(doc:dict) -> dict: # json dict -> state
+    if doc.get("format") != FORMAT_NAME:
+        raise ValueError("not a knotpen2 save file")
+    if doc.get("version") != FORMAT_VERSION:
+        raise ValueError("unsupported knotpen2 save version: %r" % doc.get("version"))
+
+    dots  = doc["dots"]
+    lines = doc["lines"]
+    return {
+        "dot_id_max": int(doc["dot_id_max"]),
+        "line_id_max": int(doc["line_id_max"]),
+        "dot_nums": numpy.array(dots["id"], dtype=numpy.int64),
+        "coords": numpy.column_stack([
+            numpy.array(dots["x"], dtype=numpy.float64),
+            numpy.array(dots["y"], dtype=numpy.float64)]).reshape(-1, 2),
+        "line_nums": numpy.array(lines["id"], dtype=numpy.int64),
+        "line_ends": numpy.column_stack([
+            numpy.array(lines["from"], dtype=numpy.int64),
+            numpy.array(lines["to"], dtype=numpy.int64)]).reshape(-1, 2),
+        "inverse_pairs": [(int(a), int(b)) for a, b in doc["inverse_pairs"]],
+        "base_dot": [int(num) for num in doc["base_dot"]],
+        "dir_dot": [int(num) for num in doc["dir_dot"]],
+        "pd_code_final": normalize_pd_code_final(doc.get("pd_code_final")),
+    }
+
+def legacy_info_to_state(info:dict) -> dict: # 版本 1 的存档（get_all_info 的格式） -> state
+    def dot_list(value): # 早期版本中 base_dot 和 dir_dot 可能是单个节点或者 None
+        if value is None:
+            return []
+        if isinstance(value, str):
+            return [GeometryStore.dot_number(value)]
+        return [GeometryStore.dot_number(dot_id) for dot_id in value]
+
+    dot_dict  = info["dot_dict"]
+    line_dict = info["line_dict"]
+    return {
+        "dot_id_max": int(info["dot_id_max"]),
+        "line_id_max": int(info["line_id_max"]),
+        "dot_nums": numpy.array([GeometryStore.dot_number(key) for key in dot_dict], dtype=numpy.int64),
+        "coords": numpy.array(list(dot_dict.values()), dtype=numpy.float64).reshape(-1, 2),
+        "line_nums": numpy.array([GeometryStore.line_number(key) for key in line_dict], dtype=numpy.int64),
+        "line_ends": numpy.array([
+            (GeometryStore.dot_number(dot_from), GeometryStore.dot_number(dot_to))
+            for dot_from, dot_to in line_dict.values()], dtype=numpy.int64).reshape(-1, 2),
+        "inverse_pairs": [
+            (GeometryStore.line_number(line_id_1), GeometryStore.line_number(line_id_2))
+            for line_id_1, line_id_2 in info["inverse_pairs"]],
+        "base_dot": dot_list(info["base_dot"]),
+        "dir_dot": dot_list(info["dir_dot"]),
+        "pd_code_final": normalize_pd_code_final(info.get("pd_code_final")),
+    }
+
+def atomic_write(filepath:str, data:bytes):
+    """
+    原子地写入文件：先写入同一目录下的临时文件，再使用 os.replace 替换目标文件
+
+    写入过程中程序崩溃时，目标文件要么是旧的内容，要么是新的内容，不会出现写了一半的文件
+    """
+    folder = os.path.dirname(os.path.abspath(filepath))
+    import tempfile # 只在写文件时导入，减少只读取存档的脚本的启动时间
+    fd, temp_path = tempfile.mkstemp(dir=folder, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            fp.write(data)
+            fp.flush()
+            os.fsync(fp.fileno()) # 保证数据已经落盘
+        os.replace(temp_path, filepath)
+    except:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def encode_json(state:dict) -> bytes: # 相同的 state 总是得到相同的字节串，可以用于判断存档是否重复
+    return json.dumps(state_to_document(state), separators=(",", ":")).encode("utf-8")
+
+def encode_npz(state:dict) -> bytes: # 二进制变体，坐标使用 float64 保存
+    doc = state_to_document(state)
+    meta = {key: doc[key] for key in ["format", "version", "dot_id_max", "line_id_max", "inverse_pairs", "base_dot", "dir_dot", "pd_code_final"]}
+    buffer = io.BytesIO()
+    numpy.savez_compressed(buffer,
+        meta=numpy.array(json.dumps(meta, separators=(",", ":"))),
+        dot_nums=numpy.asarray(state["dot_nums"], dtype=numpy.int64),
+        coords=numpy.asarray(state["coords"], dtype=numpy.float64).reshape(-1, 2),
+        line_nums=numpy.asarray(state["line_nums"], dtype=numpy.int64),
+        line_ends=numpy.asarray(state["line_ends"], dtype=numpy.int64).reshape(-1, 2))
+    return buffer.getvalue()
+
+def encode(filepath:str, state:dict) -> bytes: # 根据文件后缀名选择格式
+    if filepath.lower().endswith(".npz"):
+        return encode_npz(state)
+    return encode_json(state)
+
+def read_npz(filepath:str) -> dict:
+    with numpy.load(filepath, allow_pickle=False) as data: # 不允许 pickle，保证加载过程是安全的
+        doc = json.loads(str(data["meta"]))
+        doc["dots"]  = {"id": [], "x": [], "y": []}
+        doc["lines"] = {"id": [], "from": [], "to": []}
+        state = document_to_state(doc)
+        state["dot_nums"]  = data["dot_nums"]
+        state["coords"]    = data["coords"]
+        state["line_nums"] = data["line_nums"]
+        state["line_ends"] = data["line_ends"]
+    return state
+
+def write(filepath:str, state:dict): # 根据文件后缀名选择格式，原子写入
+    atomic_write(filepath, encode(filepath, state))
+
+def read(filepath:str) -> dict:
+    """
+    加载存档，自动识别 json、npz 以及旧版本的 repr 格式
+
+    Args:
+        filepath(str): 存档路径
+
+    Returns:
+        dict: state，格式见本文件开头的说明
+    """
+    with open(filepath, "rb") as fp:
+        head = fp.read(len(NPZ_MAGIC))
+    if head == NPZ_MAGIC:
+        return read_npz(filepath)
+
+    with open(filepath, "r", encoding="utf-8") as fp:
+        text = fp.read()
+    try:
+        doc = json.loads(text)
+    except json.JSONDecodeError: # 旧版本的存档不是真正的 json
+        return legacy_info_to_state(ast.literal_eval(text))
+
+    if isinstance(doc, dict) and doc.get("format") is None and "dot_dict" in doc: # 恰好能被 json 解析的旧版本存档
+        return legacy_info_to_state(doc)
+    return document_to_state(doc)
@@ -0,0 +1,403 @@
+import math
+import itertools
+import numpy
+
+# 相对导入
+import math_utils
+
+# 均匀网格空间索引
+# 每个格子的边长为 cell_size，查询时只需要访问查询范围覆盖到的格子
+# 查询范围很大时（例如缩小视图之后的整个屏幕），范围内绝大多数格子都是空的，
+# 因此每 2**BLOCK_BITS × 2**BLOCK_BITS 个格子组成一块，块中记录其中的非空格子，查询时按块跳过空白区域
+
+BLOCK_BITS = 4
+
+class CellBlocks:
+    """
+    记录每一块中的非空格子，格子被创建或者删除时需要调用 add、discard
+    """
+    def __init__(self) -> None:
+        self.blocks = {} # (bx, by) -> set((cx, cy))
+
+    def add(self, cell):
+        block = (cell[0] >> BLOCK_BITS, cell[1] >> BLOCK_BITS)
+        cells = self.blocks.get(block)
+        if cells is None:
+            self.blocks[block] = {cell}
+        else:
+            cells.add(cell)
+
+    def discard(self, cell):
+        block = (cell[0] >> BLOCK_BITS, cell[1] >> BLOCK_BITS)
+        cells = self.blocks[block]
+        cells.discard(cell)
+        if len(cells) == 0:
+            del self.blocks[block]
+
+    def cells_in_range(self, cells:dict, cx_min, cy_min, cx_max, cy_max) -> list: # 返回格子编号在范围内的所有非空格子
+        if (cx_max - cx_min + 1) * (cy_max - cy_min + 1) <= 1 << (2 * BLOCK_BITS): # 范围较小时直接枚举格子
+            return [cell for cell in ((cx, cy) for cx in range(cx_min, cx_max + 1) for cy in range(cy_min, cy_max + 1)) if cell in cells]
+
+        bx_min, by_min = cx_min >> BLOCK_BITS, cy_min >> BLOCK_BITS
+        bx_max, by_max = cx_max >> BLOCK_BITS, cy_max >> BLOCK_BITS
+        if (bx_max - bx_min + 1) * (by_max - by_min + 1) > len(self.blocks): # 块的数量也太多时，直接枚举所有非空块
+            block_iter = [block for block in self.blocks if bx_min <= block[0] <= bx_max and by_min <= block[1] <= by_max]
+        else:
+            block_iter = [(bx, by) for bx in range(bx_min, bx_max + 1) for by in range(by_min, by_max + 1)]
+
+        ans = []
+        for block in block_iter:
+            block_cells = self.blocks.get(block)
+            if block_cells is None:
+                continue
+            if bx_min < block[0] < bx_max and by_min < block[1] < by_max: # 整块都在范围内
+                ans.extend(block_cells)
+            else:
+                ans.extend(cell for cell in block_cells if cx_min <= cell[0] <= cx_max and cy_min <= cell[1] <= cy_max)
+        return ans
+
+class PointGrid:
+    """
+    点的空间哈希，支持增量插入、删除、移动以及整体平移
+
+    网格内部记录的是平移之前的坐标，整体平移只需要修改 offset，复杂度为 O(1)
+    """
+    def __init__(self, cell_size:float) -> None:
+        assert cell_size > 0
+        self.cell_size = cell_size
+        self.clear()
+
+    def clear(self):
+        self.cells     = {} # (cx, cy) -> {item_id: (x, y)}
+        self.item_cell = {} # item_id -> (cx, cy)
+        self.blocks    = CellBlocks()
+        self.offset_x  = 0  # 整体平移量
+        self.offset_y  = 0
+
+    def __len__(self):
+        return len(self.item_cell)
+
+    def get_cell(self, x, y): # 计算网格内部坐标所在的格子
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+
+    def insert(self, item_id, x, y):
+        if item_id in self.item_cell:
+            self.remove(item_id)
+        x -= self.offset_x
+        y -= self.offset_y
+        cell = self.get_cell(x, y)
+        self.add_to_cell(cell, item_id, (x, y))
+        self.item_cell[item_id] = cell
+
+    def add_to_cell(self, cell, item_id, pos):
+        bucket = self.cells.get(cell)
+        if bucket is None:
+            self.cells[cell] = {item_id: pos}
+            self.blocks.add(cell)
+        else:
+            bucket[item_id] = pos
+
+    def bulk_load(self, item_ids:list, positions:list): # 批量插入，格子编号使用 numpy 一次性计算
+        if len(positions) == 0:
+            return
+        for item_id in item_ids: # 重复插入的点先删除
+            if item_id in self.item_cell:
+                self.remove(item_id)
+        local = numpy.asarray(positions, dtype=numpy.float64) - (self.offset_x, self.offset_y)
+        cells = list(map(tuple, numpy.floor(local / self.cell_size).astype(numpy.int64).tolist()))
+        if self.offset_x == 0 and self.offset_y == 0: # 常见情况：没有整体平移过，直接使用原来的坐标
+            local_positions = positions
+        else:
+            local_positions = [(x - self.offset_x, y - self.offset_y) for x, y in positions]
+        self.item_cell.update(zip(item_ids, cells))
+        for item_id, pos, cell in zip(item_ids, local_positions, cells):
+            bucket = self.cells.get(cell)
+            if bucket is None:
+                self.cells[cell] = {item_id: pos}
+                self.blocks.add(cell)
+            else:
+                bucket[item_id] = pos
+
+    def remove(self, item_id):
+        cell = self.item_cell.pop(item_id, None)
+        if cell is None:
+            return
+        bucket = self.cells[cell]
+        del bucket[item_id]
+        if len(bucket) == 0: # 删除空格子，保证格子数量不超过点的数量
+            del self.cells[cell]
+            self.blocks.discard(cell)
+
+    def move(self, item_id, x, y):
+        x -= self.offset_x
+        y -= self.offset_y
+        cell = self.get_cell(x, y)
+        old_cell = self.item_cell.get(item_id)
+        if old_cell == cell: # 仍然在原来的格子里
+            self.cells[cell][item_id] = (x, y)
+            return
+        self.remove(item_id)
+        self.add_to_cell(cell, item_id, (x, y))
+        self.item_cell[item_id] = cell
+
+    def shift(self, dx, dy): # 所有点一起移动
+        self.offset_x += dx
+        self.offset_y += dy
+
+    def query_rect(self, xmin, ymin, xmax, ymax) -> list: # 返回矩形范围内的所有 (item_id, (x, y))
+        xmin -= self.offset_x
+        xmax -= self.offset_x
+        ymin -= self.offset_y
+        ymax -= self.offset_y
+        cx_min, cy_min = self.get_cell(xmin, ymin)
+        cx_max, cy_max = self.get_cell(xmax, ymax)
+
+        ans = []
+        cell_iter = self.blocks.cells_in_range(self.cells, cx_min, cy_min, cx_max, cy_max)
+
+        for cell in cell_iter:
+            for item_id, (x, y) in self.cells[cell].items():
+                if xmin <= x <= xmax and ymin <= y <= ymax:
+                    ans.append((item_id, (x + self.offset_x, y + self.offset_y)))
+        return ans
+
+    def count_rect(self, xmin, ymin, xmax, ymax) -> int: # 矩形范围内点的个数，完全位于范围内的格子不需要逐个检查
+        xmin -= self.offset_x
+        xmax -= self.offset_x
+        ymin -= self.offset_y
+        ymax -= self.offset_y
+        cx_min, cy_min = self.get_cell(xmin, ymin)
+        cx_max, cy_max = self.get_cell(xmax, ymax)
+
+        cell_iter = self.blocks.cells_in_range(self.cells, cx_min, cy_min, cx_max, cy_max)
+
+        ans = 0
+        for cell in cell_iter:
+            bucket = self.cells[cell]
+            if cx_min < cell[0] < cx_max and cy_min < cell[1] < cy_max:
+                ans += len(bucket)
+                continue
+            for x, y in bucket.values():
+                if xmin <= x <= xmax and ymin <= y <= ymax:
+                    ans += 1
+        return ans
+
+    def query_radius(self, x, y, radius) -> list: # 返回距离 (x, y) 不超过 radius 的所有 (item_id, dis)
+        ans = []
+        for item_id, (xnow, ynow) in self.query_rect(x - radius, y - radius, x + radius, y + radius):
+            dis = math.hypot(xnow - x, ynow - y)
+            if dis <= radius:
+                ans.append((item_id, dis))
+        return ans
+
+    def find_nearest(self, x, y, radius, exclude=None): # 找到距离 (x, y) 不超过 radius 的最近点，找不到时返回 None
+        best_id  = None
+        best_dis = math.inf
+        for item_id, dis in self.query_radius(x, y, radius):
+            if item_id != exclude and dis < best_dis:
+                best_id, best_dis = item_id, dis
+        return best_id
+
+    def bounding_box(self): # 计算所有点的包围盒，只需要访问位于边界上的格子
+        xmin = ymin = + math.inf
+        xmax = ymax = - math.inf
+        if len(self.cells) == 0:
+            return (xmin, ymin, xmax, ymax)
+
+        cx_min = min(cell[0] for cell in self.cells)
+        cx_max = max(cell[0] for cell in self.cells)
+        cy_min = min(cell[1] for cell in self.cells)
+        cy_max = max(cell[1] for cell in self.cells)
+        for cell, bucket in self.cells.items():
+            if cell[0] not in (cx_min, cx_max) and cell[1] not in (cy_min, cy_max):
+                continue
+            for x, y in bucket.values():
+                xmin = min(xmin, x)
+                ymin = min(ymin, y)
+                xmax = max(xmax, x)
+                ymax = max(ymax, y)
+        return (xmin + self.offset_x, ymin + self.offset_y, xmax + self.offset_x, ymax + self.offset_y)
+
+class SegmentGrid:
+    """
+    线段的空间哈希，每条线段会被登记到它经过的所有格子中
+
+    与 PointGrid 一样，网格内部记录的是平移之前的坐标，整体平移的复杂度为 O(1)
+    """
+    def __init__(self, cell_size:float) -> None:
+        assert cell_size > 0
+        self.cell_size = cell_size
+        self.clear()
+
+    def clear(self):
+        self.cells      = {} # (cx, cy) -> set(item_id)
+        self.item_cells = {} # item_id -> [(cx, cy), ...]
+        self.blocks     = CellBlocks()
+        self.item_seg   = {} # item_id -> ((x1, y1), (x2, y2))
+        self.offset_x   = 0  # 整体平移量
+        self.offset_y   = 0
+
+    def __len__(self):
+        return len(self.item_seg)
+
+    def get_cell(self, x, y): # 计算网格内部坐标所在的格子
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+
+    def get_covered_cells(self, pos_from, pos_to) -> list: # 计算线段经过的所有格子
+        (x1, y1), (x2, y2) = pos_from, pos_to
+        if x2 < x1:
+            x1, y1, x2, y2 = x2, y2, x1, y1
+        eps = self.cell_size * 1e-9 # 避免浮点误差导致漏掉格子
+        cx_min = math.floor(x1 / self.cell_size)
+        cx_max = math.floor(x2 / self.cell_size)
+
+        cells = []
+        for cx in range(cx_min, cx_max + 1): # 逐列计算线段在这一列中的纵坐标范围
+            if x1 == x2:
+                ya, yb = y1, y2
+            else:
+                xa = max(x1, cx * self.cell_size)
+                xb = min(x2, (cx + 1) * self.cell_size)
+                ya = y1 + (y2 - y1) * (xa - x1) / (x2 - x1)
+                yb = y1 + (y2 - y1) * (xb - x1) / (x2 - x1)
+            cy_min = math.floor((min(ya, yb) - eps) / self.cell_size)
+            cy_max = math.floor((max(ya, yb) + eps) / self.cell_size)
+            for cy in range(cy_min, cy_max + 1):
+                cells.append((cx, cy))
+        return cells
+
+    def insert(self, item_id, pos_from, pos_to):
+        if item_id in self.item_seg:
+            self.remove(item_id)
+        pos_from = (pos_from[0] - self.offset_x, pos_from[1] - self.offset_y)
+        pos_to   = (pos_to  [0] - self.offset_x, pos_to  [1] - self.offset_y)
+        cells = self.get_covered_cells(pos_from, pos_to)
+        for cell in cells:
+            bucket = self.cells.get(cell)
+            if bucket is None:
+                self.cells[cell] = {item_id}
+                self.blocks.add(cell)
+            else:
+                bucket.add(item_id)
+        self.item_cells[item_id] = cells
+        self.item_seg[item_id] = (pos_from, pos_to)
+
+    def bulk_load(self, item_ids:list, starts:numpy.ndarray, ends:numpy.ndarray):
+        """
+        批量插入线段，所有线段经过的格子使用 numpy 一次性计算，计算方法与 get_covered_cells 完全相同
+
+        Args:
+            item_ids(list): 线段编号
+            starts(np.ndarray): 形状为 (E, 2) 的起点坐标
+            ends(np.ndarray): 形状为 (E, 2) 的终点坐标
+        """
+        if len(item_ids) == 0:
+            return
+        for item_id in item_ids: # 重复插入的线段先删除
+            if item_id in self.item_seg:
+                self.remove(item_id)
+        starts = numpy.asarray(starts, dtype=numpy.float64) - (self.offset_x, self.offset_y)
+        ends   = numpy.asarray(ends,   dtype=numpy.float64) - (self.offset_x, self.offset_y)
+        size = self.cell_size
+        eps  = size * 1e-9 # 与 get_covered_cells 保持一致
+
+        swap = ends[:, 0] < starts[:, 0] # 与 get_covered_cells 一样，保证 x1 <= x2
+        x1 = numpy.where(swap, ends[:, 0], starts[:, 0])
+        y1 = numpy.where(swap, ends[:, 1], starts[:, 1])
+        x2 = numpy.where(swap, starts[:, 0], ends[:, 0])
+        y2 = numpy.where(swap, starts[:, 1], ends[:, 1])
+
+        # 每条线段经过的每一列
+        cx_min = numpy.floor(x1 / size).astype(numpy.int64)
+        col_count = numpy.floor(x2 / size).astype(numpy.int64) - cx_min + 1
+        col_seg = numpy.repeat(numpy.arange(len(item_ids)), col_count)
+        col_first = numpy.cumsum(col_count) - col_count
+        cx = cx_min[col_seg] + (numpy.arange(len(col_seg)) - col_first[col_seg])
+
+        # 线段在每一列中的纵坐标范围
+        sx1, sy1, sx2, sy2 = x1[col_seg], y1[col_seg], x2[col_seg], y2[col_seg]
+        vertical = sx1 == sx2
+        xa = numpy.maximum(sx1, cx * size)
+        xb = numpy.minimum(sx2, (cx + 1) * size)
+        with numpy.errstate(divide="ignore", invalid="ignore"): # 竖直线段的结果不会被使用
+            ya = numpy.where(vertical, sy1, sy1 + (sy2 - sy1) * (xa - sx1) / (sx2 - sx1))
+            yb = numpy.where(vertical, sy2, sy1 + (sy2 - sy1) * (xb - sx1) / (sx2 - sx1))
+        cy_min = numpy.floor((numpy.minimum(ya, yb) - eps) / size).astype(numpy.int64)
+        row_count = numpy.floor((numpy.maximum(ya, yb) + eps) / size).astype(numpy.int64) - cy_min + 1
+
+        # 展开成 (线段, 格子) 的列表，顺序与 get_covered_cells 相同
+        cell_col = numpy.repeat(numpy.arange(len(col_seg)), row_count)
+        row_first = numpy.cumsum(row_count) - row_count
+        cell_seg = col_seg[cell_col]
+        cell_cx = cx[cell_col]
+        cell_cy = cy_min[cell_col] + (numpy.arange(len(cell_col)) - row_first[cell_col])
+
+        cell_list = list(zip(cell_cx.tolist(), cell_cy.tolist()))
+        seg_end = numpy.cumsum(numpy.bincount(cell_seg, minlength=len(item_ids))).tolist()
+        seg_begin = [0] + seg_end[:-1]
+        for item_id, pos_from, pos_to, begin, end in zip(item_ids, map(tuple, starts.tolist()), map(tuple, ends.tolist()), seg_begin, seg_end):
+            self.item_cells[item_id] = cell_list[begin:end]
+            self.item_seg[item_id] = (pos_from, pos_to)
+
+        # 按照格子分组，每个格子只创建一次集合
+        order = numpy.lexsort((cell_cy, cell_cx))
+        sorted_cx = cell_cx[order]
+        sorted_cy = cell_cy[order]
+        group_first = numpy.flatnonzero(numpy.r_[True, (sorted_cx[1:] != sorted_cx[:-1]) | (sorted_cy[1:] != sorted_cy[:-1])])
+        group_end = group_first[1:].tolist() + [len(order)]
+        members = numpy.array(item_ids, dtype=object)[cell_seg[order]].tolist()
+        for cell_x, cell_y, begin, end in zip(sorted_cx[group_first].tolist(), sorted_cy[group_first].tolist(), group_first.tolist(), group_end):
+            bucket = self.cells.get((cell_x, cell_y))
+            if bucket is None:
+                self.cells[(cell_x, cell_y)] = set(members[begin:end])
+                self.blocks.add((cell_x, cell_y))
+            else:
+                bucket.update(members[begin:end])
+
+    def remove(self, item_id):
+        if item_id not in self.item_seg:
+            return
+        for cell in self.item_cells.pop(item_id):
+            bucket = self.cells[cell]
+            bucket.discard(item_id)
+            if len(bucket) == 0:
+                del self.cells[cell]
+                self.blocks.discard(cell)
+        del self.item_seg[item_id]
+
+    def shift(self, dx, dy): # 所有线段一起移动
+        self.offset_x += dx
+        self.offset_y += dy
+
+    def query_rect_ids(self, xmin, ymin, xmax, ymax) -> set: # 返回经过矩形范围内格子的所有线段（可能多返回）
+        xmin -= self.offset_x
+        xmax -= self.offset_x
+        ymin -= self.offset_y
+        ymax -= self.offset_y
+        cx_min, cy_min = self.get_cell(xmin, ymin)
+        cx_max, cy_max = self.get_cell(xmax, ymax)
+
+        cell_iter = self.blocks.cells_in_range(self.cells, cx_min, cy_min, cx_max, cy_max)
+
+        ans = set()
+        for cell in cell_iter:
+            ans |= self.cells[cell]
+        return ans
+
+    def query_near(self, x, y, max_dis) -> list: # 返回到 (x, y) 距离不超过 max_dis 的所有 (item_id, dis)
+        xl = x - self.offset_x
+        yl = y - self.offset_y
+        ans = []
+        for item_id in self.query_rect_ids(x - max_dis, y - max_dis, x + max_dis, y + max_dis):
+            pos_from, pos_to = self.item_seg[item_id]
+            dis = math_utils.point_to_line_segment_distance((xl, yl), pos_from, pos_to)
+            if dis <= max_dis:
+                ans.append((item_id, dis))
+        return sorted(ans, key=lambda pair: pair[1])
+
+    def candidate_pairs(self) -> set: # 返回所有至少共享一个格子的线段对，所有相交的线段对一定在其中
+        pairs = set()
+        for bucket in self.cells.values():
+            if len(bucket) >= 2:
+                pairs.update(itertools.combinations(sorted(bucket), 2))
+        return pairs
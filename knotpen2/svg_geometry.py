@@ -0,0 +1,205 @@
+import numpy
+
+# 相对导入
+import constant_config
+import math_utils
+import GeometryStore
+
+# svg 图片的中间表示
+# 弧线的拓扑结构（arc_list）以及每条弧线的坐标只计算一次，三种 svg 图片（以及将来新增的图片）都从同一份几何数据生成
+#
+# arc_list 中的每一项是一个四元组 (pos_from, pos_mid, pos_to, status)
+#   pos_* 是三元组 (dot_id_1, dot_id_2, rate)，表示边上的一个插值位置
+#   status 是两个字母，分别表示起点和终点是否需要缩短，小写字母表示需要缩短（位于交叉点下方），大写字母表示不需要缩短
+#
+# geometry 是一个 dict：
+#   "view_box": 所有节点的包围盒 (xmin, ymin, xmax, ymax)
+#   "arcs": 形状为 (N, 6) 的数组，每一行是一条弧线的二次贝塞尔曲线控制点 (xfrom, yfrom, xmid, ymid, xto, yto)
+#   "path_order", "path_start", "path_closed": 首尾相接的弧线如何合并为 <path>，见 compute_path_runs
+#   "arrows": 第一次用到时计算的箭头坐标，见 compute_arrows
+#   "path_chunks": 第一次用到时生成的弧线部分的 svg 文本，见 svg_writer.get_path_chunks
+# svg 文本由 svg_writer 根据 geometry 流式生成
+
+def get_new_tag(base:str, old_tag:str) -> str:
+    assert old_tag in ["below", "above"]
+    assert base in ["l", "r", "L", "R"]
+    base = base.upper()
+    if old_tag == "below": # 小写字母表示需要缩短，大写字母表示不需要缩短
+        return base.lower()
+    else:
+        return base
+
+def build_arc_list(block_list, parts) -> tuple: # 返回 (arc_list, component_sizes)，同一个连通分支的弧线连续排列，component_sizes 是每个连通分支的弧线个数
+    # 根据 block_list 计算节点的前驱后继关系
+    # 这里的节点以 dot_id 的形式记录（即节点的默认编号）
+    get_next_dot = {}
+    get_last_dot = {}
+    for i in range(len(block_list)):
+        for j in range(len(block_list[i])):
+            item_now = block_list[i][j]
+            item_last = block_list[i][j-1] # 这样的话，当 j = 0 时，恰好是正确的
+
+            get_next_dot[item_last] = item_now
+            get_last_dot[item_now] = item_last
+
+    # 为某个指定的连通分支计算其 arc_list
+    def get_arc_list_for_zero_crossing_connected_component(bid: int):
+        arc_list = []
+        for item in block_list[bid]:
+            arc_list.append((
+                (get_last_dot[item], item, 0.5), # 为所有节点输出一个四元组
+                (item, get_next_dot[item], 0.0),
+                (item, get_next_dot[item], 0.5),
+                "LR", ## LR, 表示两端都不需要缩短
+            ))
+        return arc_list
+
+    def get_arc_list_between_two_crossing(bid:int, begin_arc, end_arc): # 绘制两个交叉点之间的所有弧线段
+        nid1, t1, ignored, ignored, tag1 = begin_arc
+        nid2, t2, ignored, ignored, tag2 = end_arc
+
+        if nid1 == nid2: # 位于同一个线段的两个交叉点，不需要计算中间节点
+            return [
+                (
+                    (block_list[bid][nid1], get_next_dot[block_list[bid][nid1]], t1),
+                    (block_list[bid][nid1], get_next_dot[block_list[bid][nid1]], (t1 + t2) / 2),
+                    (block_list[bid][nid2], get_next_dot[block_list[bid][nid2]], t2),
+                    get_new_tag("l", tag1) + get_new_tag("r", tag2)
+                )
+            ]
+
+        all_interger_index = [] # 获取两个交叉点之间的所有整数编号
+        index_now = nid1
+        while True:
+            index_now = (index_now + 1) % len(block_list[bid]) # 编号循环
+            all_interger_index.append(index_now)
+            if index_now == nid2:
+                break
+
+        arc_list = []
+        if len(all_interger_index) == 1: # 只有一个节点位于两者之间的情况
+            new_tag_1 = get_new_tag("L", tag1)
+            new_tag_2 = get_new_tag("R", tag2)
+            arc_list.append((
+                (block_list[bid][nid1], block_list[bid][all_interger_index[0]],  t1),
+                (block_list[bid][nid1], block_list[bid][all_interger_index[0]], 1.0),
+                (block_list[bid][nid2], get_next_dot[block_list[bid][nid2]],  t2),
+                new_tag_1 + new_tag_2
+            ))
+        else: # 说明不只有一个节点位于两者之间，因此需要单独考虑最前端和最后段
+            new_tag_1 = get_new_tag("L", tag1)
+            new_tag_2 = get_new_tag("R", tag2)
+            arc_list.append((
+                (block_list[bid][nid1], block_list[bid][all_interger_index[0]],  t1),
+                (block_list[bid][nid1], block_list[bid][all_interger_index[0]], 1.0),
+                (block_list[bid][all_interger_index[0]], get_next_dot[block_list[bid][all_interger_index[0]]],  0.5),
+                new_tag_1 + "R"
+            ))
+
+            for idx, item in enumerate(all_interger_index):
+                if idx == 0: # 跳过第一个元素
+                    continue
+                if idx == len(all_interger_index) - 1: # 跳过最后一个元素
+                    continue
+                item_last = all_interger_index[idx - 1]
+                item_now  = item
+                item_next = all_interger_index[idx + 1] # 下一个元素
+                arc_list.append((
+                    (block_list[bid][item_last], block_list[bid][item_now], 0.5),
+                    (block_list[bid][item_now], block_list[bid][item_next], 0.0),
+                    (block_list[bid][item_now], block_list[bid][item_next], 0.5),
+                    "LR"
+                ))
+
+            arc_list.append((
+                (get_last_dot[block_list[bid][all_interger_index[-1]]], block_list[bid][all_interger_index[-1]], 0.5),
+                (block_list[bid][all_interger_index[-1]], block_list[bid][nid2], 0.0), # 中间的点是一个整数位置点
+                (block_list[bid][nid2], get_next_dot[block_list[bid][nid2]],  t2),
+                "L" + new_tag_2,
+            ))
+
+        return arc_list
+
+    # 特殊处理没有交叉点的连通分支
+    arc_list = []
+    component_sizes = []
+    for i in range(len(parts)):
+        size_before = len(arc_list)
+        if len(parts[i]) == 0: # 这说明这个连通分支没有任何交点
+            arc_list += get_arc_list_for_zero_crossing_connected_component(i)
+        else:
+            # 执行到这个分支说明当前 parts[i] 中至少有一个交点
+            for j in range(len(parts[i])):
+                begin_arc = parts[i][j-1] # 需要注意的是，当 j = 0 时，这里 j - 1 等于 -1
+                end_arc = parts[i][j]
+                arc_list += get_arc_list_between_two_crossing(i, begin_arc, end_arc)
+        component_sizes.append(len(arc_list) - size_before)
+    return arc_list, component_sizes
+
+SHRINK_SIGNS = {"l": 1, "r": -1} # 其他字母表示不需要缩短，见 MemoryObject.batch_get_interpos
+
+def compute_path_runs(arc_list:list, component_sizes:list) -> tuple:
+    """
+    根据拓扑结构把首尾相接的弧线合并为若干条路径，每条路径输出为一个 <path>
+
+    同一个连通分支上相邻的两条弧线，如果连接处两端都不需要缩短（不在交叉点下方），就属于同一条路径
+    每个连通分支的弧线会循环移位，从一个断开的位置开始，这样跨过连通分支首尾的路径也不会被拆开
+    一个连通分支上的所有弧线都首尾相接时（例如没有交叉点的连通分支），路径是闭合的
+
+    Returns:
+        tuple: (order, run_start, run_closed)
+            order 是按照输出顺序排列的弧线下标
+            run_start[k] 表示 order[k] 是否开始一条新的路径
+            run_closed[k] 表示 order[k] 是否是一条闭合路径的最后一条弧线
+    """
+    sizes = numpy.asarray(component_sizes, dtype=numpy.int64)
+    sizes = sizes[sizes > 0]
+    total = int(sizes.sum())
+    if total == 0:
+        return numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=bool), numpy.zeros(0, dtype=bool)
+
+    begin = numpy.cumsum(sizes) - sizes # 每个连通分支第一条弧线的下标
+    comp_of = numpy.repeat(numpy.arange(len(sizes)), sizes)
+    local = numpy.arange(total) - begin[comp_of] # 弧线在连通分支中的位置
+    next_arc = numpy.where(local == sizes[comp_of] - 1, begin[comp_of], numpy.arange(total) + 1) # 连通分支中循环意义下的下一条弧线
+
+    start_free = numpy.array([arc[3][0] not in SHRINK_SIGNS for arc in arc_list], dtype=bool)
+    end_free = numpy.array([arc[3][1] not in SHRINK_SIGNS for arc in arc_list], dtype=bool)
+    joined = end_free & start_free[next_arc] # 弧线的终点与下一条弧线的起点相连
+
+    last_break = numpy.maximum.reduceat(numpy.where(joined, -1, local), begin) # 每个连通分支中最后一个断开的位置，-1 表示闭合
+    shift = (last_break + 1) % sizes
+    order = begin[comp_of] + (local + shift[comp_of]) % sizes[comp_of]
+
+    run_start = numpy.ones(total, dtype=bool)
+    run_start[1:] = ~joined[order[:-1]]
+    run_start[local == 0] = True
+    run_closed = (last_break[comp_of] == -1) & (local == sizes[comp_of] - 1)
+    return order, run_start, run_closed
+
+def compute_geometry(memory_object, arc_list:list, component_sizes:list) -> dict: # 使用 numpy 一次性计算所有弧线的起点、控制点、终点
+    positions = [pos for arc in arc_list for pos in arc[:3]] # 每条弧线依次是起点、控制点、终点
+    shrink_signs = [sign for arc in arc_list for sign in (SHRINK_SIGNS.get(arc[3][0], 0), 0, SHRINK_SIGNS.get(arc[3][1], 0))]
+    points = memory_object.batch_get_interpos(
+        [GeometryStore.dot_number(pos[0]) for pos in positions],
+        [GeometryStore.dot_number(pos[1]) for pos in positions],
+        [pos[2] for pos in positions],
+        shrink_signs)
+    order, run_start, run_closed = compute_path_runs(arc_list, component_sizes)
+    return {
+        "view_box": memory_object.get_view_box(),
+        "arcs": points.reshape(-1, 6),
+        "path_order": order,
+        "path_start": run_start,
+        "path_closed": run_closed,
+    }
+
+def compute_arrows(geometry:dict) -> numpy.ndarray: # 每条弧线中点附近的小箭头，返回形状为 (N, 6) 的数组：中点、两个端点
+    if "arrows" not in geometry:
+        arcs = geometry["arcs"]
+        midpoint, tangent = math_utils.batch_bezier_midpoint_and_tangent(arcs[:, 0:2], arcs[:, 2:4], arcs[:, 4:6])
+        normal = numpy.stack([-tangent[:, 1], tangent[:, 0]], axis=1) # 法线方向是切线方向的垂直方向
+        wing_1 = midpoint + (normal - tangent) * constant_config.ARROW_SIZE
+        wing_2 = midpoint + (-normal - tangent) * constant_config.ARROW_SIZE
+        geometry["arrows"] = numpy.concatenate([midpoint, wing_1, wing_2], axis=1)
+    return geometry["arrows"]
@@ -0,0 +1,125 @@
+import os
+import re
+import numpy
+
+# 相对导入
+import constant_config
+import svg_geometry
+
+# 流式 svg 输出
+# iter_svg_chunks 根据 svg_geometry 中的几何数据逐段生成 svg 文本，write_svg 把这些片段直接写入文件，不需要在内存中拼出完整的 svg
+# 为了减小文件体积：
+#   同一个连通分支上首尾相接的弧线（交叉点上方的弧线、或者没有经过交叉点的弧线）合并为一个 <path>，位于交叉点下方的弧线两端留有空白，因此会断开
+#   是否首尾相接由拓扑结构决定（见 svg_geometry.compute_path_runs），不比较浮点坐标；闭合的路径以 Z 结尾
+#   线条的公共属性只在 <g> 中写一次
+#   坐标只保留 precision 位小数，并且去掉多余的 0
+#   所有箭头合并为一个 <path>
+# 文件名以 .svgz 结尾时使用 gzip 压缩
+
+ZERO_PATTERN = re.compile(r"\.?0+(?![\d.])") # 小数部分末尾多余的 0，如果小数部分全是 0 则连同小数点一起去掉
+
+def format_rows(template:str, values:numpy.ndarray, precision:int) -> str:
+    """
+    使用 template 一次性格式化 values 中的所有数
+
+    template 中的每个 %s 会被替换为一个保留 precision 位小数的数，并去掉多余的 0
+    template 中除了这些数以外不能再出现其他数字，否则会被错误地去掉末尾的 0
+    """
+    rounded = numpy.round(numpy.asarray(values, dtype=numpy.float64), precision) + 0.0 # 加 0.0 可以把 -0.0 变成 0.0
+    text = template.replace("%s", "%%.%df" % precision) % tuple(rounded.ravel().tolist())
+    if precision <= 0: # 没有小数点，不需要去掉 0
+        return text
+    return ZERO_PATTERN.sub("", text)
+
+def get_header(view_box) -> str:
+    xmin, ymin, xmax, ymax = view_box
+    header  = '<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n'
+    header += '<svg xmlns="http://www.w3.org/2000/svg" viewBox="%g %g %g %g" width="%d" height="%d">\n' % (
+        xmin, ymin, xmax-xmin, ymax-ymin,
+        round((xmax-xmin) * constant_config.SVG_EXPAND_RATIO),
+        round((ymax-ymin) * constant_config.SVG_EXPAND_RATIO))
+    return header
+
+PATH_START    = '"/>\n<path d="M%s,%sQ%s,%s %s,%s' # 结束上一个 <path>，开始一个新的 <path>
+PATH_CONTINUE = ' %s,%s %s,%s'                     # 二次贝塞尔曲线的命令字母可以省略，起点就是上一条弧线的终点
+PATH_CLOSE    = 'Z'                                # 闭合路径，终点与起点的连接处也会正确地处理线段连接
+PATH_TEMPLATES = [PATH_CONTINUE, PATH_START, PATH_CONTINUE + PATH_CLOSE, PATH_START + PATH_CLOSE] # 下标为 是否开始新的路径 + 2 * 是否闭合
+
+def iter_path_chunks(geometry:dict, precision:int): # 所有弧线，首尾相接的弧线合并为一个 <path>
+    arcs = geometry["arcs"][geometry["path_order"]]
+    if len(arcs) == 0:
+        return
+    run_start = geometry["path_start"] # 是否需要从这条弧线开始一个新的 <path>
+    run_closed = geometry["path_closed"]
+    keep = numpy.ones(arcs.shape, dtype=bool) # 合并到上一个 <path> 中的弧线不需要输出起点
+    keep[:, 0] = run_start
+    keep[:, 1] = run_start
+
+    chunk_arcs = constant_config.SVG_CHUNK_ARCS
+    for begin in range(0, len(arcs), chunk_arcs):
+        end = begin + chunk_arcs
+        kinds = run_start[begin:end] + 2 * run_closed[begin:end]
+        template = "".join([PATH_TEMPLATES[kind] for kind in kinds.tolist()])
+        text = format_rows(template, arcs[begin:end][keep[begin:end]], precision)
+        yield text[4:] if begin == 0 else text # 第一条弧线之前没有需要结束的 <path>
+    yield '"/>\n'
+
+def get_path_chunks(geometry:dict, precision:int) -> list: # 几种 svg 图片的弧线部分完全相同，因此只格式化一次，缓存在 geometry 中
+    cache = geometry.setdefault("path_chunks", {})
+    if precision not in cache:
+        cache[precision] = list(iter_path_chunks(geometry, precision))
+    return cache[precision]
+
+ARROW_TEMPLATE = 'M%s,%sL%s,%sM%s,%sL%s,%s'
+
+def iter_arrow_chunks(arrows:numpy.ndarray, precision:int): # 所有箭头合并为一个 <path>
+    if len(arrows) == 0:
+        return
+    yield '<path d="'
+    chunk_arcs = constant_config.SVG_CHUNK_ARCS
+    for begin in range(0, len(arrows), chunk_arcs):
+        rows = arrows[begin:begin + chunk_arcs]
+        yield format_rows(ARROW_TEMPLATE * len(rows), rows[:, [0, 1, 2, 3, 0, 1, 4, 5]], precision) # 中点 -> 两个端点
+    yield '" stroke-width="1"/>\n'
+
+def iter_svg_chunks(geometry:dict, number_pairs:list|None, need_arrow:bool, precision:int=constant_config.SVG_PRECISION):
+    """
+    逐段生成一种 svg 图片
+
+    Args:
+        geometry(dict): svg_geometry.compute_geometry 的返回值
+        number_pairs(list|None): 弧线编号以及位置 (txt, pos)，None 表示不需要弧线编号
+        need_arrow(bool): 是否需要在弧线中点附近绘制表示方向的小箭头
+        precision(int): 坐标保留的小数位数
+
+    Yields:
+        str: svg 文本片段，依次拼接即为完整的 svg
+    """
+    yield get_header(geometry["view_box"])
+    yield '<g fill="none" stroke="%s" stroke-width="%d">\n' % (constant_config.SVG_STROKE_COLOR, constant_config.SVG_STROKE_WIDTH)
+    yield from get_path_chunks(geometry, precision)
+    if need_arrow:
+        yield from iter_arrow_chunks(svg_geometry.compute_arrows(geometry), precision)
+    yield '</g>\n'
+
+    if number_pairs is not None and len(number_pairs) > 0: # 添加数字
+        positions = numpy.array([(pos[0], pos[1] + constant_config.SVG_TEXT_DELTA_Y) for ignored, pos in number_pairs], dtype=numpy.float64)
+        yield '<g font-size="%s" fill="red">\n' % constant_config.SVG_FONT_SIZE
+        texts = format_rows("%s " * positions.size, positions, precision).split()
+        yield "".join(
+            '<text x="%s" y="%s">%s</text>\n' % (texts[2 * i], texts[2 * i + 1], txt)
+            for i, (txt, ignored) in enumerate(number_pairs))
+        yield '</g>\n'
+    yield '</svg>\n'
+
+def write_svg(filepath:str, chunks): # 逐段写入文件，文件名以 .svgz 结尾时使用 gzip 压缩
+    folder = os.path.dirname(os.path.abspath(filepath))
+    os.makedirs(folder, exist_ok=True)
+    if filepath.lower().endswith(".svgz"):
+        import gzip # 只在需要压缩时导入
+        fp = gzip.open(filepath, "wt", encoding="utf-8")
+    else:
+        fp = open(filepath, "w", encoding="utf-8")
+    with fp:
+        for chunk in chunks:
+            fp.write(chunk)
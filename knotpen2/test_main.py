@@ -14,6 +14,7 @@ sys.stdout = io.TextIOWrapper(
 )
 
 # 相对导入
+import i18n
 from i18n import _
 import constant_config
 import error_log
@@ -21,6 +22,7 @@ import Knotpen2GameObject
 import ClassBinder
 import MemoryObject
 import MyAlgorithm
+import OperationJournal
 
 def set_pygame_icon(icon_path:str):
     # 加载图标图像（确保图像文件存在）
@@ -31,10 +33,12 @@ def set_pygame_icon(icon_path:str):
         print(_("无法加载图标图像，请检查文件路径和格式！"))
 
 def test_main():
+    i18n.init_language() # 核心模块导入时不读取 locale 文件，只有图形界面需要加载翻译
     pygame.init()
     set_pygame_icon(constant_config.PYGAME_ICON_PATH)
 
-    mo   = MemoryObject.MemoryObject()
+    mo   = MemoryObject.MemoryObject(auto_load=True)
+    OperationJournal.OperationJournal().attach(mo) # 记录所有修改操作，用于恢复任意时刻的状态
     algo = MyAlgorithm.MyAlgorithm(mo)
     k2go = Knotpen2GameObject.Knotpen2GameObject(mo, algo)
     cb   = ClassBinder.ClassBinder(k2go)
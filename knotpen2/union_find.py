@@ -0,0 +1,36 @@
+# 并查集，用于增量维护节点的连通分支
+# 只支持合并操作，删除边之后需要整体重建
+
+class UnionFind:
+    def __init__(self) -> None:
+        self.clear()
+
+    def clear(self):
+        self.parent = {} # item -> 父节点
+        self.size   = {} # 根节点 -> 集合大小
+        self.count  = 0  # 集合个数
+
+    def add(self, item):
+        if item not in self.parent:
+            self.parent[item] = item
+            self.size[item] = 1
+            self.count += 1
+
+    def find(self, item): # 路径减半，不使用递归
+        parent = self.parent
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    def union(self, item_1, item_2) -> bool: # 按照集合大小合并，返回是否真的发生了合并
+        root_1 = self.find(item_1)
+        root_2 = self.find(item_2)
+        if root_1 == root_2:
+            return False
+        if self.size[root_1] < self.size[root_2]:
+            root_1, root_2 = root_2, root_1
+        self.parent[root_2] = root_1
+        self.size[root_1] += self.size.pop(root_2)
+        self.count -= 1
+        return True
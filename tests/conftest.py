@@ -0,0 +1,6 @@
+import os
+import sys
+
+# knotpen2 中的模块互相之间直接 import 同一文件夹中的文件（见各文件中的 “相对导入”），测试时把这个文件夹加入 sys.path
+# 核心模块导入时不依赖 pygame，也不读取 locale 文件（init_language 之前 _ 直接返回原字符串），因此测试不需要图形界面
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "knotpen2"))
@@ -0,0 +1,52 @@
+import random
+import pytest
+
+import benchmark
+import MyAlgorithm
+import crossing_engine
+
+def orient(p, q, r):
+    return (q[0] - p[0]) * (r[1] - p[1]) - (q[1] - p[1]) * (r[0] - p[0])
+
+def on_segment(p, q, r): # 已知 p, q, r 共线，判断 r 是否在闭线段 pq 上
+    return min(p[0], q[0]) <= r[0] <= max(p[0], q[0]) and min(p[1], q[1]) <= r[1] <= max(p[1], q[1])
+
+def closed_segments_intersect(s, t): # 整数坐标下的精确判断，包括端点接触和共线重叠
+    (p1, p2), (q1, q2) = s, t
+    d1, d2 = orient(q1, q2, p1), orient(q1, q2, p2)
+    d3, d4 = orient(p1, p2, q1), orient(p1, p2, q2)
+    if ((d1 > 0 and d2 < 0) or (d1 < 0 and d2 > 0)) and ((d3 > 0 and d4 < 0) or (d3 < 0 and d4 > 0)):
+        return True
+    return ((d1 == 0 and on_segment(q1, q2, p1)) or (d2 == 0 and on_segment(q1, q2, p2))
+        or  (d3 == 0 and on_segment(p1, p2, q1)) or (d4 == 0 and on_segment(p1, p2, q2)))
+
+def naive_pairs(segments) -> set:
+    return {(i, j)
+        for i in range(len(segments)) for j in range(i + 1, len(segments))
+        if closed_segments_intersect(segments[i], segments[j])}
+
+@pytest.mark.parametrize("seed", range(20))
+def test_sweep_matches_naive(seed): # 小范围整数坐标会产生大量竖直、共线、三线共点以及端点接触的退化情况
+    rng = random.Random(seed)
+    segments = []
+    while len(segments) < 40:
+        p = (rng.randint(0, 6), rng.randint(0, 6))
+        q = (rng.randint(0, 6), rng.randint(0, 6))
+        if p != q:
+            segments.append((p, q))
+    assert crossing_engine.sweep_line_pairs(segments) == naive_pairs(segments)
+
+def test_sweep_float_coordinates(): # 非整数坐标会被转换为 Fraction 精确计算
+    segments = [((0.5, 0.5), (2.5, 2.5)), ((0.5, 2.5), (2.5, 0.5)), ((1.5, 1.5), (3.0, 0.0)), ((2.6, 0.0), (2.6, 3.0))]
+    assert crossing_engine.sweep_line_pairs(segments) == {(0, 1), (0, 2), (1, 2), (2, 3)}
+
+@pytest.mark.parametrize("case", ["random:40", "link:6", "torus:3,4", "spiral:30"])
+def test_engines_agree(case):
+    components = benchmark.parse_case(case)
+    answers = []
+    for engine_name in crossing_engine.CROSSING_ENGINES:
+        memory_object = benchmark.build_memory_object(components)
+        answer = MyAlgorithm.MyAlgorithm(memory_object, engine_name).compute_answer(lambda msg: None, need_svg=False)
+        assert answer["success"], answer["message"]
+        answers.append(answer["pd_code"])
+    assert all(pd_code == answers[0] for pd_code in answers)
@@ -0,0 +1,116 @@
+import io
+import copy
+import time
+import random
+import contextlib
+import pytest
+
+import MemoryObject
+import UndoHistory
+import OperationJournal
+
+def snapshot(memory_object) -> dict: # 撤销删除操作后元素的存储顺序可能改变，因此比较 dict 而不是存档字节串
+    return copy.deepcopy(memory_object.get_all_info())
+
+def random_operation(memory_object, rng:random.Random): # 随机执行一个修改操作，操作失败时（例如节点重合）可能抛出 AssertionError
+    dot_ids = list(memory_object.get_dot_dict())
+    line_ids = list(memory_object.get_line_dict())
+    r = rng.random()
+    if r < 0.3 or len(dot_ids) < 3:
+        memory_object.new_dot(rng.randint(-500, 500), rng.randint(-500, 500))
+    elif r < 0.55:
+        memory_object.new_line(*rng.sample(dot_ids, 2))
+    elif r < 0.6:
+        memory_object.erase_dot(rng.choice(dot_ids))
+    elif r < 0.65 and len(line_ids) > 0:
+        memory_object.erase_line(rng.choice(line_ids))
+    elif r < 0.75:
+        memory_object.set_dot_position(rng.choice(dot_ids), rng.randint(-500, 500), rng.randint(-500, 500))
+        memory_object.seal_history()
+    elif r < 0.8 and len(line_ids) >= 2:
+        memory_object.swap_line_order(*rng.sample(line_ids, 2))
+    elif r < 0.86 and len(line_ids) > 0:
+        line_id = rng.choice(line_ids)
+        (x1, y1), (x2, y2) = memory_object.get_line_points(line_id)
+        memory_object.split_line_at(line_id, (x1 + x2) / 2 + 0.25, (y1 + y2) / 2)
+    elif r < 0.91:
+        memory_object.set_base_dot(rng.choice(dot_ids))
+    elif r < 0.96:
+        memory_object.set_dir_dot(rng.choice(dot_ids))
+    else:
+        memory_object.shift_position(rng.randint(-9, 9), rng.randint(-9, 9))
+
+def run_random_operations(memory_object, count:int, seed:int, on_step=None):
+    rng = random.Random(seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for ignored in range(count):
+            try:
+                random_operation(memory_object, rng)
+            except AssertionError:
+                pass
+            if on_step is not None:
+                on_step()
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_undo_redo_inverse(seed):
+    memory_object = MemoryObject.MemoryObject(auto_load=False)
+    memory_object.history = UndoHistory.UndoHistory(max_steps=10000, max_deltas=10 ** 9)
+    states = [snapshot(memory_object)]
+    def on_step(): # 只有产生了撤销记录的操作才会改变状态
+        if len(memory_object.history.undo_stack) == len(states):
+            states.append(snapshot(memory_object))
+    run_random_operations(memory_object, 300, seed, on_step)
+    assert len(states) > 100
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for k in range(len(states) - 1, 0, -1):
+            assert memory_object.undo()
+            assert snapshot(memory_object) == states[k - 1]
+        assert not memory_object.undo()
+        for k in range(1, len(states)):
+            assert memory_object.redo()
+            assert snapshot(memory_object) == states[k]
+        assert not memory_object.redo()
+
+def test_clear_is_a_history_barrier():
+    memory_object = MemoryObject.MemoryObject(auto_load=False)
+    run_random_operations(memory_object, 20, 0)
+    assert memory_object.can_undo()
+    memory_object.clear()
+    assert not memory_object.can_undo()
+    assert len(memory_object.get_dot_dict()) == 0
+
+def test_restore_timestamp(tmp_path):
+    journal = OperationJournal.OperationJournal(str(tmp_path), compact_ops=37)
+    memory_object = MemoryObject.MemoryObject(auto_load=False)
+    journal.attach(memory_object)
+    checkpoints = [] # (时间戳, 这一时刻的状态)
+    def on_step():
+        checkpoints.append((time.time(), snapshot(memory_object)))
+    run_random_operations(memory_object, 200, 4, on_step)
+    memory_object.clear() # 清空是日志的分界点
+    run_random_operations(memory_object, 50, 5, on_step)
+    journal.close()
+    assert len(journal.list_segments()) > 1
+
+    for timestamp, state in checkpoints[::7] + checkpoints[-1:]:
+        restored = MemoryObject.MemoryObject(auto_load=False)
+        with contextlib.redirect_stdout(io.StringIO()):
+            OperationJournal.OperationJournal(str(tmp_path)).restore(restored, timestamp)
+        assert snapshot(restored) == state
+
+def test_new_session_starts_new_segment(tmp_path):
+    memory_object = MemoryObject.MemoryObject(auto_load=False)
+    for session in range(3): # 第二个会话没有任何操作
+        journal = OperationJournal.OperationJournal(str(tmp_path))
+        journal.attach(memory_object)
+        run_random_operations(memory_object, 10 if session != 1 else 0, session)
+        journal.close()
+
+    for seq in OperationJournal.OperationJournal(str(tmp_path)).list_segments(): # 每个操作文件只有一个段头
+        with open(journal.get_ops_path(seq), "r", encoding="utf-8") as fp:
+            assert sum(1 for line in fp if '"snapshot"' in line) == 1
+    restored = MemoryObject.MemoryObject(auto_load=False)
+    with contextlib.redirect_stdout(io.StringIO()):
+        OperationJournal.OperationJournal(str(tmp_path)).restore(restored)
+    assert snapshot(restored) == snapshot(memory_object)
@@ -0,0 +1,45 @@
+import io
+import contextlib
+import pytest
+
+import MemoryObject
+import MyAlgorithm
+import benchmark
+import save_format
+
+def load(filepath:str) -> MemoryObject.MemoryObject:
+    memory_object = MemoryObject.MemoryObject(auto_load=False)
+    memory_object.load_object(filepath)
+    return memory_object
+
+@pytest.fixture
+def diagram() -> MemoryObject.MemoryObject: # 带有逆向对、浮点坐标以及 pd_code_final 的图形
+    memory_object = benchmark.build_memory_object(benchmark.parse_case("torus:2,5"))
+    with contextlib.redirect_stdout(io.StringIO()):
+        line_ids = list(memory_object.get_line_dict())
+        memory_object.swap_line_order(line_ids[3], line_ids[40])
+        memory_object.split_line_at(line_ids[7], 1000.5, 2000.25)
+        answer = MyAlgorithm.MyAlgorithm(memory_object).compute_answer(lambda msg: None, need_svg=False)
+    assert answer["success"]
+    return memory_object
+
+def same_state(memory_object_1, memory_object_2) -> bool: # encode_json 对相同的 state 总是得到相同的字节串
+    return save_format.encode_json(memory_object_1.get_save_state()) == save_format.encode_json(memory_object_2.get_save_state())
+
+@pytest.mark.parametrize("suffix", ["json", "npz"])
+def test_round_trip(diagram, tmp_path, suffix):
+    filepath = str(tmp_path / ("save." + suffix))
+    diagram.dump_object(filepath)
+    loaded = load(filepath)
+    assert same_state(diagram, loaded)
+    assert loaded.get_all_info() == diagram.get_all_info()
+
+def test_legacy_repr(diagram, tmp_path): # 版本 1 的存档是 repr(get_all_info())
+    filepath = tmp_path / "legacy.json"
+    filepath.write_text(repr(diagram.get_all_info()), encoding="utf-8")
+    loaded = load(str(filepath))
+    assert same_state(diagram, loaded)
+
+def test_missing_file(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        load(str(tmp_path / "missing.json"))